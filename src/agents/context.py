@@ -0,0 +1,211 @@
+"""
+Bookkeeping of the retrieved chunks between the retrieval and the answer.
+
+Chunks are identified by their Qdrant point ID: the ones retrieved again
+after a query rewrite are merged instead of duplicated, and before
+'generate' the best scored chunks are packed into a fixed token budget, so
+the prompt stays small however many attempts were needed.
+
+In adaptive retrieval mode the number of chunks kept also follows how
+well they match the query: an over-fetched candidate list is cut where the
+similarities fall off, and the top similarity tells how confident the
+retrieval is. These use the cosine similarity of each chunk's dense vector
+to the query, not the RRF score it is ranked by: RRF only reflects ranks
+(the top hit always scores at least 0.5, however poor a match it is).
+"""
+
+import math
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from src.core.state import Chunk
+from src.utils.settings import settings
+from src.agents.tools import format_chunk
+
+logger = logging.getLogger(__name__)
+
+
+def count_tokens(text: str) -> int:
+    """Estimates the number of tokens of a text, without a tokenizer."""
+    return math.ceil(len(text) / settings.CONTEXT_CHARS_PER_TOKEN)
+
+
+def rank_score(chunk: Chunk) -> float:
+    """The score chunks are ordered by for the prompt: the cross-encoder
+    score once reranked (the reranker rescores every candidate), the
+    retrieval score otherwise."""
+    return chunk.get("rerank_score", chunk["score"])
+
+
+def merge_chunks(*chunk_lists: Iterable[Chunk]) -> List[Chunk]:
+    """
+    Merges chunk lists, keeping one copy (the best scored) of each chunk.
+
+    Only the retrieval scores are compared: a cross-encoder score from an
+    earlier attempt is on another scale, and the reranker rescores the
+    merged chunks anyway.
+
+    Args:
+        *chunk_lists (Iterable[Chunk]): E.g. the chunks of the previous
+            attempt and the newly retrieved ones.
+
+    Returns:
+        List[Chunk]: The unique chunks, best retrieval score first.
+    """
+    merged: Dict[str, Chunk] = {}
+    for chunks in chunk_lists:
+        for chunk in chunks:
+            known: Optional[Chunk] = merged.get(chunk["id"])
+            if known is None or chunk["score"] > known["score"]:
+                merged[chunk["id"]] = chunk
+    return sorted(merged.values(), key=lambda c: c["score"], reverse=True)
+
+
+def pack_chunks(
+        chunks: List[Chunk],
+        token_budget: Optional[int] = None) -> List[Chunk]:
+    """
+    Selects the best scored chunks that fit in the token budget.
+
+    Chunks are taken by decreasing `rank_score`; one that does not fit is
+    skipped so a smaller, lower scored one can still use the remaining
+    budget. The best chunk is always kept, even if it alone exceeds the
+    budget.
+
+    Args:
+        chunks (List[Chunk]): The candidate chunks.
+        token_budget (Optional[int]): Max tokens of formatted context.
+            Defaults to `settings.CONTEXT_TOKEN_BUDGET`.
+
+    Returns:
+        List[Chunk]: The packed chunks, best first.
+    """
+    if token_budget is None:
+        token_budget = settings.CONTEXT_TOKEN_BUDGET
+
+    packed: List[Chunk] = []
+    used: int = 0
+    for chunk in sorted(chunks, key=rank_score, reverse=True):
+        tokens: int = count_tokens(format_chunk(chunk))
+        if packed and used + tokens > token_budget:
+            continue
+        packed.append(chunk)
+        used += tokens
+
+    logger.info(
+        f"Packed {len(packed)}/{len(chunks)} chunks into {used} tokens "
+        f"(budget {token_budget}).")
+    return packed
+
+
+def adaptive_cut(
+        chunks: List[Chunk],
+        min_chunks: Optional[int] = None,
+        max_chunks: Optional[int] = None,
+        similarity_floor: Optional[float] = None,
+        max_gap_to_top: Optional[float] = None,
+        elbow_min_drop: Optional[float] = None) -> List[Chunk]:
+    """
+    Keeps the candidates above the point where their similarities fall off.
+
+    Three cuts are applied to the candidates sorted by similarity, and the
+    tightest one wins:
+      - absolute floor: a chunk below `similarity_floor` is dropped;
+      - gap to the top hit: so is one more than `max_gap_to_top` below the
+        top similarity;
+      - elbow: the list is cut after the largest drop between two
+        consecutive similarities, if that drop is at least
+        `elbow_min_drop`.
+    The result is then clamped to [`min_chunks`, `max_chunks`].
+
+    Args:
+        chunks (List[Chunk]): The over-fetched candidates.
+        min_chunks (Optional[int]): Defaults to
+            `settings.ADAPTIVE_MIN_CHUNKS`.
+        max_chunks (Optional[int]): Defaults to
+            `settings.ADAPTIVE_MAX_CHUNKS`.
+        similarity_floor (Optional[float]): Defaults to
+            `settings.ADAPTIVE_SIMILARITY_FLOOR`.
+        max_gap_to_top (Optional[float]): Defaults to
+            `settings.ADAPTIVE_MAX_GAP_TO_TOP`.
+        elbow_min_drop (Optional[float]): Defaults to
+            `settings.ADAPTIVE_ELBOW_MIN_DROP`.
+
+    Returns:
+        List[Chunk]: The kept chunks, most similar first.
+    """
+    if min_chunks is None:
+        min_chunks = settings.ADAPTIVE_MIN_CHUNKS
+    if max_chunks is None:
+        max_chunks = settings.ADAPTIVE_MAX_CHUNKS
+    if similarity_floor is None:
+        similarity_floor = settings.ADAPTIVE_SIMILARITY_FLOOR
+    if max_gap_to_top is None:
+        max_gap_to_top = settings.ADAPTIVE_MAX_GAP_TO_TOP
+    if elbow_min_drop is None:
+        elbow_min_drop = settings.ADAPTIVE_ELBOW_MIN_DROP
+
+    ranked: List[Chunk] = sorted(
+        chunks, key=lambda c: c["similarity"], reverse=True)
+    if not ranked:
+        return []
+    top: float = ranked[0]["similarity"]
+
+    keep: int = next(
+        (i for i, chunk in enumerate(ranked)
+         if chunk["similarity"] < similarity_floor
+         or chunk["similarity"] < top - max_gap_to_top),
+        len(ranked))
+
+    # Largest drop within the chunks that may be kept (a drop right after
+    # the last of them also counts: it is a cut at `max_chunks`)
+    window: int = min(keep, max_chunks, len(ranked) - 1)
+    if window > 0:
+        drops: List[float] = [
+            ranked[i]["similarity"] - ranked[i + 1]["similarity"]
+            for i in range(window)]
+        elbow: int = max(range(window), key=lambda i: drops[i])
+        if drops[elbow] >= elbow_min_drop:
+            keep = min(keep, elbow + 1)
+
+    keep = min(max(keep, min_chunks), max_chunks, len(ranked))
+    logger.info(
+        f"Adaptive cut: kept {keep}/{len(ranked)} chunks "
+        f"(top similarity {top:.3f}).")
+    return ranked[:keep]
+
+
+def retrieval_confidence(
+        chunks: List[Chunk],
+        high: Optional[float] = None,
+        low: Optional[float] = None) -> str:
+    """
+    Rates a retrieval from its top similarity, without an LLM call.
+
+    Args:
+        chunks (List[Chunk]): The retrieved candidates.
+        high (Optional[float]): Top similarity from which the retrieval is
+            trusted. Defaults to `settings.ADAPTIVE_HIGH_CONFIDENCE`.
+        low (Optional[float]): Top similarity under which it is not.
+            Defaults to `settings.ADAPTIVE_LOW_CONFIDENCE`.
+
+    Returns:
+        str: "high", "medium" (worth an LLM grading) or "low".
+    """
+    if high is None:
+        high = settings.ADAPTIVE_HIGH_CONFIDENCE
+    if low is None:
+        low = settings.ADAPTIVE_LOW_CONFIDENCE
+
+    top: float = max(
+        (chunk["similarity"] for chunk in chunks), default=0.0)
+    if top >= high:
+        return "high"
+    if top < low:
+        return "low"
+    return "medium"
+
+
+def format_context(chunks: List[Chunk]) -> str:
+    """Renders the chunks as the context block of a prompt."""
+    return "\n".join(format_chunk(chunk) for chunk in chunks)
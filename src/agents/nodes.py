@@ -2,17 +2,44 @@
 Defines the nodes (workers) for the LangGraph agent.
 """
 
+import json
 import time
+import asyncio
+import hashlib
 import logging
+import threading
 from typing import Dict, Any, List, Tuple
 
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
 
-from src.core.state import AgentState
+from src.core.state import AgentState, Chunk
 from src.utils.settings import settings
-from src.agents.tools import retrieve_documents
+from src.agents.tools import (
+    amulti_search_chunks,
+    asearch_chunks,
+    format_chunk,
+    multi_search_chunks,
+    search_chunks
+)
+from src.agents.context import (
+    adaptive_cut,
+    format_context,
+    merge_chunks,
+    pack_chunks,
+    retrieval_confidence
+)
+from src.agents.reranker import rerank_chunks
+from src.utils.chat_model import build_chat_model
+from src.utils.single_flight import AsyncSingleFlight, SingleFlight
+from src.utils.llm_cache import (
+    SQLiteLLMCache,
+    build_llm_cache,
+    is_cache_enabled_for
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,78 +49,193 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-lite",
-    temperature=0,
-    max_retries=2,
-    google_api_key=settings.GOOGLE_API_KEY
-)
+_init_lock: threading.Lock = threading.Lock()
+_llm_cache: SQLiteLLMCache | None = None
+_llm: BaseChatModel | None = None
+_uncached_llm: BaseChatModel | None = None
+
+# Identical LLM calls in flight at the same time (e.g. many sessions asking
+# the same question) share one provider call
+llm_flight: SingleFlight[Any] = SingleFlight("llm")
+allm_flight: AsyncSingleFlight[Any] = AsyncSingleFlight("llm")
+
+
+def _init_llm() -> None:
+    """Builds the cache and the models on first use, not at import: the
+    graph can be imported and compiled without touching the provider."""
+    global _llm_cache, _llm, _uncached_llm
+    with _init_lock:
+        if _llm is not None:
+            return
+        # Persistent exact-match cache: temperature=0 makes the calls
+        # repeatable
+        _llm_cache = build_llm_cache()
+        # Gemini, or the local fake model for load tests
+        # (settings.LLM_PROVIDER)
+        model: BaseChatModel = build_chat_model(cache=_llm_cache)
+        # Same model without the cache, for nodes that opted out
+        _uncached_llm = model.model_copy(update={"cache": False})
+        # Published last: readers check `_llm` without the lock
+        _llm = model
+
+
+def get_llm() -> BaseChatModel:
+    """Returns the shared LLM (with the response cache), built lazily."""
+    if _llm is None:
+        _init_llm()
+    return _llm
+
+
+def get_llm_cache() -> SQLiteLLMCache | None:
+    """Returns the LLM response cache, or None if it is disabled."""
+    if _llm is None:
+        _init_llm()
+    return _llm_cache
+
+
+def get_node_llm(node: str) -> BaseChatModel:
+    """
+    Returns the shared LLM, with or without the response cache.
+
+    Args:
+        node (str): The calling node, checked against
+            `settings.LLM_CACHE_DISABLED_NODES`.
+
+    Returns:
+        BaseChatModel: The model to call.
+    """
+    if _llm is None:
+        _init_llm()
+    return _llm if is_cache_enabled_for(node) else _uncached_llm
+
+
+def __getattr__(name: str) -> Any:
+    """Keeps `from src.agents.nodes import llm, llm_cache` working."""
+    if name == "llm":
+        return get_llm()
+    if name == "llm_cache":
+        return get_llm_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _llm_key(node: str, inputs: Any) -> str:
+    """Coalescing key of an LLM call: the calling node and its exact
+    inputs (the prompt and the model are fixed per node)."""
+    return hashlib.sha256(json.dumps(
+        [node, inputs], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
 
 class GradeDocuments(BaseModel):
-    """Binary score for relevance check on retrieved documents."""
-    binary_score: str = Field(
-        description="Documents are relevant to the question, 'yes' or 'no'"
+    """Binary scores for relevance check on each retrieved chunk."""
+    binary_scores: List[str] = Field(
+        description="One score per numbered chunk, in the same order: 'yes' "
+                    "if the chunk is relevant to the question, 'no' otherwise"
     )
 
 
-def retrieve(state: AgentState) -> Dict[str, Any]:
-    """Node 1: The Researcher"""
-    logging.info("--- NODE: RETRIEVE ---")
-    question: str = state["question"]
+class QueryVariants(BaseModel):
+    """Alternative phrasings of the user question for retrieval."""
+    queries: List[str] = Field(
+        description="Rephrasings of the question, each optimized for "
+                    "vector retrieval and covering a different angle"
+    )
 
-    # Pass arguments as a dictionary!
-    documents_str: str = retrieve_documents.invoke({
-        "query": question, 
-        "chunk_limit": 3
-    })
 
-    return {"documents": [documents_str]}
+def _query_variants_chain() -> Runnable:
+    """Builds the multi-query chain: prompt -> structured-output LLM."""
+    structured_llm: Runnable = get_node_llm(
+        "multi_query_retrieve").with_structured_output(QueryVariants)
 
+    prompt: ChatPromptTemplate = ChatPromptTemplate.from_messages(
+        [
+            ("system", """You write search queries for a vector database of
+            company policies and compliance documents. Given a question,
+            write {n} different rephrasings that could each retrieve the
+            relevant facts: use synonyms, the formal policy terms, and any
+            codes or article numbers mentioned. Output only the queries."""),
+            ("human", "Question: {question}"),
+        ]
+    )
 
-def grade_documents(state: AgentState) -> Dict[str, Any]:
-    """Node 2: The Compliance Officer (Gemini)"""
-    logging.info("--- NODE: GRADE DOCUMENTS ---")
-    question: str = state["question"]
-    documents: str = state["documents"][0]
+    return prompt | structured_llm
 
+
+def _with_original(question: str, variants: QueryVariants) -> List[str]:
+    """Puts the original question first and drops duplicate variants."""
+    queries: List[str] = [question]
+    for query in variants.queries[:settings.MULTI_QUERY_VARIANTS]:
+        query = query.strip()
+        if query and query not in queries:
+            queries.append(query)
+    logging.info(f"--- QUERY VARIANTS: {queries} ---")
+    return queries
+
+
+def _retrieval_grader() -> Runnable:
+    """Builds the grading chain: prompt -> structured-output LLM."""
     # Gemini supports structured output too!
-    structured_llm_grader: ChatGoogleGenerativeAI = llm.with_structured_output(
-        GradeDocuments)
+    structured_llm_grader: Runnable = get_node_llm(
+        "grade_documents").with_structured_output(GradeDocuments)
 
     system: str = """You are a strict compliance auditor assessing relevance. 
-    If the document contains keyword(s) or semantic meaning related to the user
-    question, grade it as relevant. Give a binary score 'yes' or 'no'."""
+    You receive numbered document chunks. For EACH chunk, if it contains
+    keyword(s) or semantic meaning related to the user question, grade it as
+    relevant. Give one binary score 'yes' or 'no' per chunk, in order."""
 
     grade_prompt: ChatPromptTemplate = ChatPromptTemplate.from_messages(
         [
             ("system", system),
-            ("human", "Retrieved document: \n\n {document} \n\n User " +
+            ("human", "Retrieved chunks: \n\n {documents} \n\n User " +
              "question: {question}"),
         ]
     )
 
-    retrieval_grader: ChatGoogleGenerativeAI = grade_prompt | \
-        structured_llm_grader
+    return grade_prompt | structured_llm_grader
 
-    score: GradeDocuments = retrieval_grader.invoke(
-        {"question": question,
-         "document": documents}
-    )
 
-    logging.info(f"--- JUDGE DECISION: {score.binary_score} ---")
+def _number_chunks(documents: List[Chunk]) -> str:
+    """Renders the chunks as a numbered list for the batched grader."""
+    return "\n\n".join(
+        f"[Chunk {i}]\n{format_chunk(chunk)}"
+        for i, chunk in enumerate(documents, 1))
+
+
+def _grade_result(
+        state: AgentState,
+        score: GradeDocuments) -> Dict[str, Any]:
+    """
+    Keeps only the chunks graded relevant.
+
+    Missing scores (the model returned fewer than asked) count as relevant:
+    dropping context is worse than passing one extra chunk. When nothing
+    passes, the chunks are kept so a forced generation still has context.
+    """
+    documents: List[Chunk] = state["documents"]
+    scores: List[str] = [
+        str(s).strip().lower() for s in score.binary_scores]
+    if len(scores) != len(documents):
+        logging.warning(
+            f"Grader returned {len(scores)} scores for "
+            f"{len(documents)} chunks.")
+    scores += ["yes"] * (len(documents) - len(scores))
+
+    relevant: List[Chunk] = [
+        chunk for chunk, s in zip(documents, scores) if s == "yes"]
+    grade: str = "yes" if relevant else "no"
+
+    logging.info(
+        f"--- JUDGE DECISION: {len(relevant)}/{len(documents)} chunks "
+        f"relevant -> {grade} ---")
     return {
-        "question": question,
-        "documents": state["documents"],
-        "grade": score.binary_score
+        "question": state["question"],
+        "documents": relevant or documents,
+        "grade": grade
     }
 
 
-def generate(state: AgentState) -> Dict[str, Any]:
-    """Node 3: The Writer (Gemini)"""
-    logging.info("--- NODE: GENERATE ---")
-    question: str = state["question"]
-    documents: str = state["documents"][0]
-
+def _rag_chain() -> Runnable:
+    """Builds the answer chain: prompt -> LLM."""
     prompt: ChatPromptTemplate = ChatPromptTemplate.from_template(
         """You are an assistant for question-answering tasks. 
         Use the following pieces of retrieved context to answer the question. 
@@ -106,17 +248,252 @@ def generate(state: AgentState) -> Dict[str, Any]:
         Answer:"""
     )
 
-    rag_chain: ChatGoogleGenerativeAI = prompt | llm
-    response: ChatGoogleGenerativeAI = rag_chain.invoke(
-        {"documents": documents,
-         "question": question}
-    )
+    return prompt | get_node_llm("generate")
+
+
+def _rewrite_messages(question: str) -> List[Tuple[str, str]]:
+    """Builds the query rewriter messages for a question."""
+    # A specific prompt to act as a "Translator"
+    # "Look at the initial question and formulate an improved question 
+    # that is more likely to retrieve relevant facts."
+    return [
+        ("system", """You are a query rewriter that converts an input question
+        to a better version that is optimized for vector retrieval.
+        Look at the initial and formulate an improved question.
+        IMPORTANT: Output ONLY the improved question string. Do not output
+        'Improved Question:' or any preamble."""),
+        ("human", f"Initial Question: {question} \n Formulate an improved "
+                  "question."),
+    ]
+
+
+def _rewrite_result(state: AgentState, content: str) -> Dict[str, Any]:
+    """Cleans the rewriter output and builds the node update."""
+    clean_question: str = content.replace("Improved Question:", "").strip()
+    logging.info(f"--- REWRITTEN QUERY: {clean_question} ---")
+
+    # Update the state with the NEW question
+    # Also increment the retry counter to prevent infinite loops later
+    return {
+        "question": clean_question,
+        "retry_count": state.get("retry_count", 0) + 1
+    }
+
+
+def _adaptive() -> bool:
+    """Adaptive retrieval applies when no reranker trims the candidates."""
+    return settings.RETRIEVAL_ADAPTIVE and not settings.RERANKER_ENABLED
+
+
+def _retrieve_limit() -> int:
+    """Over-fetches candidates when a reranker or the adaptive cut trims
+    them afterwards."""
+    if settings.RERANKER_ENABLED:
+        return settings.RERANK_CANDIDATES
+    if settings.RETRIEVAL_ADAPTIVE:
+        return settings.ADAPTIVE_FETCH_LIMIT
+    return 3
+
+
+def _accumulate(
+        state: AgentState,
+        documents: List[Chunk]) -> List[Chunk]:
+    """Adds the new chunks to those of the previous attempts (after a
+    rewrite), so nothing already fetched is lost, without duplicates."""
+    previous: List[Chunk] = state.get("documents") or []
+    merged: List[Chunk] = merge_chunks(previous, documents)
+    if previous:
+        logging.info(
+            f"--- ACCUMULATED CHUNKS: {len(previous)} previous + "
+            f"{len(documents)} new -> {len(merged)} unique ---")
+    return merged
+
+
+def _retrieval_update(
+        state: AgentState,
+        documents: List[Chunk]) -> Dict[str, Any]:
+    """
+    Builds the update of a retrieve node.
+
+    In adaptive mode the candidates are cut where their similarities to
+    the query fall off, and the retrieval confidence pre-sets the grade: a
+    confident retrieval goes straight to 'generate' and a weak one to
+    'rewrite_query', so only the borderline ones pay for the LLM grader.
+    """
+    if not _adaptive():
+        return {"documents": _accumulate(state, documents)}
+
+    confidence: str = retrieval_confidence(documents)
+    update: Dict[str, Any] = {
+        "documents": _accumulate(state, adaptive_cut(documents)),
+        "retrieval_confidence": confidence,
+    }
+    if confidence == "high":
+        update["grade"] = "yes"
+    elif confidence == "low":
+        update["grade"] = "no"
+    logging.info(f"--- RETRIEVAL CONFIDENCE: {confidence} ---")
+    return update
+
+
+def retrieve(state: AgentState) -> Dict[str, Any]:
+    """Node 1: The Researcher"""
+    logging.info("--- NODE: RETRIEVE ---")
+    question: str = state["question"]
+
+    # One entry per chunk, so they can be graded one by one
+    documents: List[Chunk] = search_chunks(
+        question, chunk_limit=_retrieve_limit(),
+        filters=state.get("filters"))
+
+    return _retrieval_update(state, documents)
+
+
+async def aretrieve(state: AgentState) -> Dict[str, Any]:
+    """Node 1 (async): The Researcher, on the async Qdrant client."""
+    logging.info("--- NODE: RETRIEVE ---")
+    question: str = state["question"]
+
+    documents: List[Chunk] = await asearch_chunks(
+        question, chunk_limit=_retrieve_limit(),
+        filters=state.get("filters"))
+
+    return _retrieval_update(state, documents)
+
+
+def multi_query_retrieve(state: AgentState) -> Dict[str, Any]:
+    """Node 1 (multi-query mode): The Research Team. One LLM call writes
+    query variants, all searches run concurrently, and the results are
+    fused with Reciprocal Rank Fusion."""
+    logging.info("--- NODE: RETRIEVE (MULTI-QUERY) ---")
+    question: str = state["question"]
+
+    inputs: Dict[str, Any] = {
+        "question": question, "n": settings.MULTI_QUERY_VARIANTS}
+    variants: QueryVariants = llm_flight.do(
+        _llm_key("multi_query_retrieve", inputs),
+        lambda: _query_variants_chain().invoke(inputs))
+    documents: List[Chunk] = multi_search_chunks(
+        _with_original(question, variants), chunk_limit=_retrieve_limit(),
+        filters=state.get("filters"))
+
+    return _retrieval_update(state, documents)
+
+
+async def amulti_query_retrieve(state: AgentState) -> Dict[str, Any]:
+    """Node 1 (multi-query mode, async): searches run with asyncio.gather."""
+    logging.info("--- NODE: RETRIEVE (MULTI-QUERY) ---")
+    question: str = state["question"]
+
+    inputs: Dict[str, Any] = {
+        "question": question, "n": settings.MULTI_QUERY_VARIANTS}
+    variants: QueryVariants = await allm_flight.do(
+        _llm_key("multi_query_retrieve", inputs),
+        lambda: _query_variants_chain().ainvoke(inputs))
+    documents: List[Chunk] = await amulti_search_chunks(
+        _with_original(question, variants), chunk_limit=_retrieve_limit(),
+        filters=state.get("filters"))
+
+    return _retrieval_update(state, documents)
+
+
+def rerank(state: AgentState) -> Dict[str, Any]:
+    """Node 1b: The Librarian (local cross-encoder). Rescores the
+    over-fetched candidates, with the chunks kept from earlier attempts,
+    against the current question and keeps the top-k."""
+    logging.info("--- NODE: RERANK ---")
+    ranked: List[Chunk] = rerank_chunks(
+        state["question"], state["documents"], settings.RERANK_TOP_K)
+
+    top_score: float = ranked[0]["rerank_score"] if ranked else 0.0
+    confident: bool = top_score >= settings.RERANK_SKIP_GRADER_THRESHOLD
+    update: Dict[str, Any] = {
+        "documents": ranked,
+        "rerank_score": top_score,
+    }
+    if confident:
+        # The grader is skipped, so record the grade it would have given
+        update["grade"] = "yes"
+    return update
+
+
+async def arerank(state: AgentState) -> Dict[str, Any]:
+    """Node 1b (async): runs the CPU-bound reranker in a worker thread."""
+    return await asyncio.to_thread(rerank, state)
+
+
+def grade_documents(state: AgentState) -> Dict[str, Any]:
+    """Node 2: The Compliance Officer (Gemini). Grades every chunk in one
+    batched call and forwards only the relevant ones."""
+    logging.info("--- NODE: GRADE DOCUMENTS ---")
+    question: str = state["question"]
+    documents: List[Chunk] = state["documents"]
+
+    if not documents:
+        logging.info("--- JUDGE DECISION: no chunks retrieved -> no ---")
+        return {"question": question, "documents": [], "grade": "no"}
+
+    inputs: Dict[str, Any] = {
+        "question": question, "documents": _number_chunks(documents)}
+    score: GradeDocuments = llm_flight.do(
+        _llm_key("grade_documents", inputs),
+        lambda: _retrieval_grader().invoke(inputs))
+
+    return _grade_result(state, score)
+
+
+async def agrade_documents(state: AgentState) -> Dict[str, Any]:
+    """Node 2 (async): The Compliance Officer (Gemini)"""
+    logging.info("--- NODE: GRADE DOCUMENTS ---")
+    question: str = state["question"]
+    documents: List[Chunk] = state["documents"]
+
+    if not documents:
+        logging.info("--- JUDGE DECISION: no chunks retrieved -> no ---")
+        return {"question": question, "documents": [], "grade": "no"}
+
+    inputs: Dict[str, Any] = {
+        "question": question, "documents": _number_chunks(documents)}
+    score: GradeDocuments = await allm_flight.do(
+        _llm_key("grade_documents", inputs),
+        lambda: _retrieval_grader().ainvoke(inputs))
+
+    return _grade_result(state, score)
+
+
+def generate(state: AgentState) -> Dict[str, Any]:
+    """Node 3: The Writer (Gemini)"""
+    logging.info("--- NODE: GENERATE ---")
+    question: str = state["question"]
+    # Best chunks first, within the context token budget
+    documents: List[Chunk] = pack_chunks(state["documents"])
+
+    inputs: Dict[str, Any] = {
+        "documents": format_context(documents), "question": question}
+    response: AIMessage = llm_flight.do(
+        _llm_key("generate", inputs), lambda: _rag_chain().invoke(inputs))
+
+    return {"generation": response.content, "documents": documents}
+
+
+async def agenerate(state: AgentState) -> Dict[str, Any]:
+    """Node 3 (async): The Writer (Gemini)"""
+    logging.info("--- NODE: GENERATE ---")
+    question: str = state["question"]
+    documents: List[Chunk] = pack_chunks(state["documents"])
+
+    # A coalesced follower streams no tokens: it receives the whole answer
+    # at once, like an LLM cache hit
+    inputs: Dict[str, Any] = {
+        "documents": format_context(documents), "question": question}
+    response: AIMessage = await allm_flight.do(
+        _llm_key("generate", inputs), lambda: _rag_chain().ainvoke(inputs))
 
-    return {"generation": response.content}
+    return {"generation": response.content, "documents": documents}
 
 
 def rewrite_query(state: AgentState,
-                  seconds_to_sleep: int = 10) -> Dict[str, Any]:
+                  seconds_to_sleep: int = 0) -> Dict[str, Any]:
     '''
 
     This node is triggered when the retrieved documents are graded as irrelevant
@@ -127,8 +504,10 @@ def rewrite_query(state: AgentState,
         state (AgentState): The current state of the agent graph, containing 
                             the original 'question' and the current
                             'retry_count'.
-        seconds_to_sleep (int): Number of seconds to sleep to avoid rate 
-                                limits when calling the LLM
+        seconds_to_sleep (int): Extra fixed delay before calling the LLM.
+                                Defaults to 0: quota is handled by the
+                                shared rate limiter, so with headroom the
+                                rewrite starts immediately.
     Returns:
         Dict[str, Any]: A dictionary containing:
             - "question" (str): The newly rewritten, optimized question string.
@@ -139,32 +518,42 @@ def rewrite_query(state: AgentState,
     
     logging.info("--- NODE: REWRITE QUERY ---")
 
-    logging.info("Sleeping for a while to not hit rate limits")
-    time.sleep(seconds_to_sleep)
+    if seconds_to_sleep:
+        time.sleep(seconds_to_sleep)
 
     question: str = state["question"]
 
-    # A specific prompt to act as a "Translator"
-    # "Look at the initial question and formulate an improved question 
-    # that is more likely to retrieve relevant facts."
-    msg: List[Tuple[str, str]] = [
-        ("system", """You are a query rewriter that converts an input question
-        to a better version that is optimized for vector retrieval.
-        Look at the initial and formulate an improved question.
-        IMPORTANT: Output ONLY the improved question string. Do not output
-        'Improved Question:' or any preamble."""),
-        ("human", f"Initial Question: {question} \n Formulate an improved "
-                  "question."),
-    ]
+    messages: List[Tuple[str, str]] = _rewrite_messages(question)
+    better_question: AIMessage = llm_flight.do(
+        _llm_key("rewrite_query", messages),
+        lambda: get_node_llm("rewrite_query").invoke(messages))
+    return _rewrite_result(state, better_question.content)
 
-    better_question: ChatGoogleGenerativeAI = llm.invoke(msg)
-    clean_question: str = better_question.content.replace(
-        "Improved Question:", "").strip()
-    logging.info(f"--- REWRITTEN QUERY: {clean_question} ---")
-    
-    # Update the state with the NEW question
-    # Also increment the retry counter to prevent infinite loops later
-    return {
-        "question": clean_question,
-        "retry_count": state.get("retry_count", 0) + 1
-    }
+
+async def arewrite_query(state: AgentState,
+                         seconds_to_sleep: int = 0) -> Dict[str, Any]:
+    '''
+
+    Async version of `rewrite_query`. Sleeps with `asyncio.sleep` and calls
+    the LLM with `ainvoke`, so other chat sessions keep running meanwhile.
+    Args:
+        state (AgentState): The current state of the agent graph.
+        seconds_to_sleep (int): Extra fixed delay before calling the LLM.
+    Returns:
+        Dict[str, Any]: The rewritten "question" and the incremented
+            "retry_count".
+
+    '''
+
+    logging.info("--- NODE: REWRITE QUERY ---")
+
+    if seconds_to_sleep:
+        await asyncio.sleep(seconds_to_sleep)
+
+    question: str = state["question"]
+
+    messages: List[Tuple[str, str]] = _rewrite_messages(question)
+    better_question: AIMessage = await allm_flight.do(
+        _llm_key("rewrite_query", messages),
+        lambda: get_node_llm("rewrite_query").ainvoke(messages))
+    return _rewrite_result(state, better_question.content)
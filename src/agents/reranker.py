@@ -0,0 +1,57 @@
+"""
+Local CPU reranking of retrieved chunks with a FastEmbed cross-encoder.
+"""
+
+import math
+import logging
+from typing import List
+
+from src.core.state import Chunk
+from src.utils.settings import settings
+from src.utils.embeddings import get_cross_encoder
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+
+def rerank_chunks(
+        query: str,
+        chunks: List[Chunk],
+        top_k: int) -> List[Chunk]:
+    """
+    Scores each chunk against the query and keeps the best ones.
+
+    Args:
+        query (str): The user question.
+        chunks (List[Chunk]): The chunks from `search_chunks`, with those
+            kept from earlier attempts: all of them are rescored.
+        top_k (int): Number of chunks to keep.
+
+    Returns:
+        List[Chunk]: The best chunks first, with their 'rerank_score': the
+            sigmoid of the cross-encoder logit, in [0, 1].
+    """
+    if not chunks:
+        return []
+
+    encoder = get_cross_encoder(settings.RERANKER_MODEL_NAME)
+    logits: List[float] = list(
+        encoder.rerank(query, [c["text"] for c in chunks]))
+    # Clamped to keep math.exp in range
+    ranked: List[Chunk] = sorted(
+        (
+            {**chunk,
+             "rerank_score":
+                 1 / (1 + math.exp(-max(-50.0, min(50.0, logit))))}
+            for chunk, logit in zip(chunks, logits)
+        ),
+        key=lambda chunk: chunk["rerank_score"], reverse=True)
+    logger.info(
+        f"Reranked {len(chunks)} chunks, top score "
+        f"{ranked[0]['rerank_score']:.3f}, "
+        f"keeping {min(top_k, len(ranked))}.")
+    return ranked[:top_k]
@@ -2,14 +2,40 @@
 Collection of tools available to the Agent for external data retrieval.
 """
 
+import json
+import math
+import asyncio
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-from langchain_core.tools import tool
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import QueryResponse
+from langchain_core.tools import StructuredTool
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import (
+    DatetimeRange,
+    FieldCondition,
+    Filter,
+    Fusion,
+    FusionQuery,
+    MatchAny,
+    MatchValue,
+    Prefetch,
+    ScoredPoint,
+    SparseVector
+)
 
+from src.core.state import Chunk, RetrievalFilters
 from src.utils.settings import settings
+from src.utils.ttl_cache import TTLCache
+from src.utils.single_flight import AsyncSingleFlight, SingleFlight
+from src.utils.embeddings import get_dense_model, get_sparse_model
+from src.utils.collection_version import get_collection_version
+from src.ingestion.collection import search_params
+from src.utils.qdrant_pool import (
+    get_async_qdrant_client,
+    get_qdrant_client,
+    qdrant_manager
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,72 +44,527 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@tool
-def retrieve_documents(
+# Eval re-runs, popular questions and rewrites that converge on the same
+# query skip the embedding and/or the Qdrant round-trip
+embedding_cache: TTLCache[Tuple[List[float], SparseVector]] = TTLCache(
+    "query_embedding",
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    enabled=settings.QUERY_CACHE_ENABLED,
+)
+retrieval_cache: TTLCache[List[Chunk]] = TTLCache(
+    "retrieval",
+    max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+    enabled=settings.QUERY_CACHE_ENABLED,
+)
+# Identical searches in flight at the same time (same question, limit and
+# filters) share one embedding and one Qdrant round-trip
+search_flight: SingleFlight[List[Chunk]] = SingleFlight("search")
+asearch_flight: AsyncSingleFlight[List[Chunk]] = AsyncSingleFlight("search")
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two vectors, 0.0 if either is null."""
+    norm: float = math.sqrt(
+        sum(x * x for x in a) * sum(y * y for y in b))
+    if not norm:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / norm
+
+
+def _to_chunk(
+        res: ScoredPoint,
+        query_vector: Optional[List[float]] = None) -> Chunk:
+    """
+    Converts one Qdrant hit into a structured chunk.
+
+    Args:
+        res (ScoredPoint): A hit returned by `client.query_points`, with
+            its dense vector (see `_hybrid_request`).
+        query_vector (Optional[List[float]]): The dense query vector, to
+            measure the similarity of the hit.
+
+    Returns:
+        Chunk: The chunk text, its source, page, point ID, score and
+            similarity.
+    """
+    # Note: the ingestion stores the chunk text under 'document', next to
+    # the PDF metadata
+    payload: Dict[str, Any] = res.payload or {}
+    vectors: Any = res.vector
+    stored: Optional[List[float]] = \
+        vectors.get(settings.DENSE_VECTOR_NAME) \
+        if isinstance(vectors, dict) else None
+    similarity: float = _cosine(query_vector, stored) \
+        if query_vector and stored else 0.0
+    return {
+        "id": str(res.id),
+        "text": payload.get("document", "No content available"),
+        "source": payload.get("source", "Unknown Source"),
+        "page": payload.get("page", "Unknown Page"),
+        "score": float(res.score),
+        "similarity": similarity,
+    }
+
+
+def format_chunk(chunk: Chunk) -> str:
+    """
+    Formats one chunk into a context block for the LLM.
+
+    Args:
+        chunk (Chunk): A chunk from `search_chunks`.
+
+    Returns:
+        str: A "--- Document Chunk ---" block with source and page.
+    """
+    return (
+        f"--- Document Chunk ---\n"
+        f"Source: {chunk['source']} (Page {chunk['page']})\n"
+        f"Content: {chunk['text']}\n"
+    )
+
+
+def _format_results(results: List[Chunk]) -> str:
+    """
+    Formats search results into a context string for the LLM.
+
+    Args:
+        results (List[Chunk]): The chunks of `_query`.
+
+    Returns:
+        str: One "--- Document Chunk ---" block per hit.
+    """
+    if not results:
+        logger.warning("No documents found for query.")
+        return "No relevant documents found in the database."
+
+    final_context = "\n".join(
+        format_chunk(chunk) for chunk in results)
+    logger.info(f"Retrieved {len(results)} documents successfully.")
+    return final_context
+
+
+def normalize_query(query: str) -> str:
+    """Key form of a query, for the caches and request coalescing: case
+    and whitespace do not matter."""
+    return " ".join(query.lower().split())
+
+
+def _embed_query(query: str) -> Tuple[List[float], SparseVector]:
+    """
+    Embeds the query with the same dense and sparse models as the ingestion.
+
+    Returns:
+        Tuple[List[float], SparseVector]: The dense and the sparse vector.
+    """
+    key: Tuple[str, str, str] = (
+        settings.EMBEDDING_MODEL_NAME, settings.SPARSE_MODEL_NAME,
+        normalize_query(query))
+    cached: Optional[Tuple[List[float], SparseVector]] = \
+        embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    dense = next(iter(
+        get_dense_model(settings.EMBEDDING_MODEL_NAME).query_embed(query)))
+    sparse = next(iter(
+        get_sparse_model(settings.SPARSE_MODEL_NAME).query_embed(query)))
+    vectors: Tuple[List[float], SparseVector] = (
+        dense.tolist(),
+        SparseVector(
+            indices=sparse.indices.tolist(), values=sparse.values.tolist()))
+    embedding_cache.put(key, vectors)
+    return vectors
+
+
+def _match(key: str, value: str | List[str]) -> FieldCondition:
+    """Condition on a keyword field: one value, or any of a list."""
+    if isinstance(value, str):
+        return FieldCondition(key=key, match=MatchValue(value=value))
+    return FieldCondition(key=key, match=MatchAny(any=list(value)))
+
+
+def build_filter(
+        filters: Optional[RetrievalFilters] = None) -> Optional[Filter]:
+    """
+    Translates the retrieval filters into a Qdrant filter.
+
+    The filtered fields have payload indexes (see
+    `src.ingestion.collection.PAYLOAD_INDEXES`), so Qdrant narrows the
+    candidates before scoring them instead of post-filtering the top-k.
+
+    Args:
+        filters (Optional[RetrievalFilters]): The metadata restrictions.
+
+    Returns:
+        Optional[Filter]: The filter, or None when nothing is restricted.
+    """
+    if not filters:
+        return None
+
+    must: List[Any] = []
+    for key in ("document_set", "department"):
+        if filters.get(key):
+            must.append(_match(key, filters[key]))
+
+    if filters.get("source"):
+        # A deduplicated chunk is shared by every document in 'sources'
+        must.append(Filter(should=[
+            _match("source", filters["source"]),
+            _match("sources", filters["source"]),
+        ]))
+
+    after: Optional[str] = filters.get("effective_after")
+    before: Optional[str] = filters.get("effective_before")
+    if after or before:
+        must.append(FieldCondition(
+            key="effective_date",
+            range=DatetimeRange(gte=after, lt=before)))
+
+    return Filter(must=must) if must else None
+
+
+def filters_key(filters: Optional[RetrievalFilters]) -> str:
+    """Canonical form of the filters, for the cache and coalescing keys."""
+    if not filters:
+        return ""
+    return json.dumps(
+        {k: v for k, v in filters.items() if v}, sort_keys=True)
+
+
+def _retrieval_key(
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> Tuple[str, ...]:
+    """Retrieval cache key. The collection version stamp is bumped by every
+    ingestion that changes the collection, which invalidates old results."""
+    return (
+        settings.QDRANT_COLLECTION_NAME, get_collection_version(),
+        normalize_query(query), str(chunk_limit), filters_key(filters))
+
+
+def _hybrid_request(
+        dense: List[float],
+        sparse: SparseVector,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> Dict[str, Any]:
+    """
+    Builds one server-side hybrid query: a dense and a sparse (BM25)
+    prefetch, fused with Reciprocal Rank Fusion.
+
+    The filter is applied to both prefetches, so each of them returns its
+    best matching chunks rather than losing them to filtered-out ones.
+    RRF scores only reflect ranks, so the hits also come with their dense
+    vector: `_to_chunk` measures their actual similarity to the query.
+    """
+    prefetch_limit: int = max(chunk_limit, settings.HYBRID_PREFETCH_LIMIT)
+    query_filter: Optional[Filter] = build_filter(filters)
+    return {
+        "collection_name": settings.QDRANT_COLLECTION_NAME,
+        "prefetch": [
+            Prefetch(query=dense, using=settings.DENSE_VECTOR_NAME,
+                     filter=query_filter, limit=prefetch_limit,
+                     params=search_params()),
+            Prefetch(query=sparse, using=settings.SPARSE_VECTOR_NAME,
+                     filter=query_filter, limit=prefetch_limit),
+        ],
+        "query": FusionQuery(fusion=Fusion.RRF),
+        "query_filter": query_filter,
+        "limit": chunk_limit,  # Retrieve top N most relevant chunks
+        "with_payload": True,
+        "with_vectors": [settings.DENSE_VECTOR_NAME],
+    }
+
+
+def _search(
+        key: Tuple[str, ...],
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters]) -> List[Chunk]:
+    """Embeds the query and searches, then caches the chunks under `key`
+    (without the vectors, which are only needed to measure similarity)."""
+    # Shared pooled client: no connection setup on the hot path
+    client: QdrantClient = get_qdrant_client()
+
+    dense, sparse = _embed_query(query)
+    points: List[ScoredPoint] = client.query_points(
+        **_hybrid_request(dense, sparse, chunk_limit, filters)).points
+    chunks: List[Chunk] = [_to_chunk(point, dense) for point in points]
+    retrieval_cache.put(key, chunks)
+    return chunks
+
+
+async def _asearch(
+        key: Tuple[str, ...],
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters]) -> List[Chunk]:
+    """Async version of `_search`."""
+    client: AsyncQdrantClient = get_async_qdrant_client()
+
+    # Embedding is CPU-bound: keep it off the event loop
+    dense, sparse = await asyncio.to_thread(_embed_query, query)
+    response = await client.query_points(
+        **_hybrid_request(dense, sparse, chunk_limit, filters))
+    chunks: List[Chunk] = [
+        _to_chunk(point, dense) for point in response.points]
+    retrieval_cache.put(key, chunks)
+    return chunks
+
+
+def _query(
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> List[Chunk]:
+    """Runs the hybrid search on the pooled sync client."""
+    key: Tuple[str, ...] = _retrieval_key(query, chunk_limit, filters)
+    cached: Optional[List[Chunk]] = retrieval_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    return list(search_flight.do(
+        key, lambda: _search(key, query, chunk_limit, filters)))
+
+
+async def _aquery(
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> List[Chunk]:
+    """Runs the hybrid search on the pooled async client."""
+    key: Tuple[str, ...] = _retrieval_key(query, chunk_limit, filters)
+    cached: Optional[List[Chunk]] = retrieval_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    return list(await asearch_flight.do(
+        key, lambda: _asearch(key, query, chunk_limit, filters)))
+
+
+async def _arecover() -> None:
+    """Recycles the async pool if the connection went bad."""
+    if not await qdrant_manager.ahealth_check():
+        await qdrant_manager.aclose()
+
+
+def search_chunks(
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> List[Chunk]:
+    """
+    Searches the vector database and returns one structured chunk per hit.
+
+    Unlike the `retrieve_documents` tool, the chunks are kept separate so
+    they can be graded, deduplicated and packed one by one.
+
+    Args:
+        query (str): The search string to look up in the database.
+        chunk_limit (int): The maximum number of document chunks to retrieve.
+        filters (Optional[RetrievalFilters]): Metadata restrictions.
+
+    Returns:
+        List[Chunk]: The chunks, best first. Empty on error.
+    """
+    logger.info(f"Searching chunks for query: '{query}'")
+    try:
+        results: List[Chunk] = _query(query, chunk_limit, filters)
+    except Exception as e:
+        logger.error(f"Error querying Qdrant: {e}", exc_info=True)
+        qdrant_manager.ensure_healthy()
+        return []
+
+    logger.info(f"Retrieved {len(results)} chunks.")
+    return results
+
+
+async def asearch_chunks(
+        query: str,
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> List[Chunk]:
+    """Async version of `search_chunks`, on the pooled async client."""
+    logger.info(f"Searching chunks for query: '{query}'")
+    try:
+        results: List[Chunk] = await _aquery(
+            query, chunk_limit, filters)
+    except Exception as e:
+        logger.error(f"Error querying Qdrant: {e}", exc_info=True)
+        await _arecover()
+        return []
+
+    logger.info(f"Retrieved {len(results)} chunks.")
+    return results
+
+
+def reciprocal_rank_fusion(
+        result_lists: List[List[Chunk]],
+        limit: int,
+        k: Optional[int] = None) -> List[Chunk]:
+    """
+    Fuses several ranked lists of chunks with Reciprocal Rank Fusion.
+
+    Args:
+        result_lists (List[List[Chunk]]): One ranked list per query.
+        limit (int): Number of chunks to return.
+        k (Optional[int]): RRF constant. Defaults to `settings.RRF_K`.
+
+    Returns:
+        List[Chunk]: The fused chunks, best first, without duplicates. Their
+            score is the fused RRF score scaled to (0, 1]: 1.0 for a chunk
+            ranked first in every list, like the hybrid search scores. Their
+            similarity is the best one to any of the queries.
+    """
+    k = k or settings.RRF_K
+    scores: Dict[str, float] = {}
+    chunks: Dict[str, Chunk] = {}
+    # The best possible fused score
+    scale: float = max(1, len(result_lists)) / (k + 1)
+    for results in result_lists:
+        for rank, chunk in enumerate(results, 1):
+            scores[chunk["id"]] = \
+                scores.get(chunk["id"], 0.0) + 1 / (k + rank) / scale
+            known: Optional[Chunk] = chunks.get(chunk["id"])
+            if known is None or chunk["similarity"] > known["similarity"]:
+                chunks[chunk["id"]] = chunk
+
+    fused: List[str] = sorted(scores, key=scores.get, reverse=True)
+    return [
+        {**chunks[chunk_id], "score": scores[chunk_id]}
+        for chunk_id in fused[:limit]
+    ]
+
+
+def multi_search_chunks(
+        queries: List[str],
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> List[Chunk]:
+    """
+    Runs one search per query concurrently and fuses them with RRF.
+
+    Args:
+        queries (List[str]): The query variants.
+        chunk_limit (int): Chunks fetched per query and returned overall.
+        filters (Optional[RetrievalFilters]): Metadata restrictions, shared
+            by every variant.
+
+    Returns:
+        List[Chunk]: The fused chunks, best first.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(queries))) as pool:
+        result_lists: List[List[Chunk]] = list(pool.map(
+            lambda q: search_chunks(q, chunk_limit, filters), queries))
+    return reciprocal_rank_fusion(result_lists, chunk_limit)
+
+
+async def amulti_search_chunks(
+        queries: List[str],
+        chunk_limit: int,
+        filters: Optional[RetrievalFilters] = None) -> List[Chunk]:
+    """Async version of `multi_search_chunks`, with `asyncio.gather`."""
+    result_lists: List[List[Chunk]] = list(await asyncio.gather(
+        *(asearch_chunks(q, chunk_limit, filters) for q in queries)))
+    return reciprocal_rank_fusion(result_lists, chunk_limit)
+
+
+def _tool_filters(
+        document_set: Optional[str],
+        source: Optional[str],
+        department: Optional[str],
+        effective_after: Optional[str],
+        effective_before: Optional[str]) -> RetrievalFilters:
+    """Collects the filter arguments of the tool that are set."""
+    values: Dict[str, Optional[str]] = {
+        "document_set": document_set,
+        "source": source,
+        "department": department,
+        "effective_after": effective_after,
+        "effective_before": effective_before,
+    }
+    return {k: v for k, v in values.items() if v}
+
+
+def _retrieve_documents(
     query: str,
-    chunk_limit: int) -> str:
+    chunk_limit: int,
+    document_set: Optional[str] = None,
+    source: Optional[str] = None,
+    department: Optional[str] = None,
+    effective_after: Optional[str] = None,
+    effective_before: Optional[str] = None) -> str:
 
     """
     Searches the vector database for documents relevant to the user query.
-    
-    Use this tool when you need to find specific information from the 
-    company policies, compliance documents, or technical manuals to answer 
+
+    Use this tool when you need to find specific information from the
+    company policies, compliance documents, or technical manuals to answer
     a user question.
 
     Args:
-        query (str): The search string to look up in the database. 
+        query (str): The search string to look up in the database.
                      Example: "What is the spending limit for travel?"
         chunk_limit (int): The maximum number of document chunks to retrieve.
+        document_set (Optional[str]): Only search this document set
+                                      (e.g. "hr", "finance").
+        source (Optional[str]): Only search this document (its path).
+        department (Optional[str]): Only search documents owned by this
+                                    department.
+        effective_after (Optional[str]): ISO date (YYYY-MM-DD): only
+                                         documents in force from this date.
+        effective_before (Optional[str]): ISO date (YYYY-MM-DD): only
+                                          documents in force before it.
 
     Returns:
         str: A formatted string containing the top retrieved document chunks
              and their sources.
     """
     logger.info(f"Tool 'retrieve_documents' invoked with query: '{query}'")
+    filters: RetrievalFilters = _tool_filters(
+        document_set, source, department, effective_after, effective_before)
 
     try:
-        client: QdrantClient = QdrantClient(url=settings.QDRANT_URL)
-
-        # Note: client.query() automatically handles the embedding of the 
-        # input text using FastEmbed, matching the 'ingest.py' logic.
-        results: List[QueryResponse] = client.query(
-            collection_name=settings.QDRANT_COLLECTION_NAME,
-            query_text=query,
-            limit=chunk_limit  # Retrieve top N most relevant chunks
-        )
-
-        if not results:
-            logger.warning("No documents found for query.")
-            return "No relevant documents found in the database."
-
-        # Format the results into a context string for the LLM
-        context_parts: List[str] = []
-        for res in results:
-            # Accessing the payload (metadata) + content
-            # Note: The structure depends on how Qdrant returns the
-            # QueryResponse In the Python client, 'document' is the text content
-            # if managed by FastEmbed
-            content: str = getattr(res, "document", "No content available")
-            source: str = res.metadata.get("source", "Unknown Source")
-            page: str = res.metadata.get("page", "Unknown Page")
-
-            chunk_text = (
-                f"--- Document Chunk ---\n"
-                f"Source: {source} (Page {page})\n"
-                f"Content: {content}\n"
-            )
-            context_parts.append(chunk_text)
-
-        final_context = "\n".join(context_parts)
-        logger.info(f"Retrieved {len(results)} documents successfully.")
-        return final_context
+        return _format_results(_query(query, chunk_limit, filters))
 
     except Exception as e:
         # Raising error is not a good idea to avoid the agent to crash
         logger.error(f"Error querying Qdrant: {e}", exc_info=True)
+        # Recycle the pool if the connection went bad
+        qdrant_manager.ensure_healthy()
         return f"Error retrieving documents: {str(e)}"
 
 
+async def _aretrieve_documents(
+    query: str,
+    chunk_limit: int,
+    document_set: Optional[str] = None,
+    source: Optional[str] = None,
+    department: Optional[str] = None,
+    effective_after: Optional[str] = None,
+    effective_before: Optional[str] = None) -> str:
+
+    """Async version of `retrieve_documents`, using the pooled
+    `AsyncQdrantClient` so the event loop is never blocked on I/O."""
+    logger.info(f"Tool 'retrieve_documents' invoked with query: '{query}'")
+    filters: RetrievalFilters = _tool_filters(
+        document_set, source, department, effective_after, effective_before)
+
+    try:
+        return _format_results(await _aquery(query, chunk_limit, filters))
+
+    except Exception as e:
+        logger.error(f"Error querying Qdrant: {e}", exc_info=True)
+        await _arecover()
+        return f"Error retrieving documents: {str(e)}"
+
+
+# One tool, two implementations: 'invoke' runs the sync client and
+# 'ainvoke' the async one
+retrieve_documents: StructuredTool = StructuredTool.from_function(
+    func=_retrieve_documents,
+    coroutine=_aretrieve_documents,
+    name="retrieve_documents",
+    description=_retrieve_documents.__doc__,
+)
+
+
 if __name__ == "__main__":
     # Simple local test to verify the tool works without the Agent
     test_query = "remote work"
@@ -0,0 +1,459 @@
+"""
+HTTP API of the Compliance Agent, for programmatic and bulk access.
+
+Endpoints:
+    POST /ask           One question, answered when the graph finishes.
+    POST /ask/batch     Many questions, run with bounded concurrency.
+    GET  /ask/stream    Server-Sent Events: node progress, answer tokens,
+                        then the final answer.
+    GET  /health        Liveness / readiness.
+    GET  /metrics       Prometheus metrics, aggregated over the workers.
+
+Run it with:
+    uv run python -m src.app.api --workers 4
+
+With several workers, the entry point points `PROMETHEUS_MULTIPROC_DIR` at
+a fresh directory (unless it is already set) so every worker's metrics are
+served by any of them. Started another way (e.g. `uvicorn --workers`), set
+it yourself, or `/metrics` only shows the worker that happened to answer.
+
+Every worker process warms up its own models and pools on startup. On
+SIGTERM uvicorn stops accepting connections and gives the in-flight
+requests `settings.API_SHUTDOWN_TIMEOUT_SECONDS` to finish before the pools
+are closed.
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from datetime import date
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.core.graph import ainvoke, astream
+from src.core.state import RetrievalFilters
+from src.core.answer_cache import answer_cache
+from src.core.warmup import awarm_up
+from src.utils.settings import settings
+from src.utils.chat_model import message_text
+from src.utils.qdrant_pool import qdrant_manager
+from src.utils.metrics import (
+    TIME_TO_FIRST_TOKEN,
+    mark_worker_dead,
+    metrics_router
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+
+# --- SCHEMAS ----------------------------------------------------------------
+
+class SearchFilters(BaseModel):
+    """Restricts the retrieval to some documents. A list matches any of
+    its values; the fields that are set must all match."""
+    document_set: Optional[str | List[str]] = None
+    source: Optional[str | List[str]] = None
+    department: Optional[str | List[str]] = None
+    effective_after: Optional[date] = Field(
+        default=None, description="Documents in force from this date on.")
+    effective_before: Optional[date] = Field(
+        default=None, description="Documents in force before this date.")
+
+    def to_state(self) -> RetrievalFilters:
+        """The filters as the graph state holds them (ISO date strings)."""
+        return self.model_dump(mode="json", exclude_none=True)
+
+
+class AskRequest(BaseModel):
+    """One question for the agent."""
+    question: str = Field(min_length=1, description="The user question.")
+    filters: Optional[SearchFilters] = None
+
+
+class SourceChunk(BaseModel):
+    """A chunk the answer was generated from."""
+    id: str
+    text: str
+    source: str
+    page: int | str
+    score: float
+    rerank_score: Optional[float] = None
+
+
+class AskResponse(BaseModel):
+    """The agent's answer and how it was obtained."""
+    question: str
+    answer: str
+    grade: str = Field(
+        description="'yes' if the context was judged relevant.")
+    retry_count: int
+    documents: List[SourceChunk]
+    cached: bool = Field(
+        description="Answered from the semantic answer cache.")
+    latency_seconds: float
+
+
+class BatchRequest(BaseModel):
+    """Several questions, answered independently."""
+    questions: List[str] = Field(min_length=1)
+    concurrency: Optional[int] = Field(
+        default=None, ge=1,
+        description="Max questions in flight. Defaults to "
+                    "settings.API_BATCH_CONCURRENCY.")
+    filters: Optional[SearchFilters] = Field(
+        default=None, description="Applied to every question.")
+
+
+class BatchItem(BaseModel):
+    """The outcome of one batch question: an answer or an error."""
+    index: int
+    response: Optional[AskResponse] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    """The batch results, in the order of the questions."""
+    results: List[BatchItem]
+    latency_seconds: float
+
+
+# --- AGENT ------------------------------------------------------------------
+
+# Caps the graph runs of this worker, whatever mix of single, batch and
+# streamed requests is in flight
+_run_slots: Optional[asyncio.Semaphore] = None
+
+
+def _slots() -> asyncio.Semaphore:
+    """The worker-wide run limiter, created on the server's event loop."""
+    global _run_slots
+    if _run_slots is None:
+        _run_slots = asyncio.Semaphore(settings.API_MAX_CONCURRENT_RUNS)
+    return _run_slots
+
+
+def _initial_state(
+        question: str,
+        filters: Optional[RetrievalFilters] = None) -> Dict[str, Any]:
+    """The graph input for a new question."""
+    state: Dict[str, Any] = {
+        "question": question,
+        "generation": "",
+        "documents": [],
+        "retry_count": 0,
+        "grade": "",
+    }
+    if filters:
+        state["filters"] = filters
+    return state
+
+
+async def answer(
+        question: str,
+        filters: Optional[RetrievalFilters] = None) -> AskResponse:
+    """
+    Answers one question: semantic cache first, then the graph.
+
+    The semantic cache is keyed on the question only, so filtered questions
+    always run the graph (and are not stored).
+
+    Args:
+        question (str): The user question.
+        filters (Optional[RetrievalFilters]): Metadata restrictions.
+
+    Returns:
+        AskResponse: The answer, its context and timings.
+    """
+    started: float = time.perf_counter()
+    cached: Optional[Dict[str, Any]] = \
+        None if filters else await answer_cache.alookup(question)
+    if cached is not None:
+        return AskResponse(
+            question=question,
+            answer=cached["generation"],
+            grade="yes",
+            retry_count=0,
+            documents=cached["documents"],
+            cached=True,
+            latency_seconds=time.perf_counter() - started,
+        )
+
+    async with _slots():
+        state: Dict[str, Any] = await ainvoke(
+            _initial_state(question, filters))
+
+    if state.get("grade") == "yes" and not filters:
+        await answer_cache.astore(
+            question, state["generation"], state.get("documents", []))
+
+    return AskResponse(
+        question=question,
+        answer=state.get("generation", ""),
+        grade=state.get("grade", ""),
+        retry_count=state.get("retry_count", 0),
+        documents=state.get("documents", []),
+        cached=False,
+        latency_seconds=time.perf_counter() - started,
+    )
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _node_event(node: str, output: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarises a node update for the progress stream."""
+    event: Dict[str, Any] = {"node": node}
+    if "documents" in output:
+        event["chunks"] = len(output["documents"])
+    for key in ("grade", "rerank_score", "retrieval_confidence",
+                "retry_count"):
+        if key in output:
+            event[key] = output[key]
+    if node == "rewrite_query":
+        event["question"] = output.get("question", "")
+    return event
+
+
+async def stream_answer(
+        question: str,
+        request: Request,
+        filters: Optional[RetrievalFilters] = None) -> AsyncIterator[str]:
+    """
+    Runs the graph with `astream` and yields SSE events.
+
+    Events: 'node' (one per finished node), 'token' (answer tokens as the
+    writer produces them), 'answer' (the final AskResponse), 'error', and
+    'done' last. Identical concurrent streams share one run (see
+    `src.core.graph.astream`). Stops as soon as the client disconnects.
+
+    Args:
+        question (str): The user question.
+        request (Request): The HTTP request, to detect disconnects.
+        filters (Optional[RetrievalFilters]): Metadata restrictions.
+
+    Yields:
+        str: Formatted SSE events.
+    """
+    started: float = time.perf_counter()
+    try:
+        cached: Optional[Dict[str, Any]] = \
+            None if filters else await answer_cache.alookup(question)
+        if cached is not None:
+            TIME_TO_FIRST_TOKEN.labels("answer_cache").observe(
+                time.perf_counter() - started)
+            yield _sse("answer", AskResponse(
+                question=question,
+                answer=cached["generation"],
+                grade="yes",
+                retry_count=0,
+                documents=cached["documents"],
+                cached=True,
+                latency_seconds=time.perf_counter() - started,
+            ).model_dump())
+            yield _sse("done", {})
+            return
+
+        # Accumulates the node updates into the final state
+        state: Dict[str, Any] = _initial_state(question, filters)
+        streamed: bool = False
+        async with _slots():
+            # Closed on disconnect: the shared run stops once none of its
+            # subscribers is left
+            async with aclosing(astream(
+                    _initial_state(question, filters),
+                    stream_mode=["updates", "messages"])) as events:
+                async for mode, payload in events:
+                    if await request.is_disconnected():
+                        logger.info("Client disconnected, leaving the run.")
+                        return
+
+                    if mode == "messages":
+                        chunk, metadata = payload
+                        # Only the writer's tokens: the rest is internal
+                        if metadata.get("langgraph_node") != "generate":
+                            continue
+                        token: str = message_text(chunk)
+                        if token:
+                            if not streamed:
+                                streamed = True
+                                TIME_TO_FIRST_TOKEN.labels("api").observe(
+                                    time.perf_counter() - started)
+                            yield _sse("token", {"text": token})
+                        continue
+
+                    for node, output in payload.items():
+                        state.update(output or {})
+                        yield _sse("node", _node_event(node, output or {}))
+
+        if state.get("grade") == "yes" and not filters:
+            await answer_cache.astore(
+                question, state["generation"], state.get("documents", []))
+
+        yield _sse("answer", AskResponse(
+            question=question,
+            answer=state.get("generation", ""),
+            grade=state.get("grade", ""),
+            retry_count=state.get("retry_count", 0),
+            documents=state.get("documents", []),
+            cached=False,
+            latency_seconds=time.perf_counter() - started,
+        ).model_dump())
+
+    except Exception as e:
+        logger.error(f"Streamed run failed: {e}", exc_info=True)
+        yield _sse("error", {"detail": str(e)})
+    yield _sse("done", {})
+
+
+# --- APP --------------------------------------------------------------------
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Warms the worker up before it accepts requests, and releases the
+    pools once uvicorn has drained the in-flight ones."""
+    if settings.WARMUP_ON_STARTUP:
+        await awarm_up()
+    yield
+    logger.info("Shutting down: closing the Qdrant pools...")
+    await qdrant_manager.aclose()
+    qdrant_manager.close()
+    mark_worker_dead()
+
+
+api: FastAPI = FastAPI(
+    title="Compliance Agent API",
+    description="Answers questions about company policies.",
+    lifespan=lifespan,
+)
+if settings.METRICS_ENABLED:
+    api.include_router(metrics_router)
+
+
+@api.get("/health")
+async def health() -> Dict[str, Any]:
+    """Reports whether the vector database is reachable."""
+    qdrant: bool = await qdrant_manager.ahealth_check()
+    if not qdrant:
+        raise HTTPException(status_code=503, detail="Qdrant is unreachable")
+    return {"status": "ok"}
+
+
+@api.post("/ask", response_model=AskResponse)
+async def ask(body: AskRequest) -> AskResponse:
+    """Answers one question."""
+    try:
+        return await answer(
+            body.question, body.filters.to_state() if body.filters else None)
+    except Exception as e:
+        logger.error(f"Agent execution failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api.post("/ask/batch", response_model=BatchResponse)
+async def ask_batch(body: BatchRequest) -> BatchResponse:
+    """
+    Answers many questions concurrently. One failing question does not fail
+    the batch: its item carries the error instead of a response.
+    """
+    if len(body.questions) > settings.API_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.API_BATCH_MAX_QUESTIONS} questions "
+                   "per batch.")
+
+    started: float = time.perf_counter()
+    batch_slots: asyncio.Semaphore = asyncio.Semaphore(
+        body.concurrency or settings.API_BATCH_CONCURRENCY)
+    filters: Optional[RetrievalFilters] = \
+        body.filters.to_state() if body.filters else None
+
+    async def run_one(index: int, question: str) -> BatchItem:
+        async with batch_slots:
+            try:
+                return BatchItem(
+                    index=index, response=await answer(question, filters))
+            except Exception as e:
+                logger.error(f"Batch question {index} failed: {e}")
+                return BatchItem(index=index, error=str(e))
+
+    results: List[BatchItem] = list(await asyncio.gather(
+        *(run_one(i, q) for i, q in enumerate(body.questions))))
+    return BatchResponse(
+        results=results, latency_seconds=time.perf_counter() - started)
+
+
+@api.get("/ask/stream")
+async def ask_stream(
+        request: Request,
+        question: str = Query(min_length=1),
+        document_set: Optional[List[str]] = Query(default=None),
+        source: Optional[List[str]] = Query(default=None),
+        department: Optional[List[str]] = Query(default=None),
+        effective_after: Optional[date] = None,
+        effective_before: Optional[date] = None) -> StreamingResponse:
+    """Streams node progress and answer tokens as Server-Sent Events. The
+    filter parameters can be repeated to match any of several values."""
+    filters: RetrievalFilters = SearchFilters(
+        document_set=document_set,
+        source=source,
+        department=department,
+        effective_after=effective_after,
+        effective_before=effective_before,
+    ).to_state()
+    return StreamingResponse(
+        stream_answer(question, request, filters or None),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def main() -> None:
+    """Command-line entry point: runs the API with uvicorn."""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Serve the Compliance Agent over HTTP.")
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    parser.add_argument("--workers", type=int, default=settings.API_WORKERS)
+    args: argparse.Namespace = parser.parse_args()
+
+    # Prometheus multiprocess mode: read when the workers import
+    # prometheus_client, so it must be set before they are spawned
+    metrics_dir: Optional[str] = None
+    if args.workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        metrics_dir = tempfile.mkdtemp(prefix="agent-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    try:
+        # An import string, so uvicorn can start several worker processes
+        uvicorn.run(
+            "src.app.api:api",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=settings.API_SHUTDOWN_TIMEOUT_SECONDS,
+        )
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
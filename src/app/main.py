@@ -4,7 +4,8 @@ Entry point for running the agent from the command line.
 
 import logging
 
-from src.core.graph import app
+from src.core.graph import invoke
+from src.core.answer_cache import answer_cache
 
 # Configure Logging
 logging.basicConfig(
@@ -36,7 +37,16 @@ def run_agent():
     logging.info(f"User Question: {user_question}")
     
     try:
-        final_state = app.invoke(initial_state)
+        # Near-identical questions are answered without running the graph
+        final_state = answer_cache.lookup(user_question)
+        if final_state is None:
+            final_state = invoke(initial_state)
+            if final_state.get("grade") == "yes":
+                answer_cache.store(
+                    user_question,
+                    final_state["generation"],
+                    final_state.get("documents", [])
+                )
         
         # 3. Print the Result
         logging.info("--- FINAL ANSWER ---")
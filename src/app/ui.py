@@ -4,21 +4,78 @@ Run this with: uv run chainlit run src/app/ui.py -w
 """
 
 import os
+import time
+import logging
 
 import chainlit as cl
-from src.core.graph import app
-from phoenix.otel import register
-from openinference.instrumentation.langchain import LangChainInstrumentor
+from src.core.graph import astream
+from src.core.answer_cache import answer_cache
+from src.utils.settings import settings
+from src.core.warmup import awarm_up
+from src.utils.chat_model import message_text
+from src.utils.metrics import (
+    STARTUP_PHASE_SECONDS,
+    TIME_TO_FIRST_TOKEN,
+    start_metrics_server
+)
 
-collector_endpoint = os.getenv(
-    "PHOENIX_COLLECTOR_ENDPOINT", "http://127.0.0.1:6006/v1/traces")
+logger = logging.getLogger(__name__)
 
-tracer_provider = register(
-    project_name="compliance-agent", 
-    endpoint=collector_endpoint
-)
+_tracing_ready = False
+
+
+def _setup_tracing() -> None:
+    """Registers Phoenix and instruments LangChain, once per process.
+    Done at app startup rather than at import, so importing this module
+    stays cheap."""
+    global _tracing_ready
+    if _tracing_ready:
+        return
+    _tracing_ready = True
+
+    from phoenix.otel import register
+    from openinference.instrumentation.langchain import LangChainInstrumentor
+
+    collector_endpoint = os.getenv(
+        "PHOENIX_COLLECTOR_ENDPOINT", "http://127.0.0.1:6006/v1/traces")
+
+    tracer_provider = register(
+        project_name="compliance-agent", 
+        endpoint=collector_endpoint
+    )
+
+    LangChainInstrumentor().instrument(tracer_provider=tracer_provider)
+
+
+def _log_time_to_first_token(started: float, source: str) -> None:
+    """Logs and exports time-to-first-token, the latency users actually
+    perceive."""
+    ttft = time.perf_counter() - started
+    TIME_TO_FIRST_TOKEN.labels(source).observe(ttft)
+    logger.info(
+        f"metric=time_to_first_token_seconds value={ttft:.3f} "
+        f"source={source}")
+
+@cl.on_app_startup
+async def on_startup():
+    """
+    Process startup: tracing, the metrics endpoint and the warm-up, timed
+    phase by phase, before the first user message arrives.
+    """
+    started = time.perf_counter()
+    _setup_tracing()
+    elapsed = time.perf_counter() - started
+    STARTUP_PHASE_SECONDS.labels("tracing").set(elapsed)
+    logger.info(
+        f"metric=startup_phase_seconds value={elapsed:.3f} phase=tracing")
+
+    # Prometheus scrape endpoint, next to the Chainlit server
+    if settings.METRICS_ENABLED:
+        start_metrics_server()
+
+    if settings.WARMUP_ON_STARTUP:
+        await awarm_up()
 
-LangChainInstrumentor().instrument(tracer_provider=tracer_provider)
 
 @cl.on_chat_start
 async def start():
@@ -53,20 +110,70 @@ async def main(message: cl.Message):
     final_answer = cl.Message(content="")
 
     # 3. Stream the Graph Execution
+    started = time.perf_counter()
     try:
-        # 'astream' yields the output of each node as it finishes
-        async for output in app.astream(initial_state):
-            for node_name, node_output in output.items():
+        # Near-identical questions are answered from the semantic cache
+        cached = await answer_cache.alookup(message.content)
+        if cached is not None:
+            async with cl.Step(name="Answer Cache", type="tool") as step:
+                step.output = "Answered from a similar previous question."
+            _log_time_to_first_token(started, "answer_cache")
+            await cl.Message(content=cached["generation"]).send()
+            return
+
+        documents = []
+        grade = ""
+        streamed = False
+
+        # 'updates' yields the output of each node as it finishes, and
+        # 'messages' yields the LLM tokens as they are produced. Sessions
+        # asking the same question at the same time share one run.
+        async for mode, payload in astream(
+                initial_state, stream_mode=["updates", "messages"]):
+
+            # --- STREAM THE ANSWER TOKENS ---
+            if mode == "messages":
+                chunk, metadata = payload
+                # Only the writer's tokens: grader/refiner calls are internal
+                if metadata.get("langgraph_node") != "generate":
+                    continue
+                token = message_text(chunk)
+                if token:
+                    if not streamed:
+                        streamed = True
+                        _log_time_to_first_token(started, "graph")
+                    await final_answer.stream_token(token)
+                continue
+
+            for node_name, node_output in payload.items():
 
                 # --- VISUALIZE THE STEPS ---
 
                 if node_name == "retrieve":
+                    documents = node_output.get("documents", [])
+                    grade = node_output.get("grade", grade)
+                    confidence = node_output.get("retrieval_confidence")
                     async with cl.Step(name="Retriever", type="tool") as step:
                         step.input = "Searching Vector DB..."
-                        step.output = "Found relevant chunks."
+                        step.output = f"Found {len(documents)} chunks." + (
+                            f" Retrieval confidence: {confidence}."
+                            if confidence else "")
+
+                elif node_name == "rerank":
+                    score = node_output.get("rerank_score", 0.0)
+                    documents = node_output.get("documents", documents)
+                    grade = node_output.get("grade", grade)
+                    async with cl.Step(name="Reranker", type="tool") as step:
+                        step.output = (
+                            f"Top relevance score {score:.2f}"
+                            + (" - skipping the auditor."
+                               if grade == "yes" else ".")
+                        )
 
                 elif node_name == "grade_documents":
                     grade = node_output.get("grade", "unknown")
+                    # Only the chunks graded relevant reach the answer
+                    documents = node_output.get("documents", documents)
                     async with cl.Step(name="Auditor", type="llm") as step:
                         if grade == "yes":
                             step.output = "Documents are relevant."
@@ -85,11 +192,19 @@ async def main(message: cl.Message):
 
                 elif node_name == "generate":
                     answer_text = node_output.get("generation", "")
+                    # The packed chunks the answer was generated from
+                    documents = node_output.get("documents", documents)
+                    if not streamed and answer_text:
+                        # e.g. an LLM cache hit: nothing was streamed
+                        _log_time_to_first_token(started, "graph")
                     final_answer.content = answer_text
 
         # 4. Send final answer only if we succeeded without error
         if final_answer.content:
             await final_answer.send()
+            if grade == "yes":
+                await answer_cache.astore(
+                    message.content, final_answer.content, documents)
         else:
             await cl.Message(content="Unable to generate an answer.").send()
 
@@ -0,0 +1,213 @@
+"""
+Semantic answer cache placed in front of the LangGraph application.
+
+Near-identical questions ("remote work policy", "what's the remote work
+policy?") are answered from the cache instead of running the
+retrieve -> grade -> generate path again.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.core.state import Chunk
+from src.utils.settings import settings
+from src.utils.embeddings import get_dense_model
+from src.utils.collection_version import get_collection_version
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """
+    A previously answered question.
+
+    Attributes:
+        question (str): The question as it was asked.
+        embedding (np.ndarray): The L2-normalised question embedding.
+        generation (str): The final answer.
+        documents (List[Chunk]): The context the answer was generated from.
+        created_at (float): `time.monotonic()` at insertion.
+    """
+    question: str
+    embedding: np.ndarray
+    generation: str
+    documents: List[Chunk]
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    LRU/TTL cache of answers, looked up by question embedding similarity.
+
+    The whole cache is dropped as soon as the collection version stamp
+    changes, i.e. after any ingestion that modified the collection.
+
+    Attributes:
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Size limit; the least recently used entry is
+            evicted beyond it.
+        ttl_seconds (float): Entries older than this are never returned.
+        enabled (bool): When False, lookups always miss and nothing is stored.
+        hits (int): Number of cache hits.
+        misses (int): Number of cache misses.
+    """
+
+    def __init__(
+            self,
+            threshold: Optional[float] = None,
+            max_entries: Optional[int] = None,
+            ttl_seconds: Optional[float] = None,
+            enabled: Optional[bool] = None) -> None:
+
+        self.threshold: float = threshold or \
+            settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries: int = max_entries or \
+            settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl_seconds: float = ttl_seconds or \
+            settings.SEMANTIC_CACHE_TTL_SECONDS
+        self.enabled: bool = settings.SEMANTIC_CACHE_ENABLED \
+            if enabled is None else enabled
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._lock: threading.Lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._version: str = get_collection_version()
+
+    def _embed(self, question: str) -> np.ndarray:
+        """Embeds and L2-normalises a question."""
+        model = get_dense_model(settings.EMBEDDING_MODEL_NAME)
+        vector: np.ndarray = next(iter(model.embed([question])))
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_version(self) -> None:
+        """Drops everything if the collection changed since the last call.
+        Must be called with the lock held."""
+        version: str = get_collection_version()
+        if version != self._version:
+            logger.info("Collection changed: clearing semantic answer cache.")
+            self._entries.clear()
+            self._version = version
+
+    def _evict_expired(self, now: float) -> None:
+        """Removes entries past their TTL. Must be called with the lock."""
+        expired: List[str] = [
+            key for key, entry in self._entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached answer of the most similar question, if any.
+
+        Args:
+            question (str): The incoming user question.
+
+        Returns:
+            Optional[Dict[str, Any]]: A state-like dict with 'question',
+                'generation' and 'documents' on a hit, None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        embedding: np.ndarray = self._embed(question)
+
+        with self._lock:
+            self._check_version()
+            self._evict_expired(time.monotonic())
+
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            keys: List[str] = list(self._entries.keys())
+            matrix: np.ndarray = np.stack(
+                [self._entries[key].embedding for key in keys])
+            similarities: np.ndarray = matrix @ embedding
+            best: int = int(np.argmax(similarities))
+
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(keys[best])
+            entry: CacheEntry = self._entries[keys[best]]
+
+        logger.info(
+            f"Semantic cache hit ({similarities[best]:.3f}): "
+            f"'{question}' ~ '{entry.question}'")
+        return {
+            "question": question,
+            "generation": entry.generation,
+            "documents": list(entry.documents),
+        }
+
+    def store(
+            self,
+            question: str,
+            generation: str,
+            documents: List[Chunk]) -> None:
+        """
+        Caches the answer to a question.
+
+        Args:
+            question (str): The original user question.
+            generation (str): The final answer.
+            documents (List[Chunk]): The context used for the answer.
+        """
+        if not self.enabled or not generation:
+            return
+
+        embedding: np.ndarray = self._embed(question)
+        key: str = question.strip().lower()
+
+        with self._lock:
+            self._check_version()
+            self._entries[key] = CacheEntry(
+                question=question,
+                embedding=embedding,
+                generation=generation,
+                documents=list(documents),
+                created_at=time.monotonic(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def alookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """Async `lookup`: embedding runs off the event loop."""
+        return await asyncio.to_thread(self.lookup, question)
+
+    async def astore(
+            self,
+            question: str,
+            generation: str,
+            documents: List[Chunk]) -> None:
+        """Async `store`: embedding runs off the event loop."""
+        await asyncio.to_thread(self.store, question, generation, documents)
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache."""
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+answer_cache: SemanticAnswerCache = SemanticAnswerCache()
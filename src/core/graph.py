@@ -4,15 +4,35 @@ It maps the nodes (workers) to the edges (logic flow).
 """
 
 import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 from langgraph.graph import END, StateGraph, START
+from langgraph.types import RetryPolicy
 
+from src.utils.settings import settings
+from src.utils.rate_limiter import is_rate_limit_error
 from src.core.state import AgentState
+from src.core.instrumentation import instrumented_node
+from src.agents.tools import filters_key, normalize_query
+from src.utils.single_flight import (
+    AsyncSingleFlight,
+    SingleFlight,
+    StreamFlight
+)
 from src.agents.nodes import (
     retrieve,
+    aretrieve,
+    multi_query_retrieve,
+    amulti_query_retrieve,
+    rerank,
+    arerank,
     grade_documents,
+    agrade_documents,
     generate,
-    rewrite_query
+    agenerate,
+    rewrite_query,
+    arewrite_query
 )
 
 def decide_to_generate(
@@ -48,6 +68,12 @@ def decide_to_generate(
     grade: str = state["grade"]
     retry_count: int = state.get("retry_count", 0)
 
+    # Multi-query mode: the single wide retrieval replaces the rewrite loop,
+    # so whatever passed the grader goes to generation
+    if settings.RETRIEVAL_MODE == "multi_query":
+        logging.info("--- DECISION: MULTI-QUERY MODE -> GENERATE ---")
+        return "generate"
+
     # Safety Valve: If we tried 3 times, just give up and generate 
     # (to prevent infinite loops / $$ costs)
     if retry_count >= max_retries:
@@ -62,36 +88,244 @@ def decide_to_generate(
         return "rewrite_query"
 
 
-# 1. Initialize the Graph with our TypedDict State
-workflow: StateGraph = StateGraph(AgentState)
-
-# 2. Add the Nodes (The Workers)
-# syntax: workflow.add_node("name_of_node", function_to_call)
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("grade_documents", grade_documents)
-workflow.add_node("generate", generate)
-workflow.add_node("rewrite_query", rewrite_query)
-
-# 3. Define the Edges (The Logic Flow)
-# For this MVP step, we connect them linearly.
-# Logic: Start -> Retrieve -> Grade -> Generate -> End
-workflow.add_edge(START, "retrieve")
-workflow.add_edge("retrieve", "grade_documents")
-
-# Conditional Edge: Decide whether to Generate or Rewrite Query
-workflow.add_conditional_edges(
-    "grade_documents",
-    decide_to_generate,
-    {
-        "generate": "generate",
-        "rewrite_query": "rewrite_query"
-    }
-)
+def decide_after_retrieve(state: AgentState) -> str:
+
+    """
+    Adaptive retrieval mode: routes on the retrieval confidence, so the LLM
+    grader only runs for the borderline retrievals.
+
+    Args:
+        state (AgentState): The current state, containing
+            'retrieval_confidence' (see `src.agents.context`).
+
+    Returns:
+        str: "generate" for a confident retrieval, "grade_documents" for a
+        borderline one, and the `decide_to_generate` route (a rewrite,
+        unless the retries are exhausted) for a weak one.
+    """
+
+    confidence: str = state.get("retrieval_confidence", "medium")
+    if confidence == "high":
+        logging.info("--- DECISION: HIGH RETRIEVAL CONFIDENCE -> GENERATE ---")
+        return "generate"
+    if confidence == "low":
+        # The retrieve node graded it "no": rewrite without a grading call,
+        # unless the retries are exhausted
+        logging.info("--- DECISION: LOW RETRIEVAL CONFIDENCE, NO GRADING ---")
+        return decide_to_generate(state)
+
+    logging.info("--- DECISION: RETRIEVAL CONFIDENCE MEDIUM -> GRADE ---")
+    return "grade_documents"
+
+
+def decide_after_rerank(
+        state: AgentState,
+        threshold: float | None = None) -> str:
+
+    """
+    Skips the LLM grader when the local reranker is confident enough.
+
+    Args:
+        state (AgentState): The current state, containing 'rerank_score'.
+        threshold (float | None, optional): Minimum top rerank score to go
+            straight to generation. Defaults to
+            `settings.RERANK_SKIP_GRADER_THRESHOLD`.
+
+    Returns:
+        str: "generate" when the top chunk is clearly relevant, otherwise
+        "grade_documents" for the borderline cases.
+    """
+
+    if threshold is None:
+        threshold = settings.RERANK_SKIP_GRADER_THRESHOLD
+    score: float = state.get("rerank_score", 0.0)
+
+    if score >= threshold:
+        logging.info(
+            f"--- DECISION: RERANK SCORE {score:.3f} -> GENERATE ---")
+        return "generate"
+
+    logging.info(
+        f"--- DECISION: RERANK SCORE {score:.3f} -> GRADE DOCUMENTS ---")
+    return "grade_documents"
+
+
+def build_graph() -> Any:
+    """
+    Wires and compiles the agent graph.
+
+    Returns:
+        CompiledStateGraph: The runnable application.
+    """
+    # 1. Initialize the Graph with our TypedDict State
+    workflow: StateGraph = StateGraph(AgentState)
+
+    # The only retry layer for LLM quota errors: the node runs again, so
+    # its call goes back through the rate limiter and waits for its backoff
+    # (the chat model itself does not retry, see src/utils/chat_model.py)
+    llm_retry: RetryPolicy = RetryPolicy(
+        max_attempts=1 + settings.LLM_RATE_LIMIT_RETRIES,
+        initial_interval=0.1,
+        retry_on=is_rate_limit_error,
+    )
 
-# Edge from Rewrite Query back to Retrieve
-workflow.add_edge("rewrite_query", "retrieve")
-workflow.add_edge("generate", END)
+    # 2. Add the Nodes (The Workers)
+    # Each node has a sync and an async implementation: 'app.invoke' (CLI,
+    # eval) runs the sync one, 'app.astream'/'app.ainvoke' (Chainlit) the
+    # async one, so concurrent chat sessions never block the event loop.
+    # Both are wrapped with the Prometheus instrumentation
+    # (src/core/instrumentation.py).
+    if settings.RETRIEVAL_MODE == "multi_query":
+        workflow.add_node(
+            "retrieve",
+            instrumented_node(
+                "retrieve", multi_query_retrieve, amulti_query_retrieve),
+            retry_policy=llm_retry)
+    else:
+        workflow.add_node(
+            "retrieve", instrumented_node("retrieve", retrieve, aretrieve))
+    workflow.add_node(
+        "grade_documents",
+        instrumented_node(
+            "grade_documents", grade_documents, agrade_documents),
+        retry_policy=llm_retry)
+    workflow.add_node(
+        "generate", instrumented_node("generate", generate, agenerate),
+        retry_policy=llm_retry)
+    workflow.add_node(
+        "rewrite_query",
+        instrumented_node("rewrite_query", rewrite_query, arewrite_query),
+        retry_policy=llm_retry)
+
+    # 3. Define the Edges (The Logic Flow)
+    # For this MVP step, we connect them linearly.
+    # Logic: Start -> Retrieve -> Grade -> Generate -> End
+    workflow.add_edge(START, "retrieve")
+
+    if settings.RERANKER_ENABLED:
+        # Retrieve -> Rerank -> (confident) Generate | (borderline) Grade
+        workflow.add_node(
+            "rerank", instrumented_node("rerank", rerank, arerank))
+        workflow.add_edge("retrieve", "rerank")
+        workflow.add_conditional_edges(
+            "rerank",
+            decide_after_rerank,
+            {
+                "generate": "generate",
+                "grade_documents": "grade_documents"
+            }
+        )
+    elif settings.RETRIEVAL_ADAPTIVE:
+        # Retrieve -> (confident) Generate | (borderline) Grade
+        #          | (weak) Rewrite
+        workflow.add_conditional_edges(
+            "retrieve",
+            decide_after_retrieve,
+            {
+                "generate": "generate",
+                "grade_documents": "grade_documents",
+                "rewrite_query": "rewrite_query"
+            }
+        )
+    else:
+        workflow.add_edge("retrieve", "grade_documents")
+
+    # Conditional Edge: Decide whether to Generate or Rewrite Query
+    workflow.add_conditional_edges(
+        "grade_documents",
+        decide_to_generate,
+        {
+            "generate": "generate",
+            "rewrite_query": "rewrite_query"
+        }
+    )
+
+    # Edge from Rewrite Query back to Retrieve
+    workflow.add_edge("rewrite_query", "retrieve")
+    workflow.add_edge("generate", END)
+
+    # 4. Compile the Graph
+    # This creates the "Runnable" application that we can invoke.
+    return workflow.compile()
+
+
+_app_lock: threading.Lock = threading.Lock()
+_app: Any = None
+
+
+def get_app() -> Any:
+    """Returns the compiled graph, built on first use."""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = build_graph()
+    return _app
+
+
+def __getattr__(name: str) -> Any:
+    """Keeps `from src.core.graph import app` working (compiles on
+    access)."""
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# --- COALESCED RUNS ----------------------------------------------------------
+# Sessions asking the same question at the same time share one graph run.
+# The evaluation and the benchmarks call `get_app()` directly: they measure
+# real runs.
+
+_invoke_flight: SingleFlight[Dict[str, Any]] = SingleFlight("graph")
+_ainvoke_flight: AsyncSingleFlight[Dict[str, Any]] = \
+    AsyncSingleFlight("graph")
+_stream_flight: StreamFlight[Any] = StreamFlight("graph_stream")
+
+
+def run_key(state: Dict[str, Any]) -> Tuple[str, str]:
+    """Coalescing key of a graph run: the normalised question and the
+    canonical filters."""
+    return (
+        normalize_query(state["question"]),
+        filters_key(state.get("filters")))
 
-# 4. Compile the Graph
-# This creates the "Runnable" application that we can invoke.
-app: StateGraph = workflow.compile()
+
+def invoke(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the graph to completion, sharing the run with identical
+    concurrent requests.
+
+    Args:
+        state (Dict[str, Any]): The initial state.
+
+    Returns:
+        Dict[str, Any]: The final state (shared: treat it as read-only).
+    """
+    return _invoke_flight.do(
+        run_key(state), lambda: get_app().invoke(state))
+
+
+async def ainvoke(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async version of `invoke`."""
+    return await _ainvoke_flight.do(
+        run_key(state), lambda: get_app().ainvoke(state))
+
+
+def astream(
+        state: Dict[str, Any],
+        stream_mode: List[str]) -> AsyncIterator[Any]:
+    """
+    Streams the graph run, shared with identical concurrent requests: each
+    of them receives every node update and token of the run, from the
+    start, and the run stops once all of them have disconnected.
+
+    Args:
+        state (Dict[str, Any]): The initial state.
+        stream_mode (List[str]): LangGraph stream modes.
+
+    Returns:
+        AsyncIterator[Any]: The items of `app.astream`.
+    """
+    return _stream_flight.subscribe(
+        (run_key(state), tuple(stream_mode)),
+        lambda: get_app().astream(state, stream_mode=stream_mode))
@@ -0,0 +1,96 @@
+"""
+Instrumentation of the graph nodes.
+
+Every node registered in src/core/graph.py goes through `instrumented_node`,
+which records its wall time, outcome, retrieval hits, grade and retry count
+in the Prometheus metrics of src/utils/metrics.py. LLM tokens are counted by
+the model callback under the node name set here.
+"""
+
+import time
+import logging
+import functools
+from typing import Any, Awaitable, Callable, Dict
+
+from langchain_core.runnables import RunnableLambda
+
+from src.core.state import AgentState
+from src.utils.metrics import (
+    GRADES,
+    NODE_DURATION,
+    NODE_RUNS,
+    RETRIEVED_CHUNKS,
+    RETRY_COUNT,
+    current_node
+)
+
+logger = logging.getLogger(__name__)
+
+NodeFn = Callable[[AgentState], Dict[str, Any]]
+AsyncNodeFn = Callable[[AgentState], Awaitable[Dict[str, Any]]]
+
+
+def _record(
+        node: str,
+        state: AgentState,
+        update: Dict[str, Any],
+        elapsed: float) -> None:
+    """Turns a finished node run into metrics."""
+    NODE_DURATION.labels(node).observe(elapsed)
+    NODE_RUNS.labels(node, "ok").inc()
+
+    if "documents" in update:
+        RETRIEVED_CHUNKS.labels(node).observe(len(update["documents"]))
+    if update.get("grade"):
+        GRADES.labels(node, update["grade"]).inc()
+    if node == "generate":
+        RETRY_COUNT.observe(state.get("retry_count", 0))
+
+
+def instrumented_node(
+        name: str,
+        func: NodeFn,
+        afunc: AsyncNodeFn) -> RunnableLambda:
+    """
+    Wraps a node's sync and async implementations with metrics.
+
+    Args:
+        name (str): The node name, used as the metric label.
+        func (NodeFn): The sync implementation ('app.invoke').
+        afunc (AsyncNodeFn): The async implementation ('app.astream').
+
+    Returns:
+        RunnableLambda: The node, ready for `workflow.add_node`.
+    """
+
+    @functools.wraps(func)
+    def wrapped(state: AgentState) -> Dict[str, Any]:
+        token = current_node.set(name)
+        started: float = time.perf_counter()
+        try:
+            update: Dict[str, Any] = func(state)
+        except Exception:
+            NODE_DURATION.labels(name).observe(time.perf_counter() - started)
+            NODE_RUNS.labels(name, "error").inc()
+            raise
+        finally:
+            current_node.reset(token)
+        _record(name, state, update, time.perf_counter() - started)
+        return update
+
+    @functools.wraps(afunc)
+    async def awrapped(state: AgentState) -> Dict[str, Any]:
+        token = current_node.set(name)
+        started: float = time.perf_counter()
+        try:
+            update: Dict[str, Any] = await afunc(state)
+        except Exception:
+            NODE_DURATION.labels(name).observe(time.perf_counter() - started)
+            NODE_RUNS.labels(name, "error").inc()
+            raise
+        finally:
+            current_node.reset(token)
+        _record(name, state, update, time.perf_counter() - started)
+        return update
+
+    return RunnableLambda(wrapped, afunc=awrapped, name=name)
@@ -2,7 +2,55 @@
 Defines the state structures used in the LangGraph execution flow.
 """
 
-from typing import List, TypedDict
+from typing import List, NotRequired, TypedDict
+
+class Chunk(TypedDict):
+    """
+    One retrieved document chunk.
+
+    Attributes:
+        id (str): The Qdrant point ID, stable across searches (used to
+                  deduplicate chunks found by several queries or retries).
+        text (str): The chunk text.
+        source (str): The document the chunk comes from.
+        page (int | str): The page of the chunk in its document.
+        score (float): The retrieval (RRF) score. Higher is better.
+        similarity (float): The cosine similarity of the chunk's dense
+                            vector to the query. Unlike the RRF score,
+                            which only reflects ranks, it tells how well
+                            the chunk matches.
+        rerank_score (float): The cross-encoder score in [0, 1], set by
+                              the reranker. Kept apart from 'score' so
+                              chunks are never ordered across two scales.
+    """
+    id: str
+    text: str
+    source: str
+    page: int | str
+    score: float
+    similarity: float
+    rerank_score: NotRequired[float]
+
+class RetrievalFilters(TypedDict, total=False):
+    """
+    Optional metadata restrictions of a search. Every key is optional and
+    the keys that are set are combined with AND; a list value matches any
+    of its items.
+
+    Attributes:
+        document_set (str | List[str]): The document set(s), e.g. "hr".
+        source (str | List[str]): The document path(s).
+        department (str | List[str]): The owning department(s).
+        effective_after (str): ISO date: only documents in force from this
+                               date on.
+        effective_before (str): ISO date: only documents in force from
+                                before this date.
+    """
+    document_set: str | List[str]
+    source: str | List[str]
+    department: str | List[str]
+    effective_after: str
+    effective_before: str
 
 class AgentState(TypedDict):
     """
@@ -12,15 +60,29 @@ class AgentState(TypedDict):
     Attributes:
         question (str): The incoming user query.
         generation (str): The current answer draft produced by the LLM.
-        documents (List[str]): A list of context strings retrieved from the
-                               vector database.
+        documents (List[Chunk]): The retrieved chunks, best first. Chunks of
+                                 earlier attempts are kept (deduplicated) when
+                                 the query is rewritten; after grading, only
+                                 the chunks judged relevant are kept, and
+                                 'generate' keeps those that fit the context
+                                 token budget.
         retry_count (int): A counter to track how many times the agent has
                            tried to self-correct (to prevent infinite loops).
         grade (str): The relevance grade assigned to the retrieved documents
                      ("relevant" or "irrelevant").
+        rerank_score (float): The best cross-encoder score of the last
+                              retrieval, in [0, 1].
+        filters (RetrievalFilters): Metadata restrictions applied to every
+                                    retrieval of the run. Optional.
+        retrieval_confidence (str): In adaptive retrieval mode, how the
+                                    last retrieval's similarities rate it:
+                                    "high", "medium" or "low".
     """
     question: str
     generation: str
-    documents: List[str]
+    documents: List[Chunk]
     retry_count: int
     grade: str
+    rerank_score: float
+    filters: RetrievalFilters
+    retrieval_confidence: str
@@ -0,0 +1,143 @@
+"""
+Explicit warm-up of the heavy objects the agent creates lazily.
+
+Nothing expensive happens at import time any more: the embedding models,
+the Qdrant pool, the chat model and the compiled graph are built on first
+use. `warm_up` pays those costs up front, phase by phase, so the first real
+request of a freshly started pod is as fast as the next ones.
+
+Run it at container start (`python -m src.core.warmup`), or let the
+Chainlit app call it on startup (`settings.WARMUP_ON_STARTUP`).
+"""
+
+import time
+import asyncio
+import logging
+import argparse
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from src.utils.settings import settings
+from src.utils.metrics import STARTUP_PHASE_SECONDS
+from src.utils.qdrant_pool import qdrant_manager
+from src.utils.embeddings import (
+    get_cross_encoder,
+    get_dense_model,
+    get_sparse_model
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _phase(
+        name: str,
+        timings: Dict[str, float],
+        strict: bool = False) -> Iterator[None]:
+    """Times one warm-up phase. A failing phase is only logged, so a cold
+    dependency never prevents the server from starting, unless `strict`."""
+    started: float = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        logger.warning(f"Warm-up phase '{name}' failed: {e}")
+        if strict:
+            raise
+    finally:
+        elapsed: float = time.perf_counter() - started
+        timings[name] = elapsed
+        STARTUP_PHASE_SECONDS.labels(name).set(elapsed)
+        logger.info(f"metric=startup_phase_seconds value={elapsed:.3f} "
+                    f"phase={name}")
+
+
+def load_models(strict: bool = False) -> Dict[str, float]:
+    """
+    Loads (and downloads, if not cached yet) every FastEmbed model and runs
+    one inference on each, which also initialises the ONNX sessions.
+
+    Args:
+        strict (bool): Raise if a model cannot be loaded.
+
+    Returns:
+        Dict[str, float]: Seconds spent per phase.
+    """
+    timings: Dict[str, float] = {}
+
+    with _phase("dense_model", timings, strict):
+        list(get_dense_model(settings.EMBEDDING_MODEL_NAME)
+             .query_embed("warm-up"))
+    with _phase("sparse_model", timings, strict):
+        list(get_sparse_model(settings.SPARSE_MODEL_NAME)
+             .query_embed("warm-up"))
+    if settings.RERANKER_ENABLED:
+        with _phase("reranker_model", timings, strict):
+            list(get_cross_encoder(settings.RERANKER_MODEL_NAME)
+                 .rerank("warm-up", ["warm-up"]))
+
+    return timings
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Runs every warm-up phase in order: models, Qdrant pool, chat model,
+    graph compilation and one dummy retrieval.
+
+    Returns:
+        Dict[str, float]: Seconds spent per phase, plus the 'total'.
+    """
+    # Imported here: these modules are what the warm-up is timing
+    from src.agents.nodes import get_llm
+    from src.agents.tools import search_chunks
+    from src.core.graph import get_app
+
+    started: float = time.perf_counter()
+    timings: Dict[str, float] = load_models()
+
+    with _phase("qdrant_pool", timings):
+        if not qdrant_manager.health_check():
+            raise RuntimeError("Qdrant is not reachable")
+    with _phase("chat_model", timings):
+        get_llm()
+    with _phase("graph", timings):
+        get_app()
+    with _phase("dummy_query", timings):
+        search_chunks("warm-up", chunk_limit=1)
+
+    timings["total"] = time.perf_counter() - started
+    logger.info(f"Warm-up finished in {timings['total']:.2f}s: {timings}")
+    return timings
+
+
+async def awarm_up() -> Dict[str, float]:
+    """
+    Async warm-up for servers: the blocking phases run in a worker thread,
+    then the async Qdrant pool is opened on the server's own event loop.
+
+    Returns:
+        Dict[str, float]: Seconds spent per phase, plus the 'total'.
+    """
+    timings: Dict[str, float] = await asyncio.to_thread(warm_up)
+    with _phase("async_qdrant_pool", timings):
+        if not await qdrant_manager.ahealth_check():
+            raise RuntimeError("Qdrant is not reachable")
+    return timings
+
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Warm up (or pre-download) the agent's heavy objects.")
+    parser.add_argument(
+        "--models-only", action="store_true",
+        help="Only download and load the embedding models (image build).")
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.models_only:
+        load_models(strict=True)
+    else:
+        warm_up()
@@ -5,6 +5,7 @@ Uses 'LLM-as-a-Judge' pattern to grade answers against the Golden Dataset.
 """
 
 import json
+import asyncio
 import logging
 import pandas as pd
 from typing import List, Dict, Any
@@ -13,10 +14,15 @@ from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 
 # Import your agent and the LLM
-from src.app.main import app  # We will import the compiled graph 'app'
+from src.core.graph import get_app  # The compiled graph, built lazily
 from src.agents.nodes import (
-    llm as judge_llm,
-)  # We use the same Gemini model as the Judge
+    get_llm_cache,
+    get_node_llm,
+)  # We use the same (cached) Gemini model as the Judge
+from src.agents.tools import embedding_cache, retrieval_cache
+from src.utils.rate_limiter import rate_limiter
+from src.utils.settings import settings
+from src.eval.runner import EvalRunner
 
 # Configure Logging
 logging.basicConfig(
@@ -41,24 +47,7 @@ class EvalScore(BaseModel):
     score: int = Field(description="A score from 0 (Wrong) to 1 (Correct).")
 
 
-def evaluate_answer(
-    question: str, predicted: str, truth: str
-) -> Dict[str, Any]:
-    """
-    Asks the LLM to compare the predicted answer with the ground truth.
-
-    Args:
-        question (str): The original question asked.
-        predicted (str): The answer generated by the agent.
-        truth (str): The ground truth answer from the dataset.
-
-    Returns:
-        Dict[str, Any]: A dictionary containing the 'score' (int) and
-        'reasoning' (str).
-    """
-    structured_judge = judge_llm.with_structured_output(EvalScore)
-
-    system_prompt: str = """You are an impartial evaluator. 
+JUDGE_SYSTEM_PROMPT: str = """You are an impartial evaluator. 
     Compare the AI's generated answer with the Ground Truth answer.
     
     Rules:
@@ -68,9 +57,15 @@ def evaluate_answer(
     - Ignore slight phrasing differences. Focus on facts.
     """
 
+
+def _judge_chain(question: str, predicted: str, truth: str) -> Any:
+    """Builds the judge prompt for one answer, piped into the judge model."""
+    structured_judge = get_node_llm(
+        "evaluate_answer").with_structured_output(EvalScore)
+
     prompt = ChatPromptTemplate.from_messages(
         [
-            ("system", system_prompt),
+            ("system", JUDGE_SYSTEM_PROMPT),
             (
                 "human",
                 f"Question: {question}\n\nGround Truth: {truth}\n\n"
@@ -79,13 +74,62 @@ def evaluate_answer(
         ]
     )
 
-    chain: Any = prompt | structured_judge
+    return prompt | structured_judge
+
+
+def _judge_failure(error: Exception) -> Dict[str, Any]:
+    """The result of a failed judge call (429, timeout, parse error): no
+    score, so the item is judged again on the next run instead of counting
+    as a wrong answer."""
+    return {
+        "score": None,
+        "reasoning": "Error during evaluation",
+        "judge_error": str(error) or type(error).__name__,
+    }
+
+
+def evaluate_answer(
+    question: str, predicted: str, truth: str
+) -> Dict[str, Any]:
+    """
+    Asks the LLM to compare the predicted answer with the ground truth.
+
+    Args:
+        question (str): The original question asked.
+        predicted (str): The answer generated by the agent.
+        truth (str): The ground truth answer from the dataset.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the 'score' (int) and
+        'reasoning' (str). If the judge call fails, 'score' is None and
+        'judge_error' holds the error.
+    """
+    chain: Any = _judge_chain(question, predicted, truth)
     try:
         result: EvalScore = chain.invoke({})
         return {"score": result.score, "reasoning": result.reasoning}
     except Exception as e:
         logger.error(f"Judge failed: {e}")
-        return {"score": 0, "reasoning": "Error during evaluation"}
+        return _judge_failure(e)
+
+
+async def aevaluate_answer(
+    question: str, predicted: str, truth: str
+) -> Dict[str, Any]:
+    """Async version of `evaluate_answer`, used by the concurrent runner."""
+    chain: Any = _judge_chain(question, predicted, truth)
+    try:
+        result: EvalScore = await chain.ainvoke({})
+        return {"score": result.score, "reasoning": result.reasoning}
+    except Exception as e:
+        logger.error(f"Judge failed: {e}")
+        return _judge_failure(e)
+
+
+async def _arun_agent(question: str) -> Dict[str, Any]:
+    """Runs the graph on one question, on the async path."""
+    inputs: Dict[str, Any] = {"question": question, "retry_count": 0}
+    return await get_app().ainvoke(inputs)
 
 
 # --- 2. THE MAIN EVALUATION LOOP ---
@@ -93,15 +137,14 @@ def run_evaluation() -> None:
     """
     Runs the evaluation loop against the golden dataset.
 
-    Loads the dataset, runs the agent for each question, evaluates the
-    response using the LLM judge, and saves the results to a CSV file.
+    Loads the dataset, runs the agent and the LLM judge concurrently for
+    the questions not evaluated yet, streams each result to a JSONL file
+    and saves the full report to a CSV file.
     """
-    logger.info(
-        "Starting Evaluation Run against 'data/eval/golden_dataset.json'..."
-    )
+    dataset_path: str = settings.EVAL_DATASET_PATH
+    logger.info(f"Starting Evaluation Run against '{dataset_path}'...")
 
     # Load Dataset
-    dataset_path: str = "data/eval/golden_dataset.json"
     dataset: List[Dict[str, str]] = []
     try:
         with open(dataset_path, "r") as f:
@@ -112,73 +155,57 @@ def run_evaluation() -> None:
         )
         return
 
-    results: List[Dict[str, Any]] = []
-
-    for i, item in enumerate(dataset):
-        question: str = item["question"]
-        truth: str = item["ground_truth"]
-
-        logger.info(f"Test {i+1}/{len(dataset)}: {question}")
-
-        # 1. Run Agent
-        inputs: Dict[str, Any] = {"question": question, "retry_count": 0}
-        generated_answer: str = ""
-        context_str: str = ""
-
-        try:
-            # Invoke the graph
-            output: Dict[str, Any] = app.invoke(inputs)
-            generated_answer: str = output.get("generation", "No output")
-            # Get retrieved contexts (joining the list for clarity)
-            retrieved_docs: List[str] = output.get("documents", [])
-            context_str: str = retrieved_docs[0] if retrieved_docs else ""
-
-        except Exception as e:
-            logger.error(f"Agent crashed: {e}")
-            generated_answer: str = "ERROR"
-            context_str: str = ""
-
-        # 2. Run Judge (LLM-as-a-Judge)
-        logger.info("Judging...")
-        eval_result: Dict[str, Any] = evaluate_answer(
-            question, generated_answer, truth
-        )
-
-        logger.info(
-            f"Score: {eval_result['score']} | "
-            f"Reason: {eval_result['reasoning']}"
-        )
-
-        # 3. Record Result
-        results.append(
-            {
-                "question": question,
-                "ground_truth": truth,
-                "generated_answer": generated_answer,
-                "score": eval_result["score"],
-                "reasoning": eval_result["reasoning"],
-                "retrieved_context": context_str[:200]
-                + "...",  # Truncate for CSV
-            }
-        )
+    runner: EvalRunner = EvalRunner(
+        agent=_arun_agent,
+        judge=aevaluate_answer,
+        results_path=settings.EVAL_RESULTS_PATH,
+        agent_concurrency=settings.EVAL_AGENT_CONCURRENCY,
+        judge_concurrency=settings.EVAL_JUDGE_CONCURRENCY,
+    )
+    results: List[Dict[str, Any]] = asyncio.run(runner.run(dataset))
 
     # --- 3. REPORTING ---
     if not results:
         logger.warning("No results to report.")
         return
 
-    df: pd.DataFrame = pd.DataFrame(results)
-    accuracy: float = df["score"].mean()
+    df: pd.DataFrame = pd.DataFrame(results).drop(columns=["key"])
+    # Items the agent crashed on or the judge failed on have no score:
+    # they are left out of the accuracy, and run again on the next run
+    for column in ("judge_error", "agent_error"):
+        if column not in df:
+            df[column] = None
+    judged: pd.DataFrame = df[
+        df["judge_error"].isna() & df["agent_error"].isna()]
+    accuracy: float = judged["score"].mean()
 
     logger.info("-" * 40)
-    logger.info(f"FINAL ACCURACY: {accuracy:.2%}")
+    logger.info(
+        f"FINAL ACCURACY: {accuracy:.2%} "
+        f"({len(judged)}/{len(df)} items judged)")
+    if len(judged) < len(df):
+        logger.warning(
+            f"{len(df) - len(judged)} items could not be judged; rerun "
+            "the evaluation to run them again.")
+    logger.info(
+        f"Agent latency p50: "
+        f"{df['agent_latency_seconds'].median():.2f}s | "
+        f"p95: {df['agent_latency_seconds'].quantile(0.95):.2f}s")
+    logger.info(f"Mean retries: {df['retry_count'].clip(lower=0).mean():.2f}")
     logger.info("-" * 40)
 
     # Save to CSV
-    output_path: str = "data/eval/results.csv"
+    output_path: str = settings.EVAL_REPORT_PATH
     df.to_csv(output_path, index=False)
     logger.info(f"Detailed results saved to {output_path}")
 
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        logger.info(f"LLM cache: {llm_cache.stats()}")
+    logger.info(f"LLM rate limiter: {rate_limiter.stats()}")
+    logger.info(f"Query embedding cache: {embedding_cache.stats()}")
+    logger.info(f"Retrieval cache: {retrieval_cache.stats()}")
+
 
 if __name__ == "__main__":
     run_evaluation()
\ No newline at end of file
@@ -0,0 +1,307 @@
+"""
+End-to-end latency and throughput benchmark of the LangGraph agent.
+
+Drives `app.invoke` (threads) or `app.astream` (asyncio) with N concurrent
+sessions against the deterministic fake chat model and an in-process
+Qdrant loaded with the synthetic corpus of the retrieval benchmark. Reports
+throughput, session latency percentiles, time-to-first-token (astream) and
+per-node latency, to size a deployment without spending quota.
+
+Usage:
+    python -m src.eval.graph_benchmark --sessions 1 8 32 --requests 64 \\
+        --mode astream
+
+Every setting can still be overridden from the environment / .env, e.g.
+FAKE_LLM_LATENCY_SECONDS=1.2 or FAKE_LLM_RELEVANT_RATIO=0.3 (forces the
+rewrite loop), or QDRANT_LOCATION="" with a running Qdrant server.
+"""
+
+import os
+
+# Must be set before the settings, the graph and fastembed are imported
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("QDRANT_LOCATION", ":memory:")
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+from qdrant_client.http.models import PointStruct
+
+from src.utils.settings import settings
+from src.utils.qdrant_pool import qdrant_manager
+from src.ingestion.ingest import ingest_docs
+from src.eval.retrieval_benchmark import build_synthetic_corpus
+from src.core.graph import get_app
+
+# Configure Logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Records the wall time of every graph node run."""
+
+    run_inline: bool = True
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._started: Dict[uuid.UUID, tuple] = {}
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+
+    def on_chain_start(
+            self,
+            serialized: Optional[Dict[str, Any]],
+            inputs: Any,
+            *,
+            run_id: uuid.UUID,
+            metadata: Optional[Dict[str, Any]] = None,
+            **kwargs: Any) -> None:
+        node: Optional[str] = (metadata or {}).get("langgraph_node")
+        # Only the node run itself, not the runnables nested inside it
+        if node and kwargs.get("name") == node:
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(
+            self,
+            outputs: Any,
+            *,
+            run_id: uuid.UUID,
+            **kwargs: Any) -> None:
+        with self._lock:
+            started: Optional[tuple] = self._started.pop(run_id, None)
+            if started is not None:
+                node, t0 = started
+                self.durations[node].append(time.perf_counter() - t0)
+
+    def on_chain_error(
+            self,
+            error: BaseException,
+            *,
+            run_id: uuid.UUID,
+            **kwargs: Any) -> None:
+        with self._lock:
+            self._started.pop(run_id, None)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 of a list of seconds, in milliseconds."""
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return {"p50_ms": float(p50), "p95_ms": float(p95),
+            "p99_ms": float(p99)}
+
+
+# --- 1. SETUP ---
+async def _mirror_to_async_client() -> None:
+    """
+    Copies the collection from the sync client to the async one.
+
+    Two in-memory clients do not share their storage, and the astream path
+    queries through the async client.
+    """
+    source = qdrant_manager.client
+    target = qdrant_manager.async_client
+    name: str = settings.QDRANT_COLLECTION_NAME
+
+    params = source.get_collection(name).config.params
+    if await target.collection_exists(name):
+        await target.delete_collection(name)
+    await target.create_collection(
+        collection_name=name,
+        vectors_config=params.vectors,
+        sparse_vectors_config=params.sparse_vectors,
+    )
+
+    offset: Any = None
+    while True:
+        points, offset = source.scroll(
+            name, limit=256, offset=offset,
+            with_payload=True, with_vectors=True)
+        if points:
+            await target.upsert(name, points=[
+                PointStruct(id=p.id, vector=p.vector, payload=p.payload)
+                for p in points
+            ])
+        if offset is None:
+            break
+
+
+def prepare_collection(mode: str) -> List[str]:
+    """
+    Ingests the synthetic corpus and returns its questions.
+
+    Args:
+        mode (str): "invoke" or "astream".
+
+    Returns:
+        List[str]: The benchmark questions.
+    """
+    # Throw-away version stamp so the real answer caches stay valid
+    settings.COLLECTION_VERSION_PATH = os.path.join(
+        tempfile.mkdtemp(prefix="bench_version_"), "collection_version")
+    settings.QDRANT_COLLECTION_NAME = "graph_benchmark"
+
+    corpus_dir: str = tempfile.mkdtemp(prefix="bench_corpus_")
+    queries: List[Dict[str, str]] = build_synthetic_corpus(corpus_dir)
+    ingest_docs(source=corpus_dir, pattern="**/*", incremental=False)
+
+    if mode == "astream" and qdrant_manager.location == ":memory:":
+        asyncio.run(_mirror_to_async_client())
+
+    return [q["question"] for q in queries]
+
+
+# --- 2. DRIVERS ---
+def _run_invoke(question: str, timer: NodeTimer) -> Dict[str, float]:
+    """One session through `app.invoke`."""
+    started: float = time.perf_counter()
+    get_app().invoke(
+        {"question": question, "retry_count": 0},
+        config={"callbacks": [timer]})
+    return {"latency": time.perf_counter() - started}
+
+
+async def _run_astream(question: str, timer: NodeTimer) -> Dict[str, float]:
+    """One session through `app.astream`, like the Chainlit handler."""
+    started: float = time.perf_counter()
+    first_token: Optional[float] = None
+    async for mode, chunk in get_app().astream(
+            {"question": question, "retry_count": 0},
+            stream_mode=["updates", "messages"],
+            config={"callbacks": [timer]}):
+        if mode == "messages" and first_token is None:
+            _, metadata = chunk
+            if metadata.get("langgraph_node") == "generate":
+                first_token = time.perf_counter() - started
+    result: Dict[str, float] = {"latency": time.perf_counter() - started}
+    if first_token is not None:
+        result["ttft"] = first_token
+    return result
+
+
+def run_load(
+        questions: List[str],
+        sessions: int,
+        requests: int,
+        mode: str) -> Dict[str, Any]:
+    """
+    Runs `requests` graph executions with `sessions` in flight at a time.
+
+    Args:
+        questions (List[str]): Questions, used round-robin.
+        sessions (int): Concurrent sessions.
+        requests (int): Total graph executions.
+        mode (str): "invoke" (thread pool) or "astream" (asyncio).
+
+    Returns:
+        Dict[str, Any]: Throughput, latency percentiles and the per-node
+            durations.
+    """
+    timer: NodeTimer = NodeTimer()
+    batch: List[str] = [
+        questions[i % len(questions)] for i in range(requests)]
+
+    started: float = time.perf_counter()
+    if mode == "invoke":
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results: List[Dict[str, float]] = list(
+                pool.map(lambda q: _run_invoke(q, timer), batch))
+    else:
+        async def _drive() -> List[Dict[str, float]]:
+            slots: asyncio.Semaphore = asyncio.Semaphore(sessions)
+
+            async def _one(q: str) -> Dict[str, float]:
+                async with slots:
+                    return await _run_astream(q, timer)
+
+            return list(await asyncio.gather(*(_one(q) for q in batch)))
+
+        results = asyncio.run(_drive())
+    elapsed: float = time.perf_counter() - started
+
+    return {
+        "sessions": sessions,
+        "requests": requests,
+        "throughput_rps": requests / elapsed,
+        "latency": _percentiles([r["latency"] for r in results]),
+        "ttft": _percentiles([r["ttft"] for r in results if "ttft" in r]),
+        "nodes": dict(timer.durations),
+    }
+
+
+def main() -> None:
+    """Parses the CLI arguments, runs each load level and saves CSVs."""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Graph latency / throughput benchmark (fake LLM).")
+    parser.add_argument("--sessions", nargs="+", type=int,
+                        default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32,
+                        help="Graph executions per load level.")
+    parser.add_argument("--mode", choices=["invoke", "astream"],
+                        default="astream")
+    parser.add_argument("--output", default="data/eval/graph_benchmark")
+    args: argparse.Namespace = parser.parse_args()
+
+    logger.info(
+        f"Provider: {settings.LLM_PROVIDER} | Qdrant: "
+        f"{qdrant_manager.location or qdrant_manager.url}")
+    questions: List[str] = prepare_collection(args.mode)
+
+    summary: List[Dict[str, Any]] = []
+    per_node: List[Dict[str, Any]] = []
+    for sessions in args.sessions:
+        report: Dict[str, Any] = run_load(
+            questions, sessions, args.requests, args.mode)
+        logger.info(
+            f"sessions={sessions}: {report['throughput_rps']:.2f} req/s, "
+            f"p99={report['latency']['p99_ms']:.0f}ms")
+
+        summary.append({
+            "mode": args.mode,
+            "sessions": sessions,
+            "requests": args.requests,
+            "throughput_rps": report["throughput_rps"],
+            **{f"latency_{k}": v for k, v in report["latency"].items()},
+            **{f"ttft_{k}": v for k, v in report["ttft"].items()},
+        })
+        for node, durations in report["nodes"].items():
+            per_node.append({
+                "sessions": sessions,
+                "node": node,
+                "runs": len(durations),
+                **_percentiles(durations),
+            })
+
+    summary_df: pd.DataFrame = pd.DataFrame(summary)
+    nodes_df: pd.DataFrame = pd.DataFrame(per_node)
+    logger.info("-" * 40)
+    logger.info("\n" + summary_df.to_string(index=False))
+    logger.info("\n" + nodes_df.to_string(index=False))
+    logger.info("-" * 40)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    summary_df.to_csv(f"{args.output}_summary.csv", index=False)
+    nodes_df.to_csv(f"{args.output}_nodes.csv", index=False)
+    logger.info(f"Benchmark results saved to {args.output}_*.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Offline retrieval benchmark for the Compliance Agent.
+
+Ingests a corpus into an in-process Qdrant (no server) and measures the
+retrieval quality (recall@k, MRR) and query latency (p50/p95/p99) of each
+combination of embedding model, chunk size, chunk overlap and chunk limit.
+No LLM is involved, so it costs no quota and can run on every change.
+
+The corpus is either generated (a synthetic policy handbook with one known
+fact per question) or a fixture directory of .txt/.md/.pdf files with a
+JSON list of {"question", "answer"} pairs. A retrieved chunk is relevant if
+it contains the expected answer.
+
+Usage:
+    python -m src.eval.retrieval_benchmark --chunk-sizes 64 128 256 \\
+        --overlaps 0 16 --limits 3 5 10
+
+The embedding models must already be in the local FastEmbed cache: the
+Hugging Face hub is switched to offline mode so nothing is downloaded.
+"""
+
+import os
+
+# Must be set before fastembed / huggingface_hub are imported
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+# Measure the real search path, not the in-process query caches
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import itertools
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.core.state import Chunk
+from src.utils.settings import settings
+from src.utils.qdrant_pool import qdrant_manager
+from src.agents.tools import search_chunks
+from src.ingestion.ingest import ingest_docs
+from src.ingestion.pipeline import IngestionStats
+
+# Configure Logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+TOPICS: List[str] = [
+    "travel expenses", "remote work", "data retention",
+    "information security", "procurement", "gifts and hospitality",
+    "whistleblowing", "anti-money laundering", "vendor onboarding",
+    "incident response", "access control", "mandatory training",
+]
+
+ATTRIBUTES: List[str] = [
+    "approval limit", "review period", "reporting deadline",
+    "escalation contact", "policy reference", "maximum amount",
+]
+
+FILLER: List[str] = [
+    "Employees must read the {topic} policy before acting on it.",
+    "Managers are responsible for applying the {topic} rules in their team.",
+    "Exceptions to the {topic} policy require written justification.",
+    "The compliance team reviews the {topic} policy every year.",
+    "Questions about {other} should be sent to the compliance mailbox.",
+    "This section does not replace the {other} policy.",
+    "Breaches of the {topic} rules may lead to disciplinary action.",
+    "Records related to {topic} are kept in the document management system.",
+]
+
+
+# --- 1. CORPUS ---
+def build_synthetic_corpus(
+        directory: str,
+        filler_sentences: int = 40,
+        seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Writes one text file per topic and returns the matching questions.
+
+    Every file states one fact per attribute (e.g. "The approval limit for
+    procurement is 4173 EUR.") between filler sentences that mention the
+    other topics, so lexical and semantic distractors are everywhere.
+
+    Args:
+        directory (str): Where the .txt files are written.
+        filler_sentences (int): Filler sentences per document.
+        seed (int): Random seed, for a reproducible corpus.
+
+    Returns:
+        List[Dict[str, str]]: {"question", "answer"} pairs.
+    """
+    rng: random.Random = random.Random(seed)
+    values: List[int] = rng.sample(
+        range(1000, 99999), len(TOPICS) * len(ATTRIBUTES))
+    queries: List[Dict[str, str]] = []
+
+    for t, topic in enumerate(TOPICS):
+        sentences: List[str] = []
+        for _ in range(filler_sentences):
+            other: str = rng.choice([x for x in TOPICS if x != topic])
+            sentences.append(
+                rng.choice(FILLER).format(topic=topic, other=other))
+
+        for a, attribute in enumerate(ATTRIBUTES):
+            answer: str = f"CODE-{values[t * len(ATTRIBUTES) + a]}"
+            sentences.insert(
+                rng.randrange(len(sentences) + 1),
+                f"The {attribute} for {topic} is {answer}.")
+            queries.append({
+                "question": f"What is the {attribute} for {topic}?",
+                "answer": answer,
+            })
+
+        # Paragraphs of 5 sentences, like a real handbook section
+        paragraphs: List[str] = [
+            " ".join(sentences[i:i + 5])
+            for i in range(0, len(sentences), 5)
+        ]
+        path: str = os.path.join(
+            directory, f"{topic.replace(' ', '_')}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{topic.title()} Policy\n\n" + "\n\n".join(paragraphs))
+
+    return queries
+
+
+# --- 2. METRICS ---
+def score_queries(
+        queries: List[Dict[str, str]],
+        chunk_limit: int) -> Dict[str, float]:
+    """
+    Runs every query through `search_chunks` and scores the rankings.
+
+    Args:
+        queries (List[Dict[str, str]]): {"question", "answer"} pairs.
+        chunk_limit (int): Chunks retrieved per query (the k of recall@k).
+
+    Returns:
+        Dict[str, float]: recall@k, MRR and latency percentiles in ms.
+    """
+    # Warm-up: model loading is not query latency
+    search_chunks(queries[0]["question"], chunk_limit)
+
+    latencies: List[float] = []
+    reciprocal_ranks: List[float] = []
+    for item in queries:
+        started: float = time.perf_counter()
+        chunks: List[Chunk] = search_chunks(item["question"], chunk_limit)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        rank: Optional[int] = next(
+            (i for i, chunk in enumerate(chunks, 1)
+             if item["answer"] in chunk["text"]), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "recall_at_k": float(np.mean([rr > 0 for rr in reciprocal_ranks])),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_p50_ms": float(p50),
+        "latency_p95_ms": float(p95),
+        "latency_p99_ms": float(p99),
+    }
+
+
+# --- 3. THE BENCHMARK LOOP ---
+def run_benchmark(
+        corpus_dir: str,
+        queries: List[Dict[str, str]],
+        models: List[str],
+        chunk_sizes: List[int],
+        overlaps: List[int],
+        limits: List[int],
+        location: str = ":memory:",
+        chunk_unit: Optional[str] = None) -> pd.DataFrame:
+    """
+    Ingests the corpus once per (model, chunk size, overlap) and scores
+    each chunk limit against it.
+
+    Args:
+        corpus_dir (str): Directory holding the corpus files.
+        queries (List[Dict[str, str]]): {"question", "answer"} pairs.
+        models (List[str]): FastEmbed dense model names.
+        chunk_sizes (List[int]): Splitter chunk sizes.
+        overlaps (List[int]): Splitter chunk overlaps.
+        limits (List[int]): Chunk limits (k) to query with.
+        location (str): ":memory:" or a local path for the in-process Qdrant.
+        chunk_unit (Optional[str]): Unit of the chunk sizes, "tokens" or
+            "characters". Defaults to `settings.INGEST_CHUNK_UNIT`.
+
+    Returns:
+        pd.DataFrame: One row per configuration.
+    """
+    # In-process Qdrant, and a throw-away version stamp so the real answer
+    # caches are not invalidated
+    qdrant_manager.location = location
+    qdrant_manager.reset()
+    settings.COLLECTION_VERSION_PATH = os.path.join(
+        tempfile.mkdtemp(prefix="bench_version_"), "collection_version")
+
+    rows: List[Dict[str, Any]] = []
+    configs = itertools.product(models, chunk_sizes, overlaps)
+    for n, (model, chunk_size, overlap) in enumerate(configs):
+        if overlap >= chunk_size:
+            continue
+
+        settings.EMBEDDING_MODEL_NAME = model
+        settings.QDRANT_COLLECTION_NAME = f"benchmark_{n}"
+        logger.info(
+            f"Config {n}: model={model} chunk_size={chunk_size} "
+            f"overlap={overlap}")
+
+        stats: Optional[IngestionStats] = ingest_docs(
+            chunk_size=chunk_size,
+            chunk_overlap=overlap,
+            source=corpus_dir,
+            pattern="**/*",
+            incremental=False,
+            chunk_unit=chunk_unit,
+        )
+        if stats is None:
+            raise RuntimeError(f"No corpus files found in {corpus_dir}")
+
+        for limit in limits:
+            metrics: Dict[str, float] = score_queries(queries, limit)
+            logger.info(
+                f"k={limit}: recall={metrics['recall_at_k']:.2%} "
+                f"mrr={metrics['mrr']:.3f} "
+                f"p95={metrics['latency_p95_ms']:.1f}ms")
+            rows.append({
+                "model": model,
+                "chunk_size": chunk_size,
+                "chunk_overlap": overlap,
+                "chunk_unit": chunk_unit or settings.INGEST_CHUNK_UNIT,
+                "chunk_limit": limit,
+                "chunks": stats.chunks,
+                "duplicate_chunks": stats.duplicate_chunks,
+                "ingest_seconds": round(stats.elapsed_seconds, 2),
+                **metrics,
+            })
+
+        qdrant_manager.client.delete_collection(
+            settings.QDRANT_COLLECTION_NAME)
+
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    """Parses the CLI arguments, runs the benchmark and saves a CSV."""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Offline retrieval benchmark (recall@k, MRR, latency).")
+    parser.add_argument("--models", nargs="+",
+                        default=[settings.EMBEDDING_MODEL_NAME])
+    parser.add_argument("--chunk-sizes", nargs="+", type=int,
+                        default=[64, 128, 256])
+    parser.add_argument("--overlaps", nargs="+", type=int, default=[0, 16])
+    parser.add_argument("--chunk-unit", choices=["tokens", "characters"],
+                        default="tokens",
+                        help="Unit of --chunk-sizes and --overlaps.")
+    parser.add_argument("--limits", nargs="+", type=int, default=[3, 5, 10])
+    parser.add_argument("--corpus", default=None,
+                        help="Fixture directory; synthetic corpus if unset.")
+    parser.add_argument("--queries", default=None,
+                        help="JSON list of {question, answer} for --corpus.")
+    parser.add_argument("--location", default=":memory:",
+                        help="':memory:' or a local Qdrant storage path.")
+    parser.add_argument("--output",
+                        default="data/eval/retrieval_benchmark.csv")
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.corpus:
+        if not args.queries:
+            parser.error("--queries is required with --corpus")
+        corpus_dir: str = args.corpus
+        with open(args.queries, "r") as f:
+            queries: List[Dict[str, str]] = json.load(f)
+    else:
+        corpus_dir = tempfile.mkdtemp(prefix="bench_corpus_")
+        queries = build_synthetic_corpus(corpus_dir)
+        logger.info(
+            f"Synthetic corpus: {len(TOPICS)} documents, "
+            f"{len(queries)} questions in {corpus_dir}")
+
+    df: pd.DataFrame = run_benchmark(
+        corpus_dir, queries, args.models, args.chunk_sizes,
+        args.overlaps, args.limits, args.location, args.chunk_unit)
+
+    logger.info("-" * 40)
+    logger.info("\n" + df.to_string(index=False))
+    logger.info("-" * 40)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    df.to_csv(args.output, index=False)
+    logger.info(f"Benchmark results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
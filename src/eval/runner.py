@@ -0,0 +1,218 @@
+"""
+Concurrent, resumable runner for the evaluation pipeline.
+
+Each golden-dataset item runs the agent and then the judge, with a bounded
+number of agent and judge calls in flight. Every finished item is appended
+to a JSONL file right away, so an interrupted run resumes where it stopped
+(items whose agent crashed or whose judge call failed are run again).
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from src.core.state import Chunk
+from src.agents.context import format_context
+
+logger = logging.getLogger(__name__)
+
+AgentFn = Callable[[str], Awaitable[Dict[str, Any]]]
+JudgeFn = Callable[[str, str, str], Awaitable[Dict[str, Any]]]
+
+
+def item_key(index: int, question: str) -> str:
+    """
+    Identifies a dataset item across runs.
+
+    Args:
+        index (int): Position of the item in the dataset.
+        question (str): The question text.
+
+    Returns:
+        str: A stable key; it changes if the question is edited.
+    """
+    digest: str = hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+    return f"{index}:{digest}"
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads the results already written by previous (partial) runs.
+
+    A truncated last line, left by a crash mid-write, is ignored.
+
+    Args:
+        path (str): The JSONL results file.
+
+    Returns:
+        List[Dict[str, Any]]: One record per finished item.
+    """
+    if not os.path.exists(path):
+        return []
+
+    results: List[Dict[str, Any]] = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("Skipping truncated result line.")
+    return results
+
+
+def _agent_failure(error: str) -> Dict[str, Any]:
+    """The result of an item whose agent crashed: the judge is not called,
+    and with no score the item is run again on the next run instead of
+    counting as a wrong answer."""
+    return {
+        "score": None,
+        "reasoning": "Agent crashed",
+        "agent_error": error,
+    }
+
+
+class EvalRunner:
+    """
+    Runs agent + judge over a dataset with bounded concurrency.
+
+    Attributes:
+        results_path (str): JSONL file results are streamed to.
+        agent_concurrency (int): Max agent runs in flight.
+        judge_concurrency (int): Max judge calls in flight.
+    """
+
+    def __init__(
+            self,
+            agent: AgentFn,
+            judge: JudgeFn,
+            results_path: str,
+            agent_concurrency: int = 4,
+            judge_concurrency: int = 4) -> None:
+
+        self.agent: AgentFn = agent
+        self.judge: JudgeFn = judge
+        self.results_path: str = results_path
+        self.agent_concurrency: int = agent_concurrency
+        self.judge_concurrency: int = judge_concurrency
+
+        self._agent_slots: asyncio.Semaphore | None = None
+        self._judge_slots: asyncio.Semaphore | None = None
+        self._write_lock: asyncio.Lock | None = None
+
+    async def _run_item(
+            self,
+            index: int,
+            item: Dict[str, str],
+            total: int) -> None:
+        """Runs and judges one item, then appends its record to disk."""
+        question: str = item["question"]
+        truth: str = item["ground_truth"]
+
+        # 1. Run Agent
+        async with self._agent_slots:
+            logger.info(f"Test {index + 1}/{total}: {question}")
+            started: float = time.perf_counter()
+            try:
+                output: Dict[str, Any] = await self.agent(question)
+                generated_answer: str = output.get("generation", "No output")
+                retrieved_docs: List[Chunk] = output.get("documents", [])
+                context_str: str = format_context(retrieved_docs)
+                retry_count: int = output.get("retry_count", 0)
+                agent_error: str | None = None
+            except Exception as e:
+                logger.error(f"Agent crashed: {e}")
+                generated_answer = "ERROR"
+                context_str = ""
+                retry_count = -1
+                agent_error = str(e) or type(e).__name__
+            agent_latency: float = time.perf_counter() - started
+
+        # 2. Run Judge (LLM-as-a-Judge), unless there is no answer to judge
+        eval_result: Dict[str, Any]
+        judge_latency: float = 0.0
+        if agent_error is not None:
+            eval_result = _agent_failure(agent_error)
+        else:
+            async with self._judge_slots:
+                started = time.perf_counter()
+                eval_result = await self.judge(
+                    question, generated_answer, truth)
+                judge_latency = time.perf_counter() - started
+
+        logger.info(
+            f"Score: {eval_result['score']} | "
+            f"Reason: {eval_result['reasoning']}"
+        )
+
+        # 3. Record Result, flushed immediately so a crash loses nothing
+        record: Dict[str, Any] = {
+            "key": item_key(index, question),
+            "question": question,
+            "ground_truth": truth,
+            "generated_answer": generated_answer,
+            "score": eval_result["score"],
+            "reasoning": eval_result["reasoning"],
+            "judge_error": eval_result.get("judge_error"),
+            "agent_error": eval_result.get("agent_error"),
+            "retrieved_context": context_str[:200] + "...",  # Truncate
+            "agent_latency_seconds": round(agent_latency, 3),
+            "judge_latency_seconds": round(judge_latency, 3),
+            "retry_count": retry_count,
+        }
+        async with self._write_lock:
+            with open(self.results_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def run(self, dataset: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Evaluates every item not already present in the results file.
+
+        Args:
+            dataset (List[Dict[str, str]]): Items with 'question' and
+                'ground_truth'.
+
+        Returns:
+            List[Dict[str, Any]]: The records of the dataset's items, in
+                dataset order, including those from previous runs.
+        """
+        self._agent_slots = asyncio.Semaphore(self.agent_concurrency)
+        self._judge_slots = asyncio.Semaphore(self.judge_concurrency)
+        self._write_lock = asyncio.Lock()
+
+        directory: str = os.path.dirname(self.results_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Items whose agent crashed or whose judge failed (e.g. a 429) are
+        # retried; the newest record wins
+        done: Set[str] = {
+            r["key"] for r in load_results(self.results_path)
+            if r["generated_answer"] != "ERROR" and not r.get("judge_error")
+        }
+        pending: List[int] = [
+            i for i, item in enumerate(dataset)
+            if item_key(i, item["question"]) not in done
+        ]
+        logger.info(
+            f"{len(dataset) - len(pending)} items already evaluated, "
+            f"{len(pending)} to go.")
+
+        await asyncio.gather(*(
+            self._run_item(i, dataset[i], len(dataset)) for i in pending))
+
+        by_key: Dict[str, Dict[str, Any]] = {
+            r["key"]: r for r in load_results(self.results_path)}
+        return [
+            by_key[key] for key in
+            (item_key(i, item["question"]) for i, item in enumerate(dataset))
+            if key in by_key
+        ]
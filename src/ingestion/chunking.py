@@ -0,0 +1,165 @@
+'''
+
+Page cleaning and chunk splitting for the ingestion pipeline.
+
+Policy PDFs repeat the same running headers and footers (title, company
+name, "Page 3 of 12", confidentiality notice) on every page. They carry no
+information, but once split into chunks they are embedded and stored over
+and over, and end up competing with the real content at query time.
+`strip_headers_footers` drops them before splitting.
+
+Chunks are measured in tokens of the dense embedding model by default, so a
+chunk never silently exceeds the model's input window, whatever the
+language or layout of the text.
+
+'''
+
+import math
+import re
+import logging
+from collections import Counter
+from typing import Callable, List, Optional, Set
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.utils.settings import settings
+from src.utils.embeddings import get_tokenizer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+_DIGITS: re.Pattern = re.compile(r"\d+")
+
+
+def _line_key(line: str) -> str:
+    """Comparison form of a line: page numbers and dates do not matter."""
+    return _DIGITS.sub("#", " ".join(line.lower().split()))
+
+
+def _edge_lines(lines: List[str], window: int) -> List[int]:
+    """Indexes of the first and last `window` non-empty lines of a page."""
+    filled: List[int] = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:window] + filled[-window:]))
+
+
+def strip_headers_footers(
+        pages: List[Document],
+        window: Optional[int] = None,
+        min_share: Optional[float] = None) -> List[Document]:
+    """
+    Removes the lines repeated at the top or bottom of most pages.
+
+    A line is boilerplate when, once its digits are masked, it appears
+    among the first or last `window` lines of at least `min_share` of the
+    pages of the document. Documents shorter than 3 pages are left as is.
+
+    Args:
+        pages (List[Document]): The pages of one document, in order.
+        window (Optional[int]): Lines checked at each end of a page.
+            Defaults to `settings.INGEST_HEADER_FOOTER_LINES`.
+        min_share (Optional[float]): Share of pages a line must repeat on.
+            Defaults to `settings.INGEST_HEADER_FOOTER_MIN_SHARE`.
+
+    Returns:
+        List[Document]: The cleaned pages, with the same metadata.
+    """
+    window = window or settings.INGEST_HEADER_FOOTER_LINES
+    min_share = min_share or settings.INGEST_HEADER_FOOTER_MIN_SHARE
+    if len(pages) < 3:
+        return pages
+
+    page_lines: List[List[str]] = [
+        page.page_content.splitlines() for page in pages]
+    counts: Counter = Counter()
+    for lines in page_lines:
+        # Counted once per page
+        counts.update(
+            {_line_key(lines[i]) for i in _edge_lines(lines, window)})
+
+    min_pages: int = max(2, math.ceil(min_share * len(pages)))
+    boilerplate: Set[str] = {
+        key for key, n in counts.items() if n >= min_pages}
+    if not boilerplate:
+        return pages
+
+    cleaned: List[Document] = []
+    removed: int = 0
+    for page, lines in zip(pages, page_lines):
+        edges: Set[int] = set(_edge_lines(lines, window))
+        kept: List[str] = [
+            line for i, line in enumerate(lines)
+            if i not in edges or _line_key(line) not in boilerplate
+        ]
+        removed += len(lines) - len(kept)
+        cleaned.append(Document(
+            page_content="\n".join(kept), metadata=page.metadata))
+
+    logger.debug(
+        f"Stripped {removed} header/footer lines from {len(pages)} pages.")
+    return cleaned
+
+
+def token_counter(
+        model_name: Optional[str] = None,
+        threads: Optional[int] = None) -> Callable[[str], int]:
+    """
+    Returns a function counting the tokens of a text with the tokenizer of
+    a dense embedding model.
+
+    Args:
+        model_name (Optional[str]): Defaults to
+            `settings.EMBEDDING_MODEL_NAME`.
+        threads (Optional[int]): ONNX threads of the model, so the instance
+            already loaded by the pipeline is reused.
+
+    Returns:
+        Callable[[str], int]: The token counter (special tokens excluded).
+    """
+    tokenizer = get_tokenizer(
+        model_name or settings.EMBEDDING_MODEL_NAME, threads=threads)
+
+    def count(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    return count
+
+
+def build_splitter(
+        chunk_size: int,
+        chunk_overlap: int,
+        unit: Optional[str] = None,
+        threads: Optional[int] = None) -> RecursiveCharacterTextSplitter:
+    """
+    Builds the recursive splitter, measuring in tokens or characters.
+
+    Args:
+        chunk_size (int): Max chunk length, in `unit`.
+        chunk_overlap (int): Overlap between adjacent chunks, in `unit`.
+        unit (Optional[str]): "tokens" (dense model tokenizer) or
+            "characters". Defaults to `settings.INGEST_CHUNK_UNIT`.
+        threads (Optional[int]): ONNX threads of the dense model.
+
+    Returns:
+        RecursiveCharacterTextSplitter: The splitter.
+
+    Raises:
+        ValueError: If the unit is unknown.
+    """
+    unit = unit or settings.INGEST_CHUNK_UNIT
+    if unit == "characters":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if unit == "tokens":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=token_counter(threads=threads),
+        )
+    raise ValueError(
+        f"Unknown chunk unit '{unit}' (expected 'tokens' or 'characters')")
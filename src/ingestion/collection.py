@@ -0,0 +1,589 @@
+'''
+
+Management of the Qdrant collection: explicit creation, tuning and sizing.
+
+The collection is created with named dense + sparse (BM25) vectors and
+explicit storage parameters:
+
+- quantization of the dense vectors (scalar int8 or binary), searched with
+  oversampling + rescoring on the original vectors;
+- HNSW graph parameters (`m`, `ef_construct`) and search-time `hnsw_ef`;
+- original vectors, HNSW graph and payload kept on disk instead of RAM;
+- payload indexes on the filterable metadata ('source', 'sources',
+  'document_set', 'department', 'effective_date') and 'page', so filtered
+  searches stay fast on large collections.
+
+Usage:
+    python -m src.ingestion.collection create
+    python -m src.ingestion.collection recreate --quantization scalar \\
+        --vectors-on-disk
+    python -m src.ingestion.collection info
+    python -m src.ingestion.collection benchmark --points 200000 \\
+        --quantizations none scalar binary --hnsw-ef 64 128
+
+'''
+
+import time
+import logging
+import argparse
+import itertools
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CollectionStatus,
+    Distance,
+    HnswConfigDiff,
+    Modifier,
+    PayloadSchemaType,
+    PointStruct,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseIndexParams,
+    SparseVectorParams,
+    VectorParams
+)
+
+from src.utils.settings import settings
+from src.utils.qdrant_pool import get_qdrant_client
+from src.utils.embeddings import get_dense_dimension
+from src.utils.collection_version import bump_collection_version
+from src.ingestion.manifest import IngestManifest
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# Payload fields indexed at creation time (and added to older collections
+# by `ensure_collection`)
+PAYLOAD_INDEXES: Dict[str, PayloadSchemaType] = {
+    "source": PayloadSchemaType.KEYWORD,
+    "sources": PayloadSchemaType.KEYWORD,
+    "page": PayloadSchemaType.INTEGER,
+    "document_set": PayloadSchemaType.KEYWORD,
+    "department": PayloadSchemaType.KEYWORD,
+    "effective_date": PayloadSchemaType.DATETIME,
+}
+
+
+@dataclass
+class CollectionConfig:
+    """
+    Storage and index parameters of the collection.
+
+    Attributes:
+        quantization (str): "none", "scalar" (int8, 4x smaller) or "binary"
+            (1 bit per dimension, 32x smaller).
+        quantization_always_ram (bool): Keep the quantized vectors in RAM,
+            even when the originals are on disk.
+        hnsw_m (int): Edges per node of the HNSW graph.
+        hnsw_ef_construct (int): Candidate list size while building it.
+        hnsw_on_disk (bool): Keep the HNSW graph on disk.
+        vectors_on_disk (bool): Keep the original vectors on disk (mmap).
+        payload_on_disk (bool): Keep the payload on disk.
+        hnsw_ef (Optional[int]): Search-time candidate list size. None lets
+            Qdrant use `ef_construct`.
+        rescore (bool): Re-rank quantized results with the original vectors.
+        oversampling (float): Candidates fetched per result before
+            rescoring, e.g. 2.0 fetches twice the limit.
+    """
+    quantization: str = "none"
+    quantization_always_ram: bool = True
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_on_disk: bool = False
+    vectors_on_disk: bool = False
+    payload_on_disk: bool = False
+    hnsw_ef: Optional[int] = None
+    rescore: bool = True
+    oversampling: float = 2.0
+
+    @classmethod
+    def from_settings(cls) -> "CollectionConfig":
+        """Builds the configuration from `Settings`."""
+        return cls(
+            quantization=settings.COLLECTION_QUANTIZATION,
+            quantization_always_ram=(
+                settings.COLLECTION_QUANTIZATION_ALWAYS_RAM),
+            hnsw_m=settings.COLLECTION_HNSW_M,
+            hnsw_ef_construct=settings.COLLECTION_HNSW_EF_CONSTRUCT,
+            hnsw_on_disk=settings.COLLECTION_HNSW_ON_DISK,
+            vectors_on_disk=settings.COLLECTION_VECTORS_ON_DISK,
+            payload_on_disk=settings.COLLECTION_PAYLOAD_ON_DISK,
+            hnsw_ef=settings.SEARCH_HNSW_EF,
+            rescore=settings.SEARCH_RESCORE,
+            oversampling=settings.SEARCH_OVERSAMPLING,
+        )
+
+    def quantization_config(self) -> Any:
+        """The Qdrant quantization config, or None."""
+        if self.quantization == "scalar":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=0.99,
+                always_ram=self.quantization_always_ram,
+            ))
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(
+                always_ram=self.quantization_always_ram))
+        if self.quantization == "none":
+            return None
+        raise ValueError(
+            f"Unknown quantization '{self.quantization}' "
+            "(expected 'none', 'scalar' or 'binary')")
+
+    def search_params(self) -> Optional[SearchParams]:
+        """Search-time parameters of the dense vectors, or None when the
+        defaults apply."""
+        if self.hnsw_ef is None and self.quantization == "none":
+            return None
+        quantization: Optional[QuantizationSearchParams] = None
+        if self.quantization != "none":
+            quantization = QuantizationSearchParams(
+                rescore=self.rescore, oversampling=self.oversampling)
+        return SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+
+def search_params() -> Optional[SearchParams]:
+    """Dense search parameters for the configured collection (used by the
+    retrieval tools)."""
+    return CollectionConfig.from_settings().search_params()
+
+
+def check_layout(client: QdrantClient, collection_name: str) -> None:
+    """
+    Verifies an existing collection has the hybrid named-vector layout.
+
+    Raises:
+        RuntimeError: If the collection was created with another vector
+            layout (e.g. by an older, dense-only ingestion).
+    """
+    params = client.get_collection(collection_name).config.params
+    dense: Any = params.vectors
+    sparse: Any = params.sparse_vectors or {}
+    if not isinstance(dense, dict) or \
+            settings.DENSE_VECTOR_NAME not in dense or \
+            settings.SPARSE_VECTOR_NAME not in sparse:
+        raise RuntimeError(
+            f"Collection '{collection_name}' has no "
+            f"'{settings.DENSE_VECTOR_NAME}'/"
+            f"'{settings.SPARSE_VECTOR_NAME}' named vectors. "
+            "Recreate it (python -m src.ingestion.collection recreate) "
+            "and ingest again to enable hybrid search.")
+
+
+def create_collection(
+        client: QdrantClient,
+        collection_name: Optional[str] = None,
+        config: Optional[CollectionConfig] = None,
+        recreate: bool = False,
+        dimension: Optional[int] = None) -> None:
+    """
+    Creates the collection with explicit vector, index and storage params,
+    then its payload indexes.
+
+    Args:
+        client (QdrantClient): The Qdrant client.
+        collection_name (Optional[str]): Defaults to
+            `settings.QDRANT_COLLECTION_NAME`.
+        config (Optional[CollectionConfig]): Defaults to the settings.
+        recreate (bool): Drop the collection first if it exists.
+        dimension (Optional[int]): Dense vector size. Defaults to the
+            dimension of `settings.EMBEDDING_MODEL_NAME`.
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+    config = config or CollectionConfig.from_settings()
+
+    if recreate and client.collection_exists(collection_name):
+        logger.info(f"Dropping collection '{collection_name}'...")
+        client.delete_collection(collection_name)
+
+    logger.info(
+        f"Creating collection '{collection_name}' with {asdict(config)}...")
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config={
+            settings.DENSE_VECTOR_NAME: VectorParams(
+                size=dimension or
+                get_dense_dimension(settings.EMBEDDING_MODEL_NAME),
+                distance=Distance.COSINE,
+                on_disk=config.vectors_on_disk,
+                hnsw_config=HnswConfigDiff(
+                    m=config.hnsw_m,
+                    ef_construct=config.hnsw_ef_construct,
+                    on_disk=config.hnsw_on_disk,
+                ),
+                quantization_config=config.quantization_config(),
+            ),
+        },
+        sparse_vectors_config={
+            # BM25 term weights need the collection-wide IDF
+            settings.SPARSE_VECTOR_NAME: SparseVectorParams(
+                modifier=Modifier.IDF,
+                index=SparseIndexParams(on_disk=config.vectors_on_disk),
+            ),
+        },
+        on_disk_payload=config.payload_on_disk,
+    )
+    ensure_payload_indexes(client, collection_name)
+
+
+def ensure_payload_indexes(
+        client: QdrantClient,
+        collection_name: Optional[str] = None) -> List[str]:
+    """
+    Creates the payload indexes of `PAYLOAD_INDEXES` that are missing.
+
+    Without an index, a filtered search scans the payload of every
+    candidate; with one, Qdrant plans the search from the matching points.
+
+    Args:
+        client (QdrantClient): The Qdrant client.
+        collection_name (Optional[str]): Defaults to
+            `settings.QDRANT_COLLECTION_NAME`.
+
+    Returns:
+        List[str]: The fields that were indexed.
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+    existing: Dict[str, Any] = \
+        client.get_collection(collection_name).payload_schema or {}
+
+    created: List[str] = []
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        if field_name in existing:
+            continue
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=schema,
+        )
+        created.append(field_name)
+    if created:
+        logger.info(f"Created payload indexes on {created}.")
+    return created
+
+
+def ensure_collection(
+        client: QdrantClient,
+        collection_name: Optional[str] = None,
+        config: Optional[CollectionConfig] = None) -> bool:
+    """
+    Creates the collection if it does not exist yet, and its missing payload
+    indexes if it does.
+
+    Args:
+        client (QdrantClient): The Qdrant client.
+        collection_name (Optional[str]): Defaults to
+            `settings.QDRANT_COLLECTION_NAME`.
+        config (Optional[CollectionConfig]): Defaults to the settings.
+
+    Returns:
+        bool: True if the collection was created.
+
+    Raises:
+        RuntimeError: If the collection exists with another vector layout.
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+    if client.collection_exists(collection_name):
+        check_layout(client, collection_name)
+        ensure_payload_indexes(client, collection_name)
+        return False
+
+    create_collection(client, collection_name, config)
+    return True
+
+
+def collection_info(
+        client: QdrantClient,
+        collection_name: Optional[str] = None) -> Dict[str, Any]:
+    """Returns the status, size and storage config of the collection."""
+    collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+    info = client.get_collection(collection_name)
+    dense: Any = info.config.params.vectors.get(settings.DENSE_VECTOR_NAME) \
+        if isinstance(info.config.params.vectors, dict) else None
+    return {
+        "status": str(info.status),
+        "points": info.points_count,
+        "indexed_vectors": info.indexed_vectors_count,
+        "segments": info.segments_count,
+        "dense_on_disk": getattr(dense, "on_disk", None),
+        "quantization": str(getattr(dense, "quantization_config", None)
+                            or info.config.quantization_config),
+        "hnsw": str(getattr(dense, "hnsw_config", None)
+                    or info.config.hnsw_config),
+        "payload_on_disk": info.config.params.on_disk_payload,
+        "payload_indexes": sorted(info.payload_schema or {}),
+    }
+
+
+# --- BENCHMARK ---------------------------------------------------------------
+
+def estimate_ram_bytes(
+        points: int,
+        dimension: int,
+        config: CollectionConfig) -> int:
+    """
+    Rough RAM footprint of the dense vectors and their HNSW graph, following
+    Qdrant's sizing guide (x1.5 overhead on vectors and graph).
+
+    Args:
+        points (int): Number of points.
+        dimension (int): Dense vector size.
+        config (CollectionConfig): The storage configuration.
+
+    Returns:
+        int: Estimated bytes resident in RAM.
+    """
+    original: float = 0 if config.vectors_on_disk else points * dimension * 4
+    quantized: float = 0
+    if config.quantization_always_ram:
+        if config.quantization == "scalar":
+            quantized = points * dimension
+        elif config.quantization == "binary":
+            quantized = points * dimension / 8
+    graph: float = 0 if config.hnsw_on_disk else points * config.hnsw_m * 2 * 4
+    return int((original + quantized + graph) * 1.5)
+
+
+def qdrant_location_is_local() -> bool:
+    """True when the app runs an in-process Qdrant (no server metrics, and
+    quantization/HNSW settings are ignored)."""
+    return bool(settings.QDRANT_LOCATION)
+
+
+def _server_rss_bytes() -> Optional[int]:
+    """Resident memory reported by the Qdrant server's /metrics, if any."""
+    if qdrant_location_is_local():
+        return None
+    try:
+        response: httpx.Response = httpx.get(
+            f"{settings.QDRANT_URL}/metrics", timeout=5)
+        for line in response.text.splitlines():
+            if line.startswith("memory_resident_bytes"):
+                return int(float(line.split()[-1]))
+    except Exception as e:
+        logger.warning(f"Could not read Qdrant memory metrics: {e}")
+    return None
+
+
+def _wait_until_indexed(
+        client: QdrantClient,
+        collection_name: str,
+        timeout: float = 600.0) -> None:
+    """Waits for the optimizer to finish building the indexes."""
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == \
+                CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+    logger.warning(f"Collection '{collection_name}' still indexing.")
+
+
+def benchmark(
+        configs: List[CollectionConfig],
+        hnsw_efs: Optional[List[Optional[int]]] = None,
+        points: int = 100000,
+        queries: int = 200,
+        limit: int = 10,
+        seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Loads the same random vectors into one collection per index-time
+    configuration and compares RAM, search latency and recall against exact
+    search for each search-time `hnsw_ef`.
+
+    `hnsw_ef` only changes the search parameters, so each collection is
+    built once and queried with every value.
+
+    Args:
+        configs (List[CollectionConfig]): Index-time configurations to
+            compare (quantization, on-disk storage, `m`, `ef_construct`).
+        hnsw_efs (Optional[List[Optional[int]]]): Search-time `hnsw_ef`
+            values tried on each collection. None uses each config's own.
+        points (int): Number of vectors loaded per collection.
+        queries (int): Number of timed queries.
+        limit (int): Results per query (the k of recall@k).
+        seed (int): Random seed, for reproducible data.
+
+    Returns:
+        List[Dict[str, Any]]: One result row per configuration and
+            `hnsw_ef`.
+    """
+    client: QdrantClient = get_qdrant_client()
+    dimension: int = get_dense_dimension(settings.EMBEDDING_MODEL_NAME)
+    rng: np.random.Generator = np.random.default_rng(seed)
+    query_vectors: np.ndarray = rng.standard_normal(
+        (queries, dimension), dtype=np.float32)
+
+    rows: List[Dict[str, Any]] = []
+    for n, config in enumerate(configs):
+        name: str = f"{settings.QDRANT_COLLECTION_NAME}_bench_{n}"
+        rss_before: Optional[int] = _server_rss_bytes()
+        create_collection(client, name, config, recreate=True,
+                          dimension=dimension)
+
+        # Same data for every config: re-seeded generator, batched upload
+        data_rng: np.random.Generator = np.random.default_rng(seed + 1)
+        started: float = time.perf_counter()
+        for offset in range(0, points, 1000):
+            batch: np.ndarray = data_rng.standard_normal(
+                (min(1000, points - offset), dimension), dtype=np.float32)
+            client.upsert(name, wait=False, points=[
+                PointStruct(
+                    id=offset + i,
+                    vector={settings.DENSE_VECTOR_NAME: vector.tolist()},
+                    payload={"source": f"doc_{(offset + i) % 100}",
+                             "page": i % 50})
+                for i, vector in enumerate(batch)
+            ])
+        _wait_until_indexed(client, name)
+        load_seconds: float = time.perf_counter() - started
+        rss_after: Optional[int] = _server_rss_bytes()
+
+        # Ground truth on the original vectors, not the quantized ones;
+        # it does not depend on hnsw_ef, so it is computed once
+        truths: List[Set[Any]] = [
+            {p.id for p in client.query_points(
+                name, query=vector.tolist(),
+                using=settings.DENSE_VECTOR_NAME, limit=limit,
+                search_params=SearchParams(
+                    exact=True,
+                    quantization=QuantizationSearchParams(ignore=True)
+                )).points}
+            for vector in query_vectors
+        ]
+
+        for ef in hnsw_efs or [config.hnsw_ef]:
+            searched: CollectionConfig = replace(config, hnsw_ef=ef)
+            params: Optional[SearchParams] = searched.search_params()
+            latencies: List[float] = []
+            recalls: List[float] = []
+            for vector, truth in zip(query_vectors, truths):
+                started = time.perf_counter()
+                approx = client.query_points(
+                    name, query=vector.tolist(),
+                    using=settings.DENSE_VECTOR_NAME, limit=limit,
+                    search_params=params).points
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(
+                    len(truth & {p.id for p in approx}) / max(1, len(truth)))
+
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            row: Dict[str, Any] = {
+                **asdict(searched),
+                "points": points,
+                "load_seconds": round(load_seconds, 1),
+                "estimated_ram_mb": round(
+                    estimate_ram_bytes(points, dimension, config) / 2 ** 20,
+                    1),
+                "server_rss_delta_mb": round(
+                    (rss_after - rss_before) / 2 ** 20, 1)
+                if rss_before is not None and rss_after is not None
+                else None,
+                f"recall_at_{limit}": float(np.mean(recalls)),
+                "latency_p50_ms": float(p50),
+                "latency_p95_ms": float(p95),
+                "latency_p99_ms": float(p99),
+            }
+            logger.info(f"Config {n}, hnsw_ef={ef}: {row}")
+            rows.append(row)
+
+        client.delete_collection(name)
+
+    return rows
+
+
+def main() -> None:
+    """Command-line entry point."""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Create, inspect and benchmark the Qdrant collection.")
+    parser.add_argument(
+        "command", choices=["create", "recreate", "info", "benchmark"])
+    parser.add_argument("--name", default=None,
+                        help="Collection name (default from settings).")
+    parser.add_argument("--quantization",
+                        choices=["none", "scalar", "binary"])
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--hnsw-ef-construct", type=int)
+    # --no-* forces RAM storage; omitted, the settings value is kept
+    for flag in ("--vectors-on-disk", "--hnsw-on-disk", "--payload-on-disk"):
+        parser.add_argument(flag, action=argparse.BooleanOptionalAction)
+    # Benchmark grid
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--quantizations", nargs="+",
+                        default=["none", "scalar", "binary"])
+    parser.add_argument("--on-disk", nargs="+", default=["false", "true"],
+                        help="Original vectors on disk: false/true.")
+    parser.add_argument("--hnsw-ef", nargs="+", type=int, default=[64, 128])
+    args: argparse.Namespace = parser.parse_args()
+
+    client: QdrantClient = get_qdrant_client()
+    config: CollectionConfig = CollectionConfig.from_settings()
+    overrides: Dict[str, Any] = {
+        "quantization": args.quantization,
+        "hnsw_m": args.hnsw_m,
+        "hnsw_ef_construct": args.hnsw_ef_construct,
+        "vectors_on_disk": args.vectors_on_disk,
+        "hnsw_on_disk": args.hnsw_on_disk,
+        "payload_on_disk": args.payload_on_disk,
+    }
+    config = replace(
+        config, **{k: v for k, v in overrides.items() if v is not None})
+
+    if args.command in ("create", "recreate"):
+        if args.command == "create" and \
+                client.collection_exists(
+                    args.name or settings.QDRANT_COLLECTION_NAME):
+            logger.error("Collection already exists; use 'recreate'.")
+            return
+        create_collection(
+            client, args.name, config, recreate=args.command == "recreate")
+        if args.name in (None, settings.QDRANT_COLLECTION_NAME):
+            # The collection is empty: the next ingestion must be a full one,
+            # and cached answers/results refer to points that are gone
+            manifest: IngestManifest = IngestManifest(
+                settings.INGEST_MANIFEST_PATH)
+            manifest.clear()
+            manifest.close()
+            bump_collection_version()
+        logger.info(collection_info(client, args.name))
+
+    elif args.command == "info":
+        logger.info(collection_info(client, args.name))
+
+    else:
+        if qdrant_location_is_local():
+            logger.warning(
+                "In-process Qdrant ignores quantization and HNSW settings; "
+                "run the benchmark against a Qdrant server.")
+        # One collection per index-time config; hnsw_ef is a search-time
+        # parameter, tried on each of them
+        grid: List[CollectionConfig] = [
+            replace(config, quantization=q,
+                    vectors_on_disk=on_disk.lower() == "true")
+            for q, on_disk in itertools.product(
+                args.quantizations, args.on_disk)
+        ]
+        rows: List[Dict[str, Any]] = benchmark(
+            grid, hnsw_efs=args.hnsw_ef, points=args.points,
+            queries=args.queries)
+        for row in rows:
+            logger.info(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+'''
+
+Near-duplicate chunk detection with MinHash and locality-sensitive hashing.
+
+Compliance corpora are full of text that is almost, but not exactly, the
+same: a disclaimer with another date, the same clause in the 2023 and the
+2024 version of a policy. Exact hashing misses them, embedding them all is
+wasted work, and at query time they crowd the top-k with one fact.
+
+Each chunk gets a MinHash signature of its word shingles. Signatures are
+cut into bands; chunks sharing a band are candidates, and a candidate is a
+duplicate when the share of equal signature values (an estimate of the
+Jaccard similarity of the shingle sets) reaches the threshold.
+
+'''
+
+import re
+import hashlib
+import logging
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.utils.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime of the universal hash family: with 32-bit shingle hashes
+# and coefficients below it, (a * x + b) never overflows 64 bits
+_PRIME: int = (1 << 31) - 1
+_WORD: re.Pattern = re.compile(r"\w+")
+
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash LSH index of chunk signatures.
+
+    Not thread-safe: the pipeline uses it from the chunk stage only.
+
+    Attributes:
+        threshold (float): Minimum estimated Jaccard similarity of two
+            chunks for them to be near-duplicates.
+        num_perm (int): Length of the signatures.
+        bands (int): Number of LSH bands; `num_perm` must be a multiple.
+        shingle_size (int): Words per shingle.
+    """
+
+    def __init__(
+            self,
+            threshold: Optional[float] = None,
+            num_perm: Optional[int] = None,
+            bands: Optional[int] = None,
+            shingle_size: int = 3,
+            seed: int = 1) -> None:
+
+        self.threshold: float = threshold or settings.INGEST_DEDUP_THRESHOLD
+        self.num_perm: int = num_perm or settings.INGEST_DEDUP_NUM_PERM
+        self.bands: int = bands or settings.INGEST_DEDUP_BANDS
+        self.shingle_size: int = shingle_size
+        if self.num_perm % self.bands:
+            raise ValueError(
+                f"num_perm ({self.num_perm}) must be a multiple of "
+                f"bands ({self.bands})")
+        self._rows: int = self.num_perm // self.bands
+
+        # Fixed seed: signatures must be comparable across runs
+        rng: np.random.Generator = np.random.default_rng(seed)
+        self._a: np.ndarray = rng.integers(
+            1, _PRIME, self.num_perm, dtype=np.uint64)
+        self._b: np.ndarray = rng.integers(
+            0, _PRIME, self.num_perm, dtype=np.uint64)
+
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: DefaultDict[Tuple[int, bytes], Set[str]] = \
+            defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _shingles(self, text: str) -> Set[str]:
+        words: List[str] = _WORD.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Computes the MinHash signature of a text.
+
+        Args:
+            text (str): The chunk text.
+
+        Returns:
+            np.ndarray: `num_perm` uint32 values.
+        """
+        hashes: np.ndarray = np.array([
+            int.from_bytes(
+                hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(),
+                "little")
+            for s in self._shingles(text)
+        ], dtype=np.uint64)
+        # (a * x + b) mod p for every permutation and shingle
+        permuted: np.ndarray = \
+            (np.outer(hashes, self._a) + self._b) % np.uint64(_PRIME)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(
+            self,
+            signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[
+                band * self._rows:(band + 1) * self._rows].tobytes()
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        """Indexes a chunk signature under its point ID."""
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].add(key)
+
+    def query(
+            self,
+            signature: np.ndarray,
+            exclude: Optional[Set[str]] = None) -> Optional[str]:
+        """
+        Finds the most similar indexed chunk above the threshold.
+
+        Args:
+            signature (np.ndarray): The signature of the new chunk.
+            exclude (Optional[Set[str]]): Keys never returned (e.g. the
+                outdated chunks of the file being re-ingested).
+
+        Returns:
+            Optional[str]: The key of the near-duplicate, or None.
+        """
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(signature):
+            candidates |= self._buckets.get(band_key, set())
+        if exclude:
+            candidates -= exclude
+
+        best: Optional[str] = None
+        best_similarity: float = -1.0
+        for key in sorted(candidates):
+            similarity: float = float(
+                np.mean(self._signatures[key] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+    def to_bytes(self, signature: np.ndarray) -> bytes:
+        """Serialises a signature, e.g. for the ingest manifest."""
+        return signature.astype(np.uint32).tobytes()
+
+    def from_bytes(self, data: bytes) -> Optional[np.ndarray]:
+        """Reads a stored signature; None if it was made with another
+        `num_perm`."""
+        signature: np.ndarray = np.frombuffer(data, dtype=np.uint32)
+        return signature if len(signature) == self.num_perm else None
@@ -7,12 +7,19 @@ vector database.
 
 import os
 import logging
+from typing import List, Optional
 
 from qdrant_client import QdrantClient
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from src.utils.settings import settings
+from src.utils.qdrant_pool import get_qdrant_client
+from src.utils.collection_version import bump_collection_version
+from src.ingestion.manifest import IngestManifest
+from src.ingestion.pipeline import (
+    IngestionPipeline,
+    IngestionStats,
+    discover_files
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,66 +29,101 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def ingest_docs(chunk_size: int = 500, chunk_overlap: int = 50) -> None:
+def ingest_docs(
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        source: Optional[str] = None,
+        pattern: Optional[str] = None,
+        incremental: Optional[bool] = None,
+        chunk_unit: Optional[str] = None) -> Optional[IngestionStats]:
 
     """
-    Ingests a PDF document into a Qdrant vector database.
+    Ingests PDF documents into a Qdrant vector database.
     This function performs the following steps:
-    1. Connects to a Qdrant instance using settings configuration.
-    2. Loads a specific PDF file ('data/raw_pdfs/policy.pdf').
-    3. Splits the document content into smaller text chunks using a recursive
-        character splitter.
-    4. Generates embeddings for these chunks (using FastEmbed via Qdrant
-        client).
-    5. Indexes the vectors and metadata into the specified Qdrant collection.
+    1. Gets the shared pooled Qdrant client (see src/utils/qdrant_pool.py).
+    2. Discovers the PDF files under `source` (a file, a directory or a glob).
+    3. Parses the PDFs in a process pool.
+    4. Strips the headers and footers repeated on most pages, then splits
+        the pages into smaller text chunks using a recursive splitter that
+        measures tokens of the embedding model. Near-duplicate chunks (also
+        across files) are collapsed into one point listing all sources.
+    5. Generates dense and sparse (BM25) embeddings for these chunks in
+        batches with FastEmbed, stored as named vectors for hybrid search.
+    6. Upserts the vectors and metadata into the specified Qdrant collection
+        with several concurrent, bounded-size batches. Point IDs are derived
+        from the source path and the chunk text, so re-runs never duplicate.
+    7. Bumps the collection version stamp if anything changed, which
+        invalidates the answer caches.
+    In incremental mode a local manifest is used to skip unchanged files,
+    re-embed only the chunks of changed files that differ, and remove the
+    points of deleted files.
     Args:
-        chunk_size (int, optional): The maximum size of each text chunk in
-            characters. Defaults to 500.
-        chunk_overlap (int, optional): The number of characters to overlap
-            between adjacent chunks to maintain context. Defaults to 50.
+        chunk_size (Optional[int]): The maximum size of each text chunk, in
+            `chunk_unit`. Defaults to `settings.INGEST_CHUNK_SIZE`.
+        chunk_overlap (Optional[int]): The overlap between adjacent chunks
+            to maintain context, in `chunk_unit`. Defaults to
+            `settings.INGEST_CHUNK_OVERLAP`.
+        source (Optional[str]): File, directory or glob to ingest. Defaults
+            to `settings.INGEST_SOURCE_DIR`. Its sub-directories are the
+            document sets the retrieval can be filtered on.
+        pattern (Optional[str]): Glob used when `source` is a directory.
+            Defaults to `settings.INGEST_GLOB`.
+        incremental (Optional[bool]): Use the manifest at
+            `settings.INGEST_MANIFEST_PATH`. Defaults to
+            `settings.INGEST_INCREMENTAL`.
+        chunk_unit (Optional[str]): "tokens" or "characters". Defaults to
+            `settings.INGEST_CHUNK_UNIT`.
     Returns:
-        None
+        Optional[IngestionStats]: Counters and throughput of the run, or
+            None if no file was found outside incremental mode.
     Raises:
-        FileNotFoundError: Implicitly handled by logging an error if the source
-            PDF path does not exist.
+        RuntimeError: If a pipeline stage fails.
         QdrantClientError: If connection to the Qdrant instance fails.
     """
 
     logger.info(f"Connecting to Qdrant at {settings.QDRANT_URL}...")
-    client: QdrantClient = QdrantClient(url=settings.QDRANT_URL)
-
-    pdf_path: str = "data/raw_pdfs/policy.pdf"
-    if not os.path.exists(pdf_path):
-        logger.error(f"File not found: {pdf_path}")
-        return
+    client: QdrantClient = get_qdrant_client()
 
-    logger.info(f"Loading {pdf_path}...")
-    loader: PyPDFLoader = PyPDFLoader(pdf_path)
-    docs: list = loader.load()
+    if incremental is None:
+        incremental = settings.INGEST_INCREMENTAL
 
-    text_splitter: RecursiveCharacterTextSplitter = \
-        RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
-
-    splits: list = text_splitter.split_documents(docs)
-    logger.info(f"Split into {len(splits)} chunks.")
+    files: List[str] = discover_files(source, pattern)
+    if not files:
+        logger.error(
+            f"No files found in {source or settings.INGEST_SOURCE_DIR}")
+        # In incremental mode we still go on to drop deleted files
+        if not incremental:
+            return None
 
     logger.info(
-        "Indexing into Qdrant collection " +
+        f"Indexing {len(files)} files into Qdrant collection " +
         f"'{settings.QDRANT_COLLECTION_NAME}'...")
 
-    client.add(
-        collection_name=settings.QDRANT_COLLECTION_NAME,
-        documents=[doc.page_content for doc in splits],
-        metadata=[doc.metadata for doc in splits],
-        ids=None # Auto-generate IDs
+    manifest: Optional[IngestManifest] = \
+        IngestManifest(settings.INGEST_MANIFEST_PATH) if incremental else None
+
+    pipeline: IngestionPipeline = IngestionPipeline(
+        client=client,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        chunk_unit=chunk_unit,
+        manifest=manifest,
+        # Document sets are the sub-directories of the ingested directory
+        source_dir=source if source and os.path.isdir(source) else None,
     )
+    try:
+        stats: IngestionStats = pipeline.run(files)
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    if stats.chunks or stats.deleted_chunks or stats.updated_chunks:
+        bump_collection_version()
 
     logger.info(
-        f"Success! Indexed {len(splits)} chunks into" +
+        f"Success! Indexed {stats.chunks} chunks into" +
         f"'{settings.QDRANT_COLLECTION_NAME}'")
+    return stats
 
 if __name__ == "__main__":
     ingest_docs()
@@ -0,0 +1,241 @@
+'''
+
+Local manifest of what has been ingested, used for incremental re-ingestion.
+
+The manifest is a small SQLite database that remembers, for every source
+file, the hash of its content and the point IDs / hashes of its chunks. With
+it, unchanged files are skipped, changed files only re-embed the chunks that
+differ, and deleted files have their points removed. A point shared by the
+near-duplicate chunks of several files is only removed with its last file.
+
+'''
+
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# Fixed namespace so the same (source, chunk) always maps to the same UUID
+POINT_ID_NAMESPACE: uuid.UUID = uuid.UUID(
+    "6f1c4f8e-3b0a-4c8e-9a53-2f0b9b7f6c11")
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 of a file's content.
+
+    Args:
+        path (str): The file to hash.
+        block_size (int): Read size in bytes. Defaults to 1 MiB.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """Computes the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def point_id(source: str, chunk_hash: str) -> str:
+    """
+    Derives a deterministic Qdrant point ID for a chunk.
+
+    Args:
+        source (str): The normalised source path of the chunk.
+        chunk_hash (str): The hash of the chunk text.
+
+    Returns:
+        str: A UUID string, stable across runs.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}:{chunk_hash}"))
+
+
+class IngestManifest:
+    """
+    SQLite-backed record of ingested files and chunks.
+
+    Attributes:
+        path (str): Location of the SQLite file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        directory: str = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock: threading.Lock = threading.Lock()
+        self._conn: sqlite3.Connection = sqlite3.connect(
+            path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                source TEXT PRIMARY KEY,
+                file_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                source TEXT NOT NULL,
+                point_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                PRIMARY KEY (source, point_id)
+            );
+            CREATE INDEX IF NOT EXISTS chunks_point_id ON chunks (point_id);
+            CREATE TABLE IF NOT EXISTS signatures (
+                point_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def file_hash(self, source: str) -> Optional[str]:
+        """Returns the stored content hash of a file, if it was ingested."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM files WHERE source = ?", (source,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def sources(self) -> List[str]:
+        """Lists every source file recorded in the manifest."""
+        with self._lock:
+            rows = self._conn.execute("SELECT source FROM files").fetchall()
+        return [row[0] for row in rows]
+
+    def chunks(self, source: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the chunks recorded for a file.
+
+        Args:
+            source (str): The source path.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Metadata of each chunk, by point ID.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT point_id, metadata FROM chunks WHERE source = ?",
+                (source,)
+            ).fetchall()
+        return {pid: json.loads(metadata) for pid, metadata in rows}
+
+    def chunk_hashes(self, source: str) -> Dict[str, str]:
+        """Returns the text hash of each chunk recorded for a file, by
+        point ID."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT point_id, chunk_hash FROM chunks WHERE source = ?",
+                (source,)
+            ).fetchall()
+        return dict(rows)
+
+    def references(self, point_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Lists the files a point belongs to. Near-duplicate chunks of several
+        files share one point.
+
+        Args:
+            point_id (str): The point ID.
+
+        Returns:
+            List[Tuple[str, Dict[str, Any]]]: (source, chunk metadata)
+                pairs, sorted by source.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, metadata FROM chunks WHERE point_id = ? "
+                "ORDER BY source", (point_id,)
+            ).fetchall()
+        return [(source, json.loads(metadata)) for source, metadata in rows]
+
+    def signatures(self) -> List[Tuple[str, bytes]]:
+        """Returns the MinHash signature of every indexed point."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT point_id, signature FROM signatures").fetchall()
+        return [(pid, bytes(signature)) for pid, signature in rows]
+
+    def put_signatures(self, signatures: Dict[str, bytes]) -> None:
+        """Records the MinHash signatures of newly indexed points."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO signatures (point_id, signature) "
+                "VALUES (?, ?)", list(signatures.items()))
+
+    def remove_signatures(self, point_ids: List[str]) -> None:
+        """Forgets the signatures of deleted points."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM signatures WHERE point_id = ?",
+                [(pid,) for pid in point_ids])
+
+    def replace_file(
+            self,
+            source: str,
+            file_hash: str,
+            chunks: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Records the current state of a file, replacing any previous entry.
+
+        Args:
+            source (str): The source path.
+            file_hash (str): The content hash of the file.
+            chunks (Dict[str, Dict[str, Any]]): Per point ID, a dict with the
+                'chunk_hash' and the 'metadata' stored in the payload.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (source, file_hash) "
+                "VALUES (?, ?)", (source, file_hash))
+            self._conn.executemany(
+                "INSERT INTO chunks (source, point_id, chunk_hash, metadata) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (source, pid, chunk["chunk_hash"],
+                     json.dumps(chunk["metadata"], sort_keys=True,
+                                default=str))
+                    for pid, chunk in chunks.items()
+                ]
+            )
+
+    def remove_file(self, source: str) -> None:
+        """Forgets a file and its chunks."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute(
+                "DELETE FROM files WHERE source = ?", (source,))
+
+    def clear(self) -> None:
+        """Forgets everything, e.g. after the collection was recreated."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM signatures")
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,961 @@
+'''
+
+Parallel, multi-document ingestion pipeline.
+
+The pipeline runs five stages connected by bounded queues so memory stays
+flat no matter how many PDFs are ingested:
+
+    discover -> parse (process pool) -> chunk -> embed (batched) -> upsert
+
+The chunk stage strips repeated page headers and footers, splits the pages
+by tokens of the embedding model, and collapses near-duplicate chunks (also
+across files) into a single point whose payload lists all their sources.
+
+Every chunk carries the filterable metadata of its document: the document
+set (the first sub-directory below the source directory) and whatever a
+`<file>.meta.json` sidecar sets (document set, department, effective date).
+
+Point IDs are derived from the source path and the chunk text, so re-running
+the pipeline never duplicates points. With an `IngestManifest` the run is
+incremental: unchanged files are skipped, only new chunks of changed files
+are embedded, and points of deleted files or removed chunks are dropped.
+
+'''
+
+import glob
+import os
+import time
+import json
+import queue
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    DeletePayload,
+    DeletePayloadOperation,
+    PointIdsList,
+    PointStruct,
+    SetPayload,
+    SetPayloadOperation,
+    SparseVector
+)
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.utils.settings import settings
+from src.utils.embeddings import (
+    get_dense_model,
+    get_sparse_model
+)
+from src.ingestion.collection import ensure_collection
+from src.ingestion.dedup import NearDuplicateIndex
+from src.ingestion.chunking import build_splitter, strip_headers_footers
+from src.ingestion.manifest import (
+    IngestManifest,
+    hash_file,
+    hash_text,
+    point_id
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stream between two stages
+_SENTINEL: object = object()
+
+
+@dataclass
+class IngestionStats:
+    """
+    Counters collected during an ingestion run.
+
+    Attributes:
+        files (int): Number of source files parsed.
+        pages (int): Number of pages extracted.
+        chunks (int): Number of chunks embedded and upserted.
+        skipped_files (int): Unchanged files skipped (incremental mode).
+        deleted_files (int): Files whose points were removed because the
+            file no longer exists (incremental mode).
+        reused_chunks (int): Chunks of changed files that were already
+            indexed and did not need re-embedding (incremental mode).
+        deleted_chunks (int): Points removed from the collection.
+        updated_chunks (int): Points whose payload was refreshed in place.
+        duplicate_chunks (int): Near-duplicate chunks merged into an
+            existing point instead of being embedded.
+        failed_files (List[str]): Files that could not be parsed.
+        elapsed_seconds (float): Wall time of the whole run.
+    """
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    skipped_files: int = 0
+    deleted_files: int = 0
+    reused_chunks: int = 0
+    deleted_chunks: int = 0
+    updated_chunks: int = 0
+    duplicate_chunks: int = 0
+    failed_files: List[str] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        """Page throughput of the run."""
+        return self.pages / self.elapsed_seconds \
+            if self.elapsed_seconds else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Chunk throughput of the run."""
+        return self.chunks / self.elapsed_seconds \
+            if self.elapsed_seconds else 0.0
+
+
+# Document-level payload fields the retrieval can filter on (see
+# `src.agents.tools.build_filter`)
+DOCUMENT_FIELDS: Tuple[str, ...] = (
+    "document_set", "department", "effective_date")
+
+
+def discover_files(
+        source: Optional[str] = None,
+        pattern: Optional[str] = None) -> List[str]:
+    """
+    Lists the files to ingest.
+
+    Args:
+        source (Optional[str]): A single file, a directory or a glob
+            expression. Defaults to `settings.INGEST_SOURCE_DIR`.
+        pattern (Optional[str]): Glob applied below `source` when it is a
+            directory. Defaults to `settings.INGEST_GLOB`.
+
+    Returns:
+        List[str]: Sorted list of matching file paths.
+    """
+    source = source or settings.INGEST_SOURCE_DIR
+    pattern = pattern or settings.INGEST_GLOB
+
+    if os.path.isfile(source):
+        return [source]
+
+    if os.path.isdir(source):
+        expression: str = os.path.join(source, pattern)
+    else:
+        expression: str = source
+
+    files: List[str] = sorted(
+        path for path in glob.glob(expression, recursive=True)
+        if os.path.isfile(path)
+        and not path.endswith(settings.INGEST_METADATA_SUFFIX)
+    )
+    return files
+
+
+def document_metadata(
+        path: str,
+        source_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reads the filterable metadata of a document.
+
+    The document set defaults to the first sub-directory of `source_dir`
+    the file is in (data/raw_pdfs/hr/leave.pdf -> "hr"). A JSON sidecar
+    next to the file (`<file>` + `settings.INGEST_METADATA_SUFFIX`) may set
+    or override `DOCUMENT_FIELDS`, e.g.
+    {"department": "Legal", "effective_date": "2024-01-01"}.
+
+    Args:
+        path (str): Path to the document.
+        source_dir (Optional[str]): The root of the document sets. Defaults
+            to `settings.INGEST_SOURCE_DIR`.
+
+    Returns:
+        Dict[str, Any]: The metadata that is known, by field.
+
+    Raises:
+        ValueError: If the sidecar is not a JSON object or its effective
+            date is not an ISO date.
+    """
+    metadata: Dict[str, Any] = {}
+    relative: str = os.path.relpath(
+        path, source_dir or settings.INGEST_SOURCE_DIR)
+    parts: List[str] = relative.split(os.sep)
+    if len(parts) > 1 and parts[0] != os.pardir:
+        metadata["document_set"] = parts[0]
+
+    sidecar: str = path + settings.INGEST_METADATA_SUFFIX
+    if not os.path.isfile(sidecar):
+        return metadata
+
+    with open(sidecar, "r", encoding="utf-8") as f:
+        values: Any = json.load(f)
+    if not isinstance(values, dict):
+        raise ValueError(f"{sidecar}: expected a JSON object")
+
+    unknown: Set[str] = set(values) - set(DOCUMENT_FIELDS)
+    if unknown:
+        logger.warning(f"{sidecar}: ignoring unknown fields {sorted(unknown)}")
+    metadata.update(
+        {key: values[key] for key in DOCUMENT_FIELDS if values.get(key)})
+
+    if "effective_date" in metadata:
+        try:
+            metadata["effective_date"] = date.fromisoformat(
+                str(metadata["effective_date"])).isoformat()
+        except ValueError:
+            raise ValueError(
+                f"{sidecar}: effective_date must be an ISO date "
+                f"(YYYY-MM-DD), got {metadata['effective_date']!r}")
+    return metadata
+
+
+def parse_pdf(path: str) -> List[Document]:
+    """
+    Extracts one Document per page. Runs inside the parser process pool.
+
+    Args:
+        path (str): Path to the PDF file.
+
+    Returns:
+        List[Document]: The pages with 'source' and 'page' metadata.
+    """
+    loader: PyPDFLoader = PyPDFLoader(path)
+    return loader.load()
+
+
+def parse_text(path: str) -> List[Document]:
+    """
+    Reads a plain-text / Markdown file as a single page.
+
+    Args:
+        path (str): Path to the text file.
+
+    Returns:
+        List[Document]: One Document with 'source' and 'page' (0) metadata.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text: str = f.read()
+    return [Document(page_content=text, metadata={"source": path, "page": 0})]
+
+
+def parse_document(path: str) -> List[Document]:
+    """
+    Picks the parser from the file extension: text and Markdown files are
+    read as is, anything else is parsed as a PDF.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        List[Document]: The pages with 'source' and 'page' metadata.
+    """
+    if os.path.splitext(path)[1].lower() in (".txt", ".md"):
+        return parse_text(path)
+    return parse_pdf(path)
+
+
+class IngestionPipeline:
+    """
+    Streams documents from disk into a Qdrant collection.
+
+    Each stage runs in its own thread (parsing additionally fans out to a
+    process pool, upserts to several threads). Queues between stages are
+    bounded by `queue_size`, which gives natural back-pressure: a slow
+    upsert stage throttles embedding, which throttles parsing.
+
+    Attributes:
+        client (QdrantClient): The client used for upserts.
+        collection_name (str): The target collection.
+        chunk_size (int): Splitter chunk size, in `chunk_unit`.
+        chunk_overlap (int): Splitter overlap, in `chunk_unit`.
+        chunk_unit (str): "tokens" (of the dense model) or "characters".
+        strip_headers_footers (bool): Drop repeated page headers/footers.
+        dedup_index (Optional[NearDuplicateIndex]): Near-duplicate detector,
+            None when deduplication is disabled.
+        fingerprint (str): The chunking settings, stored with each file
+            hash: changing them must re-chunk even byte-identical files.
+        source_dir (str): The root of the document sets (see
+            `document_metadata`).
+        manifest (Optional[IngestManifest]): When set, the run is
+            incremental and the manifest is updated once it succeeds.
+    """
+
+    def __init__(
+            self,
+            client: QdrantClient,
+            collection_name: Optional[str] = None,
+            chunk_size: Optional[int] = None,
+            chunk_overlap: Optional[int] = None,
+            chunk_unit: Optional[str] = None,
+            strip_headers_footers: Optional[bool] = None,
+            deduplicate: Optional[bool] = None,
+            parse_workers: Optional[int] = None,
+            embed_batch_size: Optional[int] = None,
+            embed_parallel: Optional[int] = None,
+            embed_threads: Optional[int] = None,
+            upsert_batch_size: Optional[int] = None,
+            upsert_workers: Optional[int] = None,
+            queue_size: Optional[int] = None,
+            manifest: Optional[IngestManifest] = None,
+            source_dir: Optional[str] = None) -> None:
+
+        self.client: QdrantClient = client
+        self.collection_name: str = collection_name or \
+            settings.QDRANT_COLLECTION_NAME
+        self.chunk_size: int = chunk_size or settings.INGEST_CHUNK_SIZE
+        self.chunk_overlap: int = settings.INGEST_CHUNK_OVERLAP \
+            if chunk_overlap is None else chunk_overlap
+        self.chunk_unit: str = chunk_unit or settings.INGEST_CHUNK_UNIT
+        self.strip_headers_footers: bool = \
+            settings.INGEST_STRIP_HEADERS_FOOTERS \
+            if strip_headers_footers is None else strip_headers_footers
+        if deduplicate is None:
+            deduplicate = settings.INGEST_DEDUP_ENABLED
+        self.parse_workers: Optional[int] = parse_workers or \
+            settings.INGEST_PARSE_WORKERS
+        self.embed_batch_size: int = embed_batch_size or \
+            settings.INGEST_EMBED_BATCH_SIZE
+        self.embed_parallel: Optional[int] = settings.INGEST_EMBED_PARALLEL \
+            if embed_parallel is None else embed_parallel
+        self.embed_threads: Optional[int] = embed_threads or \
+            settings.INGEST_EMBED_THREADS
+        self.upsert_batch_size: int = upsert_batch_size or \
+            settings.INGEST_UPSERT_BATCH_SIZE
+        self.upsert_workers: int = upsert_workers or \
+            settings.INGEST_UPSERT_WORKERS
+        self.queue_size: int = queue_size or settings.INGEST_QUEUE_SIZE
+        self.manifest: Optional[IngestManifest] = manifest
+        self.source_dir: str = source_dir or settings.INGEST_SOURCE_DIR
+
+        self.splitter: RecursiveCharacterTextSplitter = build_splitter(
+            self.chunk_size, self.chunk_overlap, self.chunk_unit,
+            threads=self.embed_threads)
+        self.dedup_index: Optional[NearDuplicateIndex] = \
+            NearDuplicateIndex() if deduplicate else None
+
+        self.fingerprint: str = ":".join(str(part) for part in (
+            self.chunk_size, self.chunk_overlap, self.chunk_unit,
+            settings.EMBEDDING_MODEL_NAME
+            if self.chunk_unit == "tokens" else "",
+            int(self.strip_headers_footers),
+            self.dedup_index.threshold if self.dedup_index else "off",
+        ))
+
+        self.stats: IngestionStats = IngestionStats()
+        self._errors: List[Exception] = []
+        self._stats_lock: threading.Lock = threading.Lock()
+        # Manifest updates, applied only once the whole run succeeded
+        self._commits: List[Dict[str, Any]] = []
+        # Without a manifest: source of each new point, and the other
+        # sources of the points near-duplicates were merged into
+        self._owners: Dict[str, str] = {}
+        self._aliases: Dict[str, Set[str]] = {}
+        # Document metadata of every file planned in this run
+        self._documents: Dict[str, Dict[str, Any]] = {}
+
+    # --- COLLECTION ---------------------------------------------------------
+
+    def ensure_collection(self) -> bool:
+        """
+        Creates the collection (see src/ingestion/collection.py) if it does
+        not exist yet.
+
+        Returns:
+            bool: True if the collection was created.
+
+        Raises:
+            RuntimeError: If the collection exists with another vector
+                layout (e.g. created by an older, dense-only ingestion).
+        """
+        return ensure_collection(self.client, self.collection_name)
+
+    # --- PLANNING -----------------------------------------------------------
+
+    def _plan(
+            self,
+            files: List[str]) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """
+        Splits the discovered files into work to do.
+
+        Returns:
+            Tuple[List[Tuple[str, str]], List[str]]: The (source, file_hash)
+                pairs to parse, and the manifest sources whose file is gone.
+        """
+        sources: List[str] = [os.path.normpath(path) for path in files]
+        for source in sources:
+            self._documents[source] = \
+                document_metadata(source, self.source_dir)
+        if self.manifest is None:
+            return [(source, "") for source in sources], []
+
+        to_parse: List[Tuple[str, str]] = []
+        # Unchanged files re-chunked only because the settings changed
+        rechunked: int = 0
+        previous_fingerprint: Optional[str] = None
+        for source in sources:
+            # The chunking settings and the document metadata are part of
+            # the hash: changing them must re-process byte-identical files
+            content: str = (
+                f"{hash_file(source)}:"
+                f"{hash_text(_canonical(self._documents[source]))}")
+            file_hash: str = f"{content}:{self.fingerprint}"
+            stored: Optional[str] = self.manifest.file_hash(source)
+            if stored == file_hash:
+                self.stats.skipped_files += 1
+                continue
+            to_parse.append((source, file_hash))
+            if stored and stored.startswith(f"{content}:"):
+                rechunked += 1
+                previous_fingerprint = stored[len(content) + 1:]
+
+        if rechunked:
+            logger.warning(
+                f"Chunking settings changed ({previous_fingerprint} -> "
+                f"{self.fingerprint}): re-chunking and re-embedding "
+                f"{rechunked} unchanged files.")
+
+        discovered: Set[str] = set(sources)
+        deleted: List[str] = [
+            source for source in self.manifest.sources()
+            if source not in discovered and not os.path.exists(source)
+        ]
+        return to_parse, deleted
+
+    # --- STAGES -------------------------------------------------------------
+
+    def _put(self, q: "queue.Queue[Any]", item: Any) -> None:
+        """Blocking put that gives up once another stage has failed."""
+        while True:
+            if self._errors:
+                raise RuntimeError("Aborting: another stage failed.")
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _parse_stage(
+            self,
+            files: List[Tuple[str, str]],
+            pages_q: "queue.Queue[Any]") -> None:
+        """Parses files in a process pool, keeping at most `queue_size` files
+        in flight, and forwards their pages in discovery order."""
+        try:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+                in_flight: Deque[Tuple[str, str, Future]] = deque()
+
+                for source, file_hash in files:
+                    in_flight.append((
+                        source, file_hash,
+                        pool.submit(parse_document, source)))
+                    if len(in_flight) >= self.queue_size:
+                        self._forward_pages(in_flight.popleft(), pages_q)
+
+                while in_flight:
+                    self._forward_pages(in_flight.popleft(), pages_q)
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            pages_q.put(_SENTINEL)
+
+    def _forward_pages(
+            self,
+            job: Tuple[str, str, Future],
+            pages_q: "queue.Queue[Any]") -> None:
+        """Waits for one parse job and pushes its pages downstream."""
+        source, file_hash, future = job
+        try:
+            pages: List[Document] = future.result()
+        except Exception as e:
+            logger.error(f"Failed to parse {source}: {e}")
+            with self._stats_lock:
+                self.stats.failed_files.append(source)
+            return
+
+        with self._stats_lock:
+            self.stats.files += 1
+            self.stats.pages += len(pages)
+        self._put(pages_q, (source, file_hash, pages))
+
+    def _chunk_stage(
+            self,
+            pages_q: "queue.Queue[Any]",
+            chunks_q: "queue.Queue[Any]") -> None:
+        """Splits each document's pages into chunks and, in incremental
+        mode, only forwards the chunks that are not indexed yet."""
+        try:
+            while True:
+                item: Any = pages_q.get()
+                if item is _SENTINEL:
+                    break
+                source, file_hash, pages = item
+                if self.strip_headers_footers:
+                    pages = strip_headers_footers(pages)
+                chunks: List[Tuple[str, Document]] = self._select_chunks(
+                    source, file_hash, self.splitter.split_documents(pages))
+                if chunks:
+                    self._put(chunks_q, chunks)
+        except Exception as e:
+            self._errors.append(e)
+            # Drain upstream so the parse stage is never stuck on a full queue
+            while pages_q.get() is not _SENTINEL:
+                pass
+        finally:
+            chunks_q.put(_SENTINEL)
+
+    def _select_chunks(
+            self,
+            source: str,
+            file_hash: str,
+            splits: List[Document]) -> List[Tuple[str, Document]]:
+        """
+        Assigns deterministic point IDs, merges near-duplicates into existing
+        points and diffs the result against the manifest.
+
+        Args:
+            source (str): The normalised source path.
+            file_hash (str): The content hash of the file.
+            splits (List[Document]): The chunks of the file.
+
+        Returns:
+            List[Tuple[str, Document]]: The (point ID, chunk) pairs that
+                must be embedded.
+        """
+        previous: Dict[str, Dict[str, Any]] = {}
+        # The file's own previous chunks are replaced, never matched (the
+        # others are points of other files it shares)
+        outdated: Set[str] = set()
+        if self.manifest is not None:
+            previous = self.manifest.chunks(source)
+            outdated = {
+                pid for pid, chunk_hash in
+                self.manifest.chunk_hashes(source).items()
+                if pid == point_id(source, chunk_hash)
+            }
+
+        current: Dict[str, Tuple[str, Document]] = {}
+        # Points of other chunks this file's near-duplicates are merged into
+        aliases: Set[str] = set()
+        signatures: Dict[str, bytes] = {}
+        duplicates: int = 0
+
+        for chunk in splits:
+            chunk.metadata["source"] = source
+            chunk.metadata.update(self._documents[source])
+            chunk_hash: str = hash_text(chunk.page_content)
+            pid: str = point_id(source, chunk_hash)
+            if pid in current:
+                # Identical chunks within one file collapse into one point
+                continue
+
+            if self.dedup_index is not None and pid not in previous:
+                signature: np.ndarray = \
+                    self.dedup_index.signature(chunk.page_content)
+                match: Optional[str] = \
+                    self.dedup_index.query(signature, exclude=outdated)
+                if match is not None:
+                    duplicates += 1
+                    if match not in current:
+                        current[match] = (chunk_hash, chunk)
+                        aliases.add(match)
+                    continue
+                self.dedup_index.add(pid, signature)
+                signatures[pid] = self.dedup_index.to_bytes(signature)
+
+            current[pid] = (chunk_hash, chunk)
+            if self.manifest is None:
+                self._owners[pid] = source
+
+        if self.manifest is None:
+            with self._stats_lock:
+                self.stats.duplicate_chunks += duplicates
+                for pid in aliases:
+                    self._aliases.setdefault(pid, set()).add(source)
+            return [
+                (pid, chunk) for pid, (_, chunk) in current.items()
+                if pid not in aliases
+            ]
+
+        # Points whose references or payload change with this file
+        resync: Set[str] = set(aliases)
+        to_embed: List[Tuple[str, Document]] = []
+
+        for pid, (_, chunk) in current.items():
+            if pid in aliases:
+                continue
+            if pid not in previous:
+                to_embed.append((pid, chunk))
+            elif _canonical(previous[pid]) != _canonical(chunk.metadata):
+                # Same text, moved (e.g. to another page): payload only
+                resync.add(pid)
+        resync.update(pid for pid in previous if pid not in current)
+
+        with self._stats_lock:
+            self.stats.duplicate_chunks += duplicates
+            self.stats.reused_chunks += \
+                len(current) - len(aliases) - len(to_embed)
+            self._commits.append({
+                "source": source,
+                "file_hash": file_hash,
+                "chunks": {
+                    pid: {"chunk_hash": chunk_hash,
+                          "metadata": chunk.metadata}
+                    for pid, (chunk_hash, chunk) in current.items()
+                },
+                "resync": sorted(resync),
+                "signatures": signatures,
+            })
+
+        return to_embed
+
+    def _embed_stage(
+            self,
+            chunks_q: "queue.Queue[Any]",
+            upsert_q: "queue.Queue[Any]") -> None:
+        """
+        Embeds chunks with one long-running FastEmbed call per model.
+
+        The texts are fed lazily from the chunk queue so FastEmbed can batch
+        (and, with `parallel`, fan out) across documents, while the matching
+        metadata waits in order in a local deque. The stream is teed into the
+        dense and the sparse model, whose outputs come back in order.
+        """
+        pending: Deque[Tuple[str, Document]] = deque()
+        # Set once the sentinel was taken off the chunk queue: draining
+        # after that would wait forever
+        exhausted: bool = False
+
+        def texts() -> Iterator[str]:
+            nonlocal exhausted
+            while True:
+                chunks: Any = chunks_q.get()
+                if chunks is _SENTINEL:
+                    exhausted = True
+                    return
+                for pid, chunk in chunks:
+                    pending.append((pid, chunk))
+                    yield chunk.page_content
+
+        try:
+            dense_model = get_dense_model(
+                settings.EMBEDDING_MODEL_NAME, threads=self.embed_threads)
+            sparse_model = get_sparse_model(
+                settings.SPARSE_MODEL_NAME, threads=self.embed_threads)
+            dense_texts, sparse_texts = itertools.tee(texts())
+            batch: List[PointStruct] = []
+
+            for dense, sparse in zip(
+                    dense_model.embed(
+                        dense_texts,
+                        batch_size=self.embed_batch_size,
+                        parallel=self.embed_parallel),
+                    sparse_model.embed(
+                        sparse_texts,
+                        batch_size=self.embed_batch_size)):
+                pid, chunk = pending.popleft()
+                batch.append(PointStruct(
+                    id=pid,
+                    vector={
+                        settings.DENSE_VECTOR_NAME: dense.tolist(),
+                        settings.SPARSE_VECTOR_NAME: SparseVector(
+                            indices=sparse.indices.tolist(),
+                            values=sparse.values.tolist()),
+                    },
+                    payload={"document": chunk.page_content,
+                             **chunk.metadata,
+                             "sources": [chunk.metadata["source"]]},
+                ))
+                if len(batch) >= self.upsert_batch_size:
+                    self._put(upsert_q, batch)
+                    batch = []
+
+            if batch:
+                self._put(upsert_q, batch)
+        except Exception as e:
+            self._errors.append(e)
+            # Drain upstream so the chunk stage is never stuck on a full queue
+            while not exhausted and chunks_q.get() is not _SENTINEL:
+                pass
+        finally:
+            for _ in range(self.upsert_workers):
+                upsert_q.put(_SENTINEL)
+
+    def _upsert_stage(self, upsert_q: "queue.Queue[Any]") -> None:
+        """Writes point batches to Qdrant. Several of these run at once."""
+        while True:
+            batch: Any = upsert_q.get()
+            if batch is _SENTINEL:
+                return
+            if self._errors:
+                continue
+            try:
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=batch,
+                    wait=True,
+                )
+                with self._stats_lock:
+                    self.stats.chunks += len(batch)
+            except Exception as e:
+                self._errors.append(e)
+
+    # --- MANIFEST -----------------------------------------------------------
+
+    def _delete_points(self, ids: List[str]) -> None:
+        """Removes points from the collection in bounded batches."""
+        for i in range(0, len(ids), self.upsert_batch_size):
+            batch: List[str] = ids[i:i + self.upsert_batch_size]
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=batch),
+                wait=True,
+            )
+            self.stats.deleted_chunks += len(batch)
+
+    def _set_payloads(self, operations: List[Any]) -> None:
+        """Applies payload updates (set or delete operations) in bounded
+        batches."""
+        for i in range(0, len(operations), self.upsert_batch_size):
+            batch: List[Any] = operations[i:i + self.upsert_batch_size]
+            self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=batch,
+                wait=True,
+            )
+            self.stats.updated_chunks += sum(
+                isinstance(op, SetPayloadOperation) for op in batch)
+
+    def _resync_points(
+            self,
+            pids: List[str],
+            pending: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        """
+        Brings points in line with the files that refer to them: a point no
+        file refers to any more is deleted, the others get the metadata of
+        their first source, the list of all their 'sources' and the
+        document fields of all of them.
+
+        Args:
+            pids (List[str]): The points to check.
+            pending (Dict[str, Dict[str, Dict[str, Any]]]): The new chunks
+                of every file changed (or deleted: no chunks) by this run,
+                which take precedence over what the manifest still holds.
+        """
+        orphans: List[str] = []
+        operations: List[Any] = []
+        for pid in pids:
+            references: List[Tuple[str, Dict[str, Any]]] = [
+                ref for ref in self.manifest.references(pid)
+                if ref[0] not in pending
+            ]
+            references += [
+                (source, chunks[pid]["metadata"])
+                for source, chunks in pending.items() if pid in chunks
+            ]
+            if not references:
+                orphans.append(pid)
+                continue
+
+            references.sort(key=lambda ref: ref[0])
+            payload: Dict[str, Any] = \
+                {**references[0][1], **_shared_payload(references)}
+            operations.append(SetPayloadOperation(set_payload=SetPayload(
+                payload=payload, points=[pid])))
+            # Setting a payload merges it: drop the fields no document has
+            # any more (e.g. removed from a sidecar)
+            stale: List[str] = [
+                key for key in DOCUMENT_FIELDS if key not in payload]
+            if stale:
+                operations.append(DeletePayloadOperation(
+                    delete_payload=DeletePayload(keys=stale, points=[pid])))
+
+        self._delete_points(orphans)
+        self.manifest.remove_signatures(orphans)
+        self._set_payloads(operations)
+
+    def _commit(self, deleted: List[str]) -> None:
+        """
+        Applies deletions and payload changes, then updates the manifest.
+
+        Qdrant is updated first: if the run dies in between, the next one
+        redoes the same (idempotent) operations. Points are checked against
+        the final state of every file, so a point shared by a changed and a
+        deleted file is handled the same in any order.
+        """
+        pending: Dict[str, Dict[str, Dict[str, Any]]] = {
+            commit["source"]: commit["chunks"] for commit in self._commits}
+        resync: Set[str] = set()
+        for commit in self._commits:
+            resync.update(commit["resync"])
+        for source in deleted:
+            logger.info(f"Removing points of deleted file {source}...")
+            pending[source] = {}
+            resync.update(self.manifest.chunks(source))
+
+        self._resync_points(sorted(resync), pending)
+
+        for commit in self._commits:
+            self.manifest.put_signatures(commit["signatures"])
+            self.manifest.replace_file(
+                commit["source"], commit["file_hash"], commit["chunks"])
+        for source in deleted:
+            self.manifest.remove_file(source)
+            self.stats.deleted_files += 1
+
+    def _merge_sources(self) -> None:
+        """Without a manifest: adds the sources (and document fields) of the
+        merged near-duplicates to their points."""
+        self._set_payloads([
+            SetPayloadOperation(set_payload=SetPayload(
+                payload=_shared_payload([
+                    (source, self._documents[source])
+                    for source in [self._owners[pid]] + sorted(
+                        sources - {self._owners[pid]})
+                ]),
+                points=[pid]))
+            for pid, sources in self._aliases.items()
+        ])
+
+    def _seed_dedup_index(self) -> None:
+        """Loads the signatures of the indexed points, so new chunks are
+        also matched against files ingested by earlier runs."""
+        for pid, data in self.manifest.signatures():
+            signature: Optional[np.ndarray] = \
+                self.dedup_index.from_bytes(data)
+            if signature is not None:
+                self.dedup_index.add(pid, signature)
+        logger.info(
+            f"Near-duplicate index seeded with {len(self.dedup_index)} "
+            "chunks.")
+
+    # --- RUN ----------------------------------------------------------------
+
+    def run(self, files: List[str]) -> IngestionStats:
+        """
+        Ingests the given files and logs the throughput at the end.
+
+        Args:
+            files (List[str]): The paths to ingest (see `discover_files`).
+
+        Returns:
+            IngestionStats: Counters and timings of the run.
+
+        Raises:
+            RuntimeError: If any stage failed; the first error is chained.
+        """
+        start: float = time.perf_counter()
+        created: bool = self.ensure_collection()
+        if created and self.manifest is not None:
+            # A fresh collection holds nothing the manifest could refer to
+            self.manifest.clear()
+
+        to_parse, deleted = self._plan(files)
+        logger.info(
+            f"{len(to_parse)} files to parse, "
+            f"{self.stats.skipped_files} unchanged, {len(deleted)} deleted.")
+        if to_parse and self.dedup_index is not None and \
+                self.manifest is not None:
+            self._seed_dedup_index()
+
+        pages_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        chunks_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        upsert_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+
+        threads: List[threading.Thread] = [
+            threading.Thread(target=self._parse_stage,
+                             args=(to_parse, pages_q), name="ingest-parse"),
+            threading.Thread(target=self._chunk_stage,
+                             args=(pages_q, chunks_q), name="ingest-chunk"),
+            threading.Thread(target=self._embed_stage,
+                             args=(chunks_q, upsert_q), name="ingest-embed"),
+        ]
+        threads += [
+            threading.Thread(target=self._upsert_stage, args=(upsert_q,),
+                             name=f"ingest-upsert-{i}")
+            for i in range(self.upsert_workers)
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stats.elapsed_seconds = time.perf_counter() - start
+
+        if self._errors:
+            # Nothing is committed: deterministic IDs make the retry safe
+            raise RuntimeError(
+                f"Ingestion failed: {self._errors[0]}") from self._errors[0]
+
+        if self.manifest is not None:
+            self._commit(deleted)
+        elif self._aliases:
+            self._merge_sources()
+        self.stats.elapsed_seconds = time.perf_counter() - start
+
+        logger.info(
+            f"Ingested {self.stats.files} files / {self.stats.pages} pages / "
+            f"{self.stats.chunks} chunks in "
+            f"{self.stats.elapsed_seconds:.1f}s "
+            f"({self.stats.pages_per_second:.1f} pages/s, "
+            f"{self.stats.chunks_per_second:.1f} chunks/s)"
+        )
+        if self.dedup_index is not None:
+            logger.info(
+                f"{self.stats.duplicate_chunks} near-duplicate chunks merged "
+                "into existing points.")
+        if self.manifest is not None:
+            logger.info(
+                f"Incremental: {self.stats.skipped_files} files skipped, "
+                f"{self.stats.reused_chunks} chunks reused, "
+                f"{self.stats.deleted_chunks} points deleted "
+                f"({self.stats.deleted_files} deleted files).")
+        if self.stats.failed_files:
+            logger.warning(
+                f"{len(self.stats.failed_files)} files failed to parse: "
+                f"{self.stats.failed_files}")
+
+        return self.stats
+
+
+def _shared_payload(
+        references: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Payload fields of a point shared by several documents: all their
+    sources and, for each document field, all their values. Qdrant matches
+    a list payload when any item matches, so the point is found by a
+    filter on any of its documents.
+
+    Args:
+        references (List[Tuple[str, Dict[str, Any]]]): (source, metadata)
+            of each document, the main one first.
+
+    Returns:
+        Dict[str, Any]: The 'sources' and the document fields.
+    """
+    payload: Dict[str, Any] = {"sources": [ref[0] for ref in references]}
+    for key in DOCUMENT_FIELDS:
+        values: List[Any] = sorted({
+            ref[1][key] for ref in references if ref[1].get(key)})
+        if len(values) == 1:
+            payload[key] = values[0]
+        elif values:
+            payload[key] = values
+    return payload
+
+
+def _canonical(metadata: Dict[str, Any]) -> str:
+    """Serialises payload metadata the same way the manifest stores it."""
+    return json.dumps(metadata, sort_keys=True, default=str)
@@ -0,0 +1,91 @@
+'''
+
+Builds the chat model configured in `Settings`.
+
+The nodes and the eval judge never construct a provider class themselves:
+switching `LLM_PROVIDER` to "fake" runs the whole graph against the local
+deterministic model in src/utils/fake_llm.py.
+
+'''
+
+import logging
+from typing import Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from src.utils.settings import settings
+from src.utils.fake_llm import FakeChatModel
+from src.utils.metrics import token_metrics_callback
+from src.utils.rate_limiter import rate_limit_callback, rate_limiter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def build_chat_model(cache: Optional[BaseCache] = None) -> BaseChatModel:
+    """
+    Builds the chat model selected by `settings.LLM_PROVIDER`.
+
+    Args:
+        cache (Optional[BaseCache]): LangChain response cache. None disables
+            caching for this model.
+
+    Returns:
+        BaseChatModel: The model shared by every node.
+
+    Raises:
+        ValueError: If the provider is unknown.
+    """
+    provider: str = settings.LLM_PROVIDER.lower()
+    logger.info(f"Chat model provider: {provider}")
+
+    if provider == "google":
+        return ChatGoogleGenerativeAI(
+            model=settings.LLM_MODEL_NAME,
+            temperature=0,
+            # No provider-side retries: they would resend after a 429
+            # without going through the rate limiter. 429s are retried by
+            # the graph's retry policy (src/core/graph.py), through it.
+            max_retries=0,
+            google_api_key=settings.GOOGLE_API_KEY,
+            cache=cache,
+            # Shared quota: every call (nodes and eval judge) waits
+            rate_limiter=rate_limiter,
+            callbacks=[rate_limit_callback, token_metrics_callback]
+        )
+
+    if provider == "fake":
+        # No provider quota to respect: no rate limiter
+        return FakeChatModel(
+            latency_seconds=settings.FAKE_LLM_LATENCY_SECONDS,
+            token_delay_seconds=settings.FAKE_LLM_TOKEN_DELAY_SECONDS,
+            output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS,
+            relevant_ratio=settings.FAKE_LLM_RELEVANT_RATIO,
+            query_variants=settings.MULTI_QUERY_VARIANTS,
+            cache=cache,
+            callbacks=[token_metrics_callback],
+        )
+
+    raise ValueError(
+        f"Unknown LLM_PROVIDER '{settings.LLM_PROVIDER}' "
+        "(expected 'google' or 'fake')")
+
+
+def message_text(message: BaseMessage) -> str:
+    """Extracts the text of a (streamed) message: Gemini may send a list of
+    content parts instead of a plain string."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
@@ -0,0 +1,86 @@
+'''
+
+Version stamp of the Qdrant collection content.
+
+Ingestion bumps the stamp whenever it changes the collection, and every cache
+built on top of retrieval results compares it to the stamp it was filled
+under. The stamp lives in a small file so it is shared between the ingestion
+process and the serving processes.
+
+'''
+
+import os
+import uuid
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from src.utils.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+_lock: threading.Lock = threading.Lock()
+# Per path, (mtime_ns, version) of the last read: only re-read on change
+_cached: Dict[str, Tuple[int, str]] = {}
+
+
+def get_collection_version(path: Optional[str] = None) -> str:
+    """
+    Returns the current collection version stamp.
+
+    Args:
+        path (Optional[str]): Stamp file. Defaults to
+            `settings.COLLECTION_VERSION_PATH`.
+
+    Returns:
+        str: The stamp, or "0" if the collection was never stamped.
+    """
+    path = path or settings.COLLECTION_VERSION_PATH
+
+    try:
+        mtime_ns: int = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+
+    cached: Optional[Tuple[int, str]] = _cached.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    with open(path, "r") as f:
+        version: str = f.read().strip() or "0"
+    _cached[path] = (mtime_ns, version)
+    return version
+
+
+def bump_collection_version(path: Optional[str] = None) -> str:
+    """
+    Writes a new collection version stamp.
+
+    Args:
+        path (Optional[str]): Stamp file. Defaults to
+            `settings.COLLECTION_VERSION_PATH`.
+
+    Returns:
+        str: The new stamp.
+    """
+    path = path or settings.COLLECTION_VERSION_PATH
+    version: str = uuid.uuid4().hex
+
+    with _lock:
+        directory: str = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so readers never see a partial stamp
+        tmp_path: str = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, path)
+
+    logger.info(f"Collection version bumped to {version}")
+    return version
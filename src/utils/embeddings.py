@@ -0,0 +1,155 @@
+'''
+
+Process-wide FastEmbed models.
+
+Loading an ONNX embedding model is expensive, so models are created once per
+process (and per thread setting) and reused by every caller.
+
+'''
+
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastembed import SparseTextEmbedding, TextEmbedding
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from tokenizers import Tokenizer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+_models_lock: threading.Lock = threading.Lock()
+_dense_models: Dict[Tuple[str, Optional[int]], TextEmbedding] = {}
+_sparse_models: Dict[Tuple[str, Optional[int]], SparseTextEmbedding] = {}
+_cross_encoders: Dict[str, TextCrossEncoder] = {}
+_tokenizers: Dict[str, Tokenizer] = {}
+
+
+def get_dense_model(
+        model_name: str,
+        threads: Optional[int] = None) -> TextEmbedding:
+    """
+    Returns a cached FastEmbed dense embedding model.
+
+    Args:
+        model_name (str): The FastEmbed model name, e.g. "BAAI/bge-small-en".
+        threads (Optional[int]): Number of ONNX runtime threads. None lets
+            ONNX decide.
+
+    Returns:
+        TextEmbedding: The loaded model.
+    """
+    key: Tuple[str, Optional[int]] = (model_name, threads)
+    model: Optional[TextEmbedding] = _dense_models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        if key not in _dense_models:
+            logger.info(f"Loading embedding model '{model_name}'...")
+            _dense_models[key] = TextEmbedding(
+                model_name=model_name, threads=threads)
+        return _dense_models[key]
+
+
+def get_sparse_model(
+        model_name: str,
+        threads: Optional[int] = None) -> SparseTextEmbedding:
+    """
+    Returns a cached FastEmbed sparse embedding model (BM25, SPLADE...).
+
+    Args:
+        model_name (str): The FastEmbed model name, e.g. "Qdrant/bm25".
+        threads (Optional[int]): Number of ONNX runtime threads, for the
+            neural models. None lets ONNX decide.
+
+    Returns:
+        SparseTextEmbedding: The loaded model.
+    """
+    key: Tuple[str, Optional[int]] = (model_name, threads)
+    model: Optional[SparseTextEmbedding] = _sparse_models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        if key not in _sparse_models:
+            logger.info(f"Loading sparse embedding model '{model_name}'...")
+            _sparse_models[key] = SparseTextEmbedding(
+                model_name=model_name, threads=threads)
+        return _sparse_models[key]
+
+
+def get_dense_dimension(model_name: str) -> int:
+    """
+    Returns the output size of a dense embedding model.
+
+    Args:
+        model_name (str): The FastEmbed model name.
+
+    Returns:
+        int: The vector dimension.
+    """
+    for description in TextEmbedding.list_supported_models():
+        if description["model"].lower() == model_name.lower():
+            return int(description["dim"])
+    # Custom model: embed a probe
+    return len(next(iter(get_dense_model(model_name).embed(["probe"]))))
+
+
+def get_tokenizer(
+        model_name: str,
+        threads: Optional[int] = None) -> Tokenizer:
+    """
+    Returns the tokenizer of a dense embedding model, for counting tokens.
+
+    FastEmbed truncates and pads its tokenizer to the model window; the
+    copy returned here does neither, so long texts are counted in full.
+
+    Args:
+        model_name (str): The FastEmbed model name.
+        threads (Optional[int]): Passed to `get_dense_model`, to reuse an
+            instance that is already loaded.
+
+    Returns:
+        Tokenizer: A Hugging Face `tokenizers` tokenizer.
+    """
+    tokenizer: Optional[Tokenizer] = _tokenizers.get(model_name)
+    if tokenizer is not None:
+        return tokenizer
+
+    model: TextEmbedding = get_dense_model(model_name, threads=threads)
+    with _models_lock:
+        if model_name not in _tokenizers:
+            tokenizer = Tokenizer.from_str(model.model.tokenizer.to_str())
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            _tokenizers[model_name] = tokenizer
+        return _tokenizers[model_name]
+
+
+def get_cross_encoder(model_name: str) -> TextCrossEncoder:
+    """
+    Returns a cached FastEmbed cross-encoder (reranker).
+
+    Args:
+        model_name (str): The FastEmbed reranker name, e.g.
+            "Xenova/ms-marco-MiniLM-L-6-v2".
+
+    Returns:
+        TextCrossEncoder: The loaded model.
+    """
+    model: Optional[TextCrossEncoder] = _cross_encoders.get(model_name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        if model_name not in _cross_encoders:
+            logger.info(f"Loading reranker model '{model_name}'...")
+            _cross_encoders[model_name] = TextCrossEncoder(
+                model_name=model_name)
+        return _cross_encoders[model_name]
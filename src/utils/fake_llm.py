@@ -0,0 +1,216 @@
+'''
+
+Deterministic fake chat model for local load tests.
+
+Behaves like the Gemini model from the graph's point of view (sync, async,
+streaming, structured output, usage metadata, LangChain cache) but answers
+locally after a configurable delay, so the orchestration, the Qdrant path
+and the UI can be exercised without spending quota.
+
+'''
+
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult
+)
+from langchain_core.runnables import Runnable, RunnableLambda
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+_WORDS: List[str] = (
+    "According to the retrieved policy documents the requested rule applies "
+    "to all employees and must be approved by the compliance team before "
+    "any exception is granted"
+).split()
+
+_CHUNK_MARKER: re.Pattern = re.compile(r"\[Chunk \d+\]")
+
+
+def _stable_fraction(text: str) -> float:
+    """Maps a text to a reproducible number in [0, 1)."""
+    digest: bytes = hashlib.sha256(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers locally and deterministically.
+
+    Attributes:
+        latency_seconds (float): Delay before the first token.
+        token_delay_seconds (float): Delay between streamed tokens.
+        output_tokens (int): Number of words in a free-text answer.
+        relevant_ratio (float): Share of chunks graded 'yes' by the
+            structured grader; each chunk's grade depends only on its text.
+        judge_score (int): Score returned for integer fields (eval judge).
+        query_variants (int): Items returned for other list fields (e.g.
+            multi-query variants).
+    """
+
+    latency_seconds: float = 0.5
+    token_delay_seconds: float = 0.01
+    output_tokens: int = 60
+    relevant_ratio: float = 1.0
+    judge_score: int = 1
+    query_variants: int = 3
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-compliance"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "latency_seconds": self.latency_seconds,
+            "output_tokens": self.output_tokens,
+            "relevant_ratio": self.relevant_ratio,
+        }
+
+    # --- RESPONSES ----------------------------------------------------------
+
+    def _structured(self, schema: type[BaseModel], text: str) -> str:
+        """Fills every field of a structured-output schema, as JSON."""
+        chunks: List[str] = _CHUNK_MARKER.split(text)[1:]
+        values: Dict[str, Any] = {}
+        for name, field in schema.model_fields.items():
+            annotation: Any = field.annotation
+            if annotation is int:
+                values[name] = self.judge_score
+            elif getattr(annotation, "__origin__", None) is list and chunks:
+                # One grade per numbered chunk, e.g. GradeDocuments
+                values[name] = [
+                    "yes" if _stable_fraction(c.strip()) < self.relevant_ratio
+                    else "no" for c in chunks
+                ]
+            elif getattr(annotation, "__origin__", None) is list:
+                question: str = text.rsplit("Question:", 1)[-1].strip()
+                values[name] = [
+                    f"{question} (variant {i})"
+                    for i in range(1, self.query_variants + 1)
+                ]
+            else:
+                values[name] = f"Fake {name}."
+        return json.dumps(values)
+
+    def _reply(self, messages: List[BaseMessage], **kwargs: Any) -> str:
+        """Builds the full response text for a prompt."""
+        text: str = "\n".join(str(m.content) for m in messages)
+
+        schema: Optional[type[BaseModel]] = kwargs.get("response_schema")
+        if schema is not None:
+            return self._structured(schema, text)
+
+        if "Initial Question:" in text:
+            # Query rewriter: echo the question so retrieval still works
+            return text.rsplit("Initial Question:", 1)[-1] \
+                .split("\n", 1)[0].strip()
+
+        return " ".join(
+            _WORDS[i % len(_WORDS)] for i in range(self.output_tokens)) + "."
+
+    def _message(self, messages: List[BaseMessage], content: str) -> AIMessage:
+        """Wraps the content with usage metadata, like the real provider."""
+        input_tokens: int = sum(
+            len(str(m.content).split()) for m in messages)
+        output_tokens: int = len(content.split())
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    # --- LANGCHAIN HOOKS ----------------------------------------------------
+
+    def _generate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any) -> ChatResult:
+        content: str = self._reply(messages, **kwargs)
+        time.sleep(self.latency_seconds +
+                   self.token_delay_seconds * len(content.split()))
+        return ChatResult(generations=[
+            ChatGeneration(message=self._message(messages, content))])
+
+    async def _agenerate(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any) -> ChatResult:
+        content: str = self._reply(messages, **kwargs)
+        await asyncio.sleep(self.latency_seconds +
+                            self.token_delay_seconds * len(content.split()))
+        return ChatResult(generations=[
+            ChatGeneration(message=self._message(messages, content))])
+
+    def _stream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        content: str = self._reply(messages, **kwargs)
+        time.sleep(self.latency_seconds)
+        for i, word in enumerate(content.split(" ")):
+            if i:
+                time.sleep(self.token_delay_seconds)
+            chunk: ChatGenerationChunk = ChatGenerationChunk(
+                message=AIMessageChunk(content=(" " if i else "") + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        content: str = self._reply(messages, **kwargs)
+        await asyncio.sleep(self.latency_seconds)
+        for i, word in enumerate(content.split(" ")):
+            if i:
+                await asyncio.sleep(self.token_delay_seconds)
+            chunk: ChatGenerationChunk = ChatGenerationChunk(
+                message=AIMessageChunk(content=(" " if i else "") + word))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(
+            self,
+            schema: Any,
+            **kwargs: Any) -> Runnable:
+        """
+        Returns a runnable producing `schema` instances.
+
+        The schema is bound as a call argument, so it goes through the
+        normal model call (latency, callbacks, cache key) like the real
+        provider's tool binding does.
+        """
+        return self.bind(response_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content))
@@ -0,0 +1,179 @@
+'''
+
+Persistent exact-match cache for LLM calls.
+
+The nodes call Gemini at temperature 0, so the same model + prompt +
+structured-output schema always gives (close enough to) the same answer.
+This cache stores those answers in SQLite so retries and evaluation re-runs
+do not pay for them again.
+
+'''
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from src.utils.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    LangChain cache backed by a local SQLite file, with LRU eviction.
+
+    The key is a hash of LangChain's `llm_string` (model name, parameters
+    and bound tools, which is how the structured-output schema is passed)
+    and of the serialised prompt messages.
+
+    Attributes:
+        path (str): Location of the SQLite file.
+        max_entries (int): Size cap; least recently used rows are evicted.
+        hits (int): Number of cache hits in this process.
+        misses (int): Number of cache misses in this process.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000) -> None:
+        self.path: str = path
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+
+        directory: str = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock: threading.Lock = threading.Lock()
+        self._conn: sqlite3.Connection = sqlite3.connect(
+            path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access "
+            "ON llm_cache (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        """Hashes the model description and the prompt into one key."""
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(
+            self,
+            prompt: str,
+            llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Returns the cached generations, or None on a miss."""
+        key: str = self._key(prompt, llm_string)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            self.hits += 1
+
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.warning(f"Dropping unreadable LLM cache entry: {e}")
+            return None
+
+    def update(
+            self,
+            prompt: str,
+            llm_string: str,
+            return_val: RETURN_VAL_TYPE) -> None:
+        """Stores generations and evicts the oldest rows beyond the cap."""
+        key: str = self._key(prompt, llm_string)
+        value: str = dumps(list(return_val))
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, last_access) "
+                "VALUES (?, ?, ?)", (key, value, time.time())
+            )
+            count: int = self._conn.execute(
+                "SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY last_access ASC "
+                    "LIMIT ?)", (count - self.max_entries,)
+                )
+
+    def clear(self, **kwargs: Any) -> None:
+        """Drops every cached generation."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current number of rows."""
+        with self._lock:
+            size: int = self._conn.execute(
+                "SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total: int = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+        }
+
+
+def build_llm_cache() -> Optional[SQLiteLLMCache]:
+    """
+    Builds the cache configured in `Settings`.
+
+    Returns:
+        Optional[SQLiteLLMCache]: The cache, or None if it is disabled.
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return SQLiteLLMCache(
+        path=settings.LLM_CACHE_PATH,
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES
+    )
+
+
+def is_cache_enabled_for(node: str) -> bool:
+    """
+    Tells whether a node may use the LLM cache.
+
+    Args:
+        node (str): The node name, e.g. "rewrite_query".
+
+    Returns:
+        bool: False if the node is listed in
+            `settings.LLM_CACHE_DISABLED_NODES`.
+    """
+    return node not in settings.LLM_CACHE_DISABLED_NODES
@@ -0,0 +1,204 @@
+'''
+
+Prometheus metrics of the agent, and the endpoint that exposes them.
+
+Node timings, LLM tokens, retrieval hits, grades and retries are recorded
+by the node wrapper in src/core/instrumentation.py; the Chainlit handler
+adds time-to-first-token. Everything is served on `GET /metrics` by a small
+FastAPI app, started next to Chainlit on `settings.METRICS_PORT`.
+
+With several API worker processes, `PROMETHEUS_MULTIPROC_DIR` must point
+to an empty directory shared by the workers (`python -m src.app.api` sets
+it up): each worker writes its samples there and whichever one is scraped
+serves the aggregate of all of them.
+
+'''
+
+import os
+import logging
+import threading
+import contextvars
+from typing import Any, Dict, Optional
+
+import uvicorn
+from fastapi import APIRouter, FastAPI, Response
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+from src.utils.settings import settings
+from src.utils.rate_limiter import rate_limiter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# Set in every worker process when the API runs several of them
+MULTIPROCESS_DIR: Optional[str] = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Node currently running in this thread / task, set by the node wrapper so
+# the LLM callback can attribute tokens to it
+current_node: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_node", default="unknown")
+
+# --- METRICS ----------------------------------------------------------------
+
+NODE_DURATION: Histogram = Histogram(
+    "agent_node_duration_seconds",
+    "Wall time of one graph node run.",
+    ["node"],
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+NODE_RUNS: Counter = Counter(
+    "agent_node_runs_total",
+    "Graph node runs, by outcome.",
+    ["node", "status"],
+)
+LLM_TOKENS: Counter = Counter(
+    "agent_llm_tokens_total",
+    "LLM tokens used, by node and direction ('input' / 'output').",
+    ["node", "direction"],
+)
+RETRIEVED_CHUNKS: Histogram = Histogram(
+    "agent_retrieved_chunks",
+    "Chunks returned by a node (retrieval hits, kept after rerank/grade).",
+    ["node"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+GRADES: Counter = Counter(
+    "agent_grades_total",
+    "Relevance grades set by a node.",
+    ["node", "grade"],
+)
+RETRY_COUNT: Histogram = Histogram(
+    "agent_retry_count",
+    "Query rewrites needed before the answer was generated.",
+    buckets=(0, 1, 2, 3, 5),
+)
+TIME_TO_FIRST_TOKEN: Histogram = Histogram(
+    "agent_time_to_first_token_seconds",
+    "Time until the first answer token reached the user.",
+    ["source"],
+    buckets=(.1, .25, .5, 1, 2, 3, 5, 10, 20, 30),
+)
+CACHE_REQUESTS: Counter = Counter(
+    "agent_cache_requests_total",
+    "In-process cache lookups, by cache and result ('hit' / 'miss').",
+    ["cache", "result"],
+)
+COALESCED_CALLS: Counter = Counter(
+    "agent_coalesced_calls_total",
+    "Calls that joined an identical call already in flight instead of "
+    "running their own (see src/utils/single_flight.py), by flight.",
+    ["flight"],
+)
+STARTUP_PHASE_SECONDS: Gauge = Gauge(
+    "agent_startup_phase_seconds",
+    "Duration of each startup / warm-up phase of the process.",
+    ["phase"],
+)
+RATE_LIMITER_QUEUE_DEPTH: Gauge = Gauge(
+    "agent_llm_rate_limiter_queue_depth",
+    "Callers waiting for LLM quota.",
+    # Summed over the live worker processes
+    multiprocess_mode="livesum",
+)
+if MULTIPROCESS_DIR:
+    # A scrape reads the files of every worker, not their callbacks: the
+    # depth is written on every change instead
+    rate_limiter.on_queue_depth = RATE_LIMITER_QUEUE_DEPTH.set
+else:
+    RATE_LIMITER_QUEUE_DEPTH.set_function(lambda: rate_limiter.queue_depth)
+
+
+class TokenMetricsCallbackHandler(BaseCallbackHandler):
+    """Counts the tokens of every LLM call under the running node."""
+
+    # Inline, so the node context variable is still the caller's
+    run_inline: bool = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Adds the reported usage to the token counters."""
+        node: str = current_node.get()
+        for generations in response.generations:
+            for generation in generations:
+                if not isinstance(generation, ChatGeneration):
+                    continue
+                usage: Optional[Dict[str, Any]] = getattr(
+                    generation.message, "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.labels(node, "input").inc(
+                        usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(node, "output").inc(
+                        usage.get("output_tokens", 0))
+
+
+token_metrics_callback: TokenMetricsCallbackHandler = \
+    TokenMetricsCallbackHandler()
+
+# --- ENDPOINT ---------------------------------------------------------------
+
+metrics_router: APIRouter = APIRouter()
+
+
+@metrics_router.get("/metrics")
+def metrics() -> Response:
+    """Prometheus scrape endpoint."""
+    registry: CollectorRegistry = REGISTRY
+    if MULTIPROCESS_DIR:
+        # Aggregates the samples of every worker process
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(
+        generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_worker_dead() -> None:
+    """Drops the live gauges of this worker process from the aggregate,
+    e.g. when uvicorn stops or replaces it."""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+_server_lock: threading.Lock = threading.Lock()
+_server_started: bool = False
+
+
+def start_metrics_server(port: Optional[int] = None) -> None:
+    """
+    Serves `/metrics` from a background thread, once per process.
+
+    Args:
+        port (Optional[int]): Listening port. Defaults to
+            `settings.METRICS_PORT`.
+    """
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+
+    port = port or settings.METRICS_PORT
+    app: FastAPI = FastAPI(title="Compliance Agent metrics")
+    app.include_router(metrics_router)
+    server: uvicorn.Server = uvicorn.Server(uvicorn.Config(
+        app, host=settings.METRICS_HOST, port=port, log_level="warning"))
+
+    # Outside the main thread uvicorn leaves the signal handlers alone
+    threading.Thread(
+        target=server.run, name="metrics-server", daemon=True).start()
+    logger.info(f"Prometheus metrics on http://{settings.METRICS_HOST}:"
+                f"{port}/metrics")
@@ -0,0 +1,234 @@
+'''
+
+Shared, long-lived Qdrant clients (sync and async) for the whole application.
+
+Creating a `QdrantClient` per call opens a fresh HTTP connection every time,
+so the tools, the ingestion and the graph nodes all go through the
+`qdrant_manager` defined here instead.
+
+'''
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from src.utils.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QdrantClientManager:
+    """
+    Holds one pooled sync client and one pooled async client per process.
+
+    The clients are built lazily on first access and then reused, so the hot
+    path never constructs a client. The HTTP transport keeps up to
+    `pool_size` connections alive for `keepalive_seconds`; when
+    `prefer_grpc` is set the gRPC channel is used instead, with keep-alive
+    pings configured through the channel options. With a `location` the
+    clients run Qdrant in-process instead (no server, no network); an
+    in-memory sync client and async client do not share their data.
+
+    Attributes:
+        url (str): The Qdrant REST URL.
+        prefer_grpc (bool): Use the gRPC interface instead of REST.
+        grpc_port (int): The gRPC port of the Qdrant instance.
+        pool_size (int): Maximum number of pooled HTTP connections.
+        keepalive_seconds (float): How long idle connections are kept open.
+        timeout (int): Request timeout in seconds.
+        location (Optional[str]): ":memory:" or a local storage path for an
+            in-process Qdrant. None connects to `url`.
+        healthcheck_interval (float): Minimum number of seconds between two
+            health checks triggered by `ensure_healthy`.
+    """
+
+    def __init__(
+            self,
+            url: Optional[str] = None,
+            prefer_grpc: Optional[bool] = None,
+            grpc_port: Optional[int] = None,
+            pool_size: Optional[int] = None,
+            keepalive_seconds: Optional[float] = None,
+            timeout: Optional[int] = None,
+            location: Optional[str] = None,
+            healthcheck_interval: Optional[float] = None) -> None:
+
+        self.url: str = url or settings.QDRANT_URL
+        self.prefer_grpc: bool = settings.QDRANT_PREFER_GRPC \
+            if prefer_grpc is None else prefer_grpc
+        self.grpc_port: int = grpc_port or settings.QDRANT_GRPC_PORT
+        self.pool_size: int = pool_size or settings.QDRANT_POOL_SIZE
+        self.keepalive_seconds: float = keepalive_seconds or \
+            settings.QDRANT_KEEPALIVE_SECONDS
+        self.timeout: int = timeout or settings.QDRANT_TIMEOUT_SECONDS
+        self.location: Optional[str] = location or settings.QDRANT_LOCATION
+        self.healthcheck_interval: float = healthcheck_interval or \
+            settings.QDRANT_HEALTHCHECK_INTERVAL_SECONDS
+
+        self._lock: threading.Lock = threading.Lock()
+        self._client: Optional[QdrantClient] = None
+        self._async_client: Optional[AsyncQdrantClient] = None
+        self._last_healthcheck: float = 0.0
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        """Builds the constructor arguments shared by both clients."""
+        if self.location == ":memory:":
+            return {"location": self.location}
+        if self.location:
+            return {"path": self.location}
+
+        kwargs: Dict[str, Any] = {
+            "url": self.url,
+            "timeout": self.timeout,
+            "prefer_grpc": self.prefer_grpc,
+            "grpc_port": self.grpc_port,
+        }
+
+        if self.prefer_grpc:
+            keepalive_ms: int = int(self.keepalive_seconds * 1000)
+            kwargs["grpc_options"] = {
+                "grpc.keepalive_time_ms": keepalive_ms,
+                "grpc.keepalive_permit_without_calls": 1,
+            }
+        else:
+            # Extra kwargs are forwarded to the underlying httpx client
+            kwargs["limits"] = httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_seconds,
+            )
+
+        return kwargs
+
+    @property
+    def client(self) -> QdrantClient:
+        """The shared synchronous client, created on first access."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    logger.info(
+                        f"Opening Qdrant client pool at "
+                        f"{self.location or self.url}...")
+                    self._client = QdrantClient(**self._client_kwargs())
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        """The shared asynchronous client, created on first access."""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    logger.info(
+                        f"Opening async Qdrant client pool at "
+                        f"{self.location or self.url}...")
+                    self._async_client = AsyncQdrantClient(
+                        **self._client_kwargs())
+        return self._async_client
+
+    def health_check(self) -> bool:
+        """
+        Pings Qdrant with the sync client.
+
+        Returns:
+            bool: True if the instance answered, False otherwise.
+        """
+        self._last_healthcheck = time.monotonic()
+        try:
+            self.client.get_collections()
+            return True
+        except Exception as e:
+            logger.warning(f"Qdrant health check failed: {e}")
+            return False
+
+    async def ahealth_check(self) -> bool:
+        """
+        Pings Qdrant with the async client.
+
+        Returns:
+            bool: True if the instance answered, False otherwise.
+        """
+        self._last_healthcheck = time.monotonic()
+        try:
+            await self.async_client.get_collections()
+            return True
+        except Exception as e:
+            logger.warning(f"Async Qdrant health check failed: {e}")
+            return False
+
+    def ensure_healthy(self) -> bool:
+        """
+        Runs a health check if the last one is older than
+        `healthcheck_interval` and rebuilds the clients when it fails.
+
+        Returns:
+            bool: The result of the last health check (True if skipped).
+        """
+        elapsed: float = time.monotonic() - self._last_healthcheck
+        if elapsed < self.healthcheck_interval:
+            return True
+
+        if self.health_check():
+            return True
+
+        logger.warning("Recycling Qdrant client pool after failed check.")
+        self.reset()
+        return False
+
+    def reset(self) -> None:
+        """
+        Drops the pooled clients so the next access reconnects.
+
+        The async client is only dereferenced here; use `aclose` from the
+        event loop that owns it to close its connections cleanly.
+        """
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception as e:
+                    logger.warning(f"Error closing Qdrant client: {e}")
+            self._client = None
+            self._async_client = None
+
+    def close(self) -> None:
+        """Closes the sync client pool."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        """Closes the async client pool."""
+        client: Optional[AsyncQdrantClient] = self._async_client
+        self._async_client = None
+        if client is not None:
+            await client.close()
+
+
+qdrant_manager: QdrantClientManager = QdrantClientManager()
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Returns the process-wide pooled synchronous Qdrant client."""
+    return qdrant_manager.client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Returns the process-wide pooled asynchronous Qdrant client."""
+    return qdrant_manager.async_client
+
+
+if __name__ == "__main__":
+    healthy: bool = qdrant_manager.health_check()
+    logger.info(f"Qdrant at {qdrant_manager.url} healthy: {healthy}")
+    qdrant_manager.close()
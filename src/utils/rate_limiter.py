@@ -0,0 +1,350 @@
+'''
+
+Process-wide adaptive rate limiter for LLM calls.
+
+A token bucket on requests/min and one on tokens/min, shared by every call
+to the chat model. It plugs into LangChain's `rate_limiter` hook (so cache
+hits never consume quota) and a callback handler feeds it the real token
+usage and the 429 errors, to which it reacts with exponential backoff and a
+temporarily reduced rate.
+
+Reservations are tracked per LangChain run: the callback handler marks the
+run being started, the limiter files the reservation it takes under that
+run ID, and only the end or error of that same run settles it. A cache hit
+also ends a run, but without a reservation, so it never settles another
+call's tokens nor counts as a successful request during a backoff.
+
+'''
+
+import time
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from src.utils.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+# The LangChain run about to call the model in this thread / task. Set by
+# `RateLimitCallbackHandler` when a run starts, read by the limiter when
+# the (uncached) call acquires its quota right after.
+_current_run: ContextVar[Optional[UUID]] = ContextVar(
+    "llm_run_id", default=None)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Tells whether an exception is a provider quota / 429 error."""
+    text: str = str(error)
+    return "429" in text or "ResourceExhausted" in text or \
+        "RESOURCE_EXHAUSTED" in text
+
+
+class AdaptiveRateLimiter(BaseRateLimiter):
+    """
+    Token-bucket limiter on requests/min and tokens/min with 429 backoff.
+
+    The token count of a call is unknown before it runs, so every request
+    reserves `estimated_tokens_per_request` and the difference with the
+    real usage is settled afterwards, by run ID (see `record_usage`).
+
+    Attributes:
+        requests_per_minute (float): Request quota.
+        tokens_per_minute (float): Token quota (input + output).
+        estimated_tokens_per_request (int): Tokens reserved per request.
+        max_backoff_seconds (float): Upper bound of the 429 backoff.
+        rate_factor (float): Current fraction of the quota in use; halved on
+            every 429 and slowly restored on success.
+        on_queue_depth (Optional[Callable[[int], None]]): Called with the
+            new number of waiting callers whenever it changes.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: float,
+            tokens_per_minute: float,
+            estimated_tokens_per_request: int = 1000,
+            max_backoff_seconds: float = 60.0,
+            check_every_n_seconds: float = 0.1) -> None:
+
+        self.requests_per_minute: float = requests_per_minute
+        self.tokens_per_minute: float = tokens_per_minute
+        self.estimated_tokens_per_request: int = estimated_tokens_per_request
+        self.max_backoff_seconds: float = max_backoff_seconds
+        self.check_every_n_seconds: float = check_every_n_seconds
+        self.rate_factor: float = 1.0
+        self.on_queue_depth: Optional[Callable[[int], None]] = None
+
+        self._lock: threading.Lock = threading.Lock()
+        # Both buckets start full: a minute's worth of quota
+        self._requests: float = requests_per_minute
+        self._tokens: float = tokens_per_minute
+        self._last_refill: float = time.monotonic()
+        self._blocked_until: float = 0.0
+        self._consecutive_429: int = 0
+        self._waiting: int = 0
+        # Open reservations, by the run ID that took them
+        self._reservations: Dict[Optional[UUID], int] = {}
+
+        self.total_acquired: int = 0
+        self.total_rate_limited: int = 0
+
+    # --- BUCKETS ------------------------------------------------------------
+
+    def _refill(self, now: float) -> None:
+        """Adds the quota earned since the last refill. Lock held."""
+        elapsed: float = now - self._last_refill
+        self._last_refill = now
+        self._requests = min(
+            self.requests_per_minute,
+            self._requests +
+            elapsed * self.requests_per_minute / 60 * self.rate_factor)
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens +
+            elapsed * self.tokens_per_minute / 60 * self.rate_factor)
+
+    def _try_acquire(self) -> float:
+        """
+        Takes one request from the buckets if possible.
+
+        Returns:
+            float: 0 if acquired, otherwise the seconds to wait.
+        """
+        with self._lock:
+            now: float = time.monotonic()
+            self._refill(now)
+
+            if now < self._blocked_until:
+                return self._blocked_until - now
+
+            needed: float = min(
+                self.estimated_tokens_per_request, self.tokens_per_minute)
+            if self._requests >= 1 and self._tokens >= needed:
+                self._requests -= 1
+                self._tokens -= self.estimated_tokens_per_request
+                run_id: Optional[UUID] = _current_run.get()
+                self._reservations[run_id] = \
+                    self._reservations.get(run_id, 0) + 1
+                self.total_acquired += 1
+                return 0.0
+
+            request_rate: float = \
+                self.requests_per_minute / 60 * self.rate_factor
+            token_rate: float = self.tokens_per_minute / 60 * self.rate_factor
+            return max(
+                (1 - self._requests) / request_rate,
+                (needed - self._tokens) / token_rate,
+                self.check_every_n_seconds,
+            )
+
+    def _track_waiting(self, delta: int) -> None:
+        """Counts the callers waiting for quota and reports the depth."""
+        with self._lock:
+            self._waiting += delta
+            depth: int = self._waiting
+        if self.on_queue_depth is not None:
+            self.on_queue_depth(depth)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        """
+        Waits until a request may be sent.
+
+        Args:
+            blocking (bool): If False, return immediately instead of waiting.
+
+        Returns:
+            bool: True once acquired, False if non-blocking and no quota.
+        """
+        wait: float = self._try_acquire()
+        if not wait:
+            return True
+        if not blocking:
+            return False
+
+        self._track_waiting(1)
+        try:
+            while wait:
+                time.sleep(min(wait, self.max_backoff_seconds))
+                wait = self._try_acquire()
+        finally:
+            self._track_waiting(-1)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        """Async `acquire`: waits with `asyncio.sleep`."""
+        wait: float = self._try_acquire()
+        if not wait:
+            return True
+        if not blocking:
+            return False
+
+        self._track_waiting(1)
+        try:
+            while wait:
+                await asyncio.sleep(min(wait, self.max_backoff_seconds))
+                wait = self._try_acquire()
+        finally:
+            self._track_waiting(-1)
+        return True
+
+    # --- FEEDBACK -----------------------------------------------------------
+
+    def _settle(self, run_id: Optional[UUID]) -> bool:
+        """
+        Closes one reservation of the run. Lock held.
+
+        Returns:
+            bool: False if the run had none (e.g. a cache hit).
+        """
+        count: int = self._reservations.get(run_id, 0)
+        if not count:
+            return False
+        if count == 1:
+            del self._reservations[run_id]
+        else:
+            self._reservations[run_id] = count - 1
+        return True
+
+    def record_usage(
+            self,
+            total_tokens: int,
+            run_id: Optional[UUID] = None) -> None:
+        """
+        Settles the token reservation of a finished request.
+
+        Args:
+            total_tokens (int): Input + output tokens actually used.
+            run_id (Optional[UUID]): The run that made the request. A run
+                without a reservation (a cache hit) is ignored.
+        """
+        with self._lock:
+            if not self._settle(run_id):
+                return
+            self._tokens -= total_tokens - self.estimated_tokens_per_request
+            self._consecutive_429 = 0
+            self.rate_factor = min(1.0, self.rate_factor + 0.1)
+
+    def report_rate_limited(self, run_id: Optional[UUID] = None) -> None:
+        """Backs off exponentially and halves the rate after a 429."""
+        with self._lock:
+            self._settle(run_id)
+            self._consecutive_429 += 1
+            self.total_rate_limited += 1
+            backoff: float = min(
+                self.max_backoff_seconds, 2 ** self._consecutive_429)
+            self._blocked_until = time.monotonic() + backoff
+            self.rate_factor = max(0.1, self.rate_factor / 2)
+            self._requests = 0.0
+
+        logger.warning(
+            f"LLM rate limited: backing off {backoff:.0f}s, "
+            f"rate at {self.rate_factor:.0%} of quota.")
+
+    def report_error(self, run_id: Optional[UUID] = None) -> None:
+        """Releases the reservation of a request that failed otherwise."""
+        with self._lock:
+            self._settle(run_id)
+
+    # --- METRICS ------------------------------------------------------------
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers currently waiting for quota."""
+        return self._waiting
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the limiter gauges and counters."""
+        with self._lock:
+            return {
+                "queue_depth": self._waiting,
+                "rate_factor": self.rate_factor,
+                "available_requests": self._requests,
+                "available_tokens": self._tokens,
+                "total_acquired": self.total_acquired,
+                "total_rate_limited": self.total_rate_limited,
+                "open_reservations": sum(self._reservations.values()),
+            }
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Feeds real token usage and 429 errors back into the limiter."""
+
+    # Run in the caller's thread/loop: the handler only updates counters
+    run_inline: bool = True
+
+    def __init__(self, limiter: AdaptiveRateLimiter) -> None:
+        self.limiter: AdaptiveRateLimiter = limiter
+
+    def on_chat_model_start(
+            self,
+            serialized: Dict[str, Any],
+            messages: List[List[BaseMessage]],
+            *,
+            run_id: UUID,
+            **kwargs: Any) -> None:
+        """Marks the run whose call may acquire quota next."""
+        _current_run.set(run_id)
+
+    def on_llm_start(
+            self,
+            serialized: Dict[str, Any],
+            prompts: List[str],
+            *,
+            run_id: UUID,
+            **kwargs: Any) -> None:
+        """Same as `on_chat_model_start`, for completion models."""
+        _current_run.set(run_id)
+
+    def on_llm_end(
+            self,
+            response: LLMResult,
+            *,
+            run_id: UUID,
+            **kwargs: Any) -> None:
+        """Settles the run's token reservation with the reported usage."""
+        total_tokens: int = self.limiter.estimated_tokens_per_request
+        for generations in response.generations:
+            for generation in generations:
+                if isinstance(generation, ChatGeneration):
+                    usage: Optional[Dict[str, Any]] = getattr(
+                        generation.message, "usage_metadata", None)
+                    if usage:
+                        total_tokens = usage.get("total_tokens", total_tokens)
+        self.limiter.record_usage(total_tokens, run_id)
+
+    def on_llm_error(
+            self,
+            error: BaseException,
+            *,
+            run_id: UUID,
+            **kwargs: Any) -> None:
+        """Backs off on quota errors."""
+        if is_rate_limit_error(error):
+            self.limiter.report_rate_limited(run_id)
+        else:
+            self.limiter.report_error(run_id)
+
+
+rate_limiter: AdaptiveRateLimiter = AdaptiveRateLimiter(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    estimated_tokens_per_request=settings.LLM_ESTIMATED_TOKENS_PER_REQUEST,
+    max_backoff_seconds=settings.LLM_MAX_BACKOFF_SECONDS,
+)
+
+rate_limit_callback: RateLimitCallbackHandler = RateLimitCallbackHandler(
+    rate_limiter)
@@ -21,6 +21,206 @@ class Settings(BaseSettings):
     QDRANT_PORT: int = 6333
     QDRANT_COLLECTION_NAME: str = "compliance_docs"
 
+    # 3. QDRANT CONNECTION POOL
+    # Long-lived clients are shared by the tools, the ingestion and the graph
+    # nodes (see src/utils/qdrant_pool.py).
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_POOL_SIZE: int = 20
+    QDRANT_KEEPALIVE_SECONDS: float = 30.0
+    QDRANT_TIMEOUT_SECONDS: int = 10
+    QDRANT_HEALTHCHECK_INTERVAL_SECONDS: float = 30.0
+    # In-process Qdrant instead of the server: ":memory:" or a local path
+    # (used by the offline benchmarks, see src/eval/retrieval_benchmark.py)
+    QDRANT_LOCATION: str | None = None
+
+    # 4. INGESTION PIPELINE
+    # Discovery: every file under INGEST_SOURCE_DIR matching INGEST_GLOB
+    INGEST_SOURCE_DIR: str = "data/raw_pdfs"
+    INGEST_GLOB: str = "**/*.pdf"
+    # Optional JSON sidecar of a document (<file> + suffix) with its
+    # document_set, department and effective_date, used as search filters
+    INGEST_METADATA_SUFFIX: str = ".meta.json"
+    # None -> one parser process per CPU
+    INGEST_PARSE_WORKERS: int | None = None
+    # FastEmbed batching: 'parallel' spawns worker processes (0 = all cores,
+    # None = single process), 'threads' caps ONNX threads per process
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_EMBED_PARALLEL: int | None = None
+    INGEST_EMBED_THREADS: int | None = None
+    INGEST_UPSERT_BATCH_SIZE: int = 256
+    INGEST_UPSERT_WORKERS: int = 4
+    # Max number of in-flight items between two pipeline stages
+    INGEST_QUEUE_SIZE: int = 8
+    # Incremental mode: skip unchanged files, re-embed only changed chunks
+    INGEST_INCREMENTAL: bool = True
+    INGEST_MANIFEST_PATH: str = "data/ingest_manifest.sqlite"
+    # Stamp bumped by the ingestion whenever the collection content changes
+    COLLECTION_VERSION_PATH: str = "data/collection_version"
+    # Chunking: sizes in "characters", or in "tokens" of the dense model
+    # (opt-in, e.g. 128 / 16 tokens). Changing any of these re-chunks and
+    # re-embeds the whole corpus on the next ingestion
+    INGEST_CHUNK_UNIT: str = "characters"
+    INGEST_CHUNK_SIZE: int = 500
+    INGEST_CHUNK_OVERLAP: int = 50
+    # Drop lines repeated at the top/bottom of most pages of a document
+    INGEST_STRIP_HEADERS_FOOTERS: bool = True
+    INGEST_HEADER_FOOTER_LINES: int = 3
+    INGEST_HEADER_FOOTER_MIN_SHARE: float = 0.5
+    # Collapse near-duplicate chunks (MinHash LSH, see
+    # src/ingestion/dedup.py) into one point listing all their sources
+    INGEST_DEDUP_ENABLED: bool = True
+    INGEST_DEDUP_THRESHOLD: float = 0.85
+    INGEST_DEDUP_NUM_PERM: int = 64
+    INGEST_DEDUP_BANDS: int = 16
+
+    # 5. SEMANTIC ANSWER CACHE
+    SEMANTIC_CACHE_ENABLED: bool = True
+    # Cosine similarity above which two questions share an answer
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    SEMANTIC_CACHE_TTL_SECONDS: float = 3600.0
+
+    # 6. LLM RESPONSE CACHE (exact match, persisted in SQLite)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite"
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    # Node names that always call the model, e.g. '["rewrite_query"]'
+    LLM_CACHE_DISABLED_NODES: list[str] = []
+
+    # 7. LLM RATE LIMITS (process-wide, see src/utils/rate_limiter.py)
+    LLM_REQUESTS_PER_MINUTE: int = 15
+    LLM_TOKENS_PER_MINUTE: int = 250000
+    # Reserved per request, settled with the real usage once it returns
+    LLM_ESTIMATED_TOKENS_PER_REQUEST: int = 1000
+    LLM_MAX_BACKOFF_SECONDS: float = 60.0
+    # Node re-runs after a 429; each one waits for the limiter's backoff
+    LLM_RATE_LIMIT_RETRIES: int = 2
+
+    # 8. LOCAL RERANKER (between 'retrieve' and 'grade_documents')
+    # Opt-in: adds a 'rerank' node and downloads the cross-encoder on first
+    # use
+    RERANKER_ENABLED: bool = False
+    RERANKER_MODEL_NAME: str = "Xenova/ms-marco-MiniLM-L-6-v2"
+    # Candidates over-fetched from Qdrant, and chunks kept after reranking
+    RERANK_CANDIDATES: int = 10
+    RERANK_TOP_K: int = 3
+    # Top score (sigmoid of the cross-encoder logit) above which the LLM
+    # grader is skipped and we go straight to 'generate'
+    RERANK_SKIP_GRADER_THRESHOLD: float = 0.9
+
+    # 9. HYBRID VECTORS (named dense + sparse vectors, fused with RRF)
+    EMBEDDING_MODEL_NAME: str = "BAAI/bge-small-en"
+    SPARSE_MODEL_NAME: str = "Qdrant/bm25"
+    DENSE_VECTOR_NAME: str = "dense"
+    SPARSE_VECTOR_NAME: str = "sparse"
+    # Candidates fetched by each branch before the fusion
+    HYBRID_PREFETCH_LIMIT: int = 20
+
+    # 10. RETRIEVAL MODE
+    # "single": retrieve -> grade -> (rewrite -> retrieve)* loop
+    # "multi_query": one LLM call writes N query variants, the N searches
+    # run concurrently and are fused with RRF, then grade -> generate once
+    RETRIEVAL_MODE: str = "single"
+    MULTI_QUERY_VARIANTS: int = 3
+    # Reciprocal Rank Fusion constant
+    RRF_K: int = 60
+    # Adaptive retrieval (used when the reranker is disabled, which has its
+    # own score-based routing): over-fetch, keep the chunks above the knee
+    # of the similarity distribution, and route on the top similarity
+    # without an LLM grading call: "high" -> generate, "low" -> rewrite,
+    # else grade. Thresholds are query-chunk cosine similarities, see
+    # src/agents/context.py. bge-small-en packs them in about [0.6, 1]
+    # (unrelated text still scores ~0.7): recalibrate for another model
+    RETRIEVAL_ADAPTIVE: bool = False
+    ADAPTIVE_FETCH_LIMIT: int = 20
+    ADAPTIVE_MIN_CHUNKS: int = 1
+    ADAPTIVE_MAX_CHUNKS: int = 8
+    ADAPTIVE_SIMILARITY_FLOOR: float = 0.75
+    # Max similarity gap between a kept chunk and the top one
+    ADAPTIVE_MAX_GAP_TO_TOP: float = 0.08
+    ADAPTIVE_ELBOW_MIN_DROP: float = 0.03
+    ADAPTIVE_HIGH_CONFIDENCE: float = 0.88
+    ADAPTIVE_LOW_CONFIDENCE: float = 0.8
+
+    # 11. EVALUATION (see src/eval/runner.py)
+    EVAL_DATASET_PATH: str = "data/eval/golden_dataset.json"
+    # Per-item results, appended as they finish: a rerun resumes from here
+    EVAL_RESULTS_PATH: str = "data/eval/results.jsonl"
+    EVAL_REPORT_PATH: str = "data/eval/results.csv"
+    # Max agent runs / judge calls in flight
+    EVAL_AGENT_CONCURRENCY: int = 4
+    EVAL_JUDGE_CONCURRENCY: int = 4
+
+    # 12. CHAT MODEL (see src/utils/chat_model.py)
+    # "google": Gemini | "fake": deterministic local model, for load tests
+    LLM_PROVIDER: str = "google"
+    LLM_MODEL_NAME: str = "gemini-2.5-flash-lite"
+    # Fake model: delay before the first token, then per streamed token
+    FAKE_LLM_LATENCY_SECONDS: float = 0.5
+    FAKE_LLM_TOKEN_DELAY_SECONDS: float = 0.01
+    FAKE_LLM_OUTPUT_TOKENS: int = 60
+    # Share of chunks the fake grader marks relevant (0 forces rewrites)
+    FAKE_LLM_RELEVANT_RATIO: float = 1.0
+
+    # 13. METRICS (Prometheus scrape endpoint, see src/utils/metrics.py)
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 9100
+
+    # 14. STARTUP (see src/core/warmup.py)
+    # Load models, open the Qdrant pool and run a dummy query before the
+    # first request, instead of during it
+    WARMUP_ON_STARTUP: bool = True
+
+    # 15. QUERY CACHES (in-process LRU + TTL, see src/agents/tools.py)
+    QUERY_CACHE_ENABLED: bool = True
+    # Query embeddings only depend on the text and the models
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 4096
+    EMBEDDING_CACHE_TTL_SECONDS: float = 86400.0
+    # Search results, also keyed by the collection version stamp
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: float = 600.0
+
+    # 16. COLLECTION STORAGE (see src/ingestion/collection.py)
+    # Applied when the collection is created: "none", "scalar" or "binary"
+    COLLECTION_QUANTIZATION: str = "none"
+    COLLECTION_QUANTIZATION_ALWAYS_RAM: bool = True
+    COLLECTION_HNSW_M: int = 16
+    COLLECTION_HNSW_EF_CONSTRUCT: int = 100
+    COLLECTION_HNSW_ON_DISK: bool = False
+    COLLECTION_VECTORS_ON_DISK: bool = False
+    COLLECTION_PAYLOAD_ON_DISK: bool = False
+    # Applied to every dense search (None = Qdrant defaults)
+    SEARCH_HNSW_EF: int | None = None
+    SEARCH_RESCORE: bool = True
+    SEARCH_OVERSAMPLING: float = 2.0
+
+    # 17. CONTEXT PACKING (see src/agents/context.py)
+    # Max tokens of retrieved context in the 'generate' prompt; the best
+    # scored chunks are packed first
+    CONTEXT_TOKEN_BUDGET: int = 2000
+    # Token estimate used by the packer (~4 characters per token)
+    CONTEXT_CHARS_PER_TOKEN: float = 4.0
+
+    # 18. HTTP API (see src/app/api.py)
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8080
+    # uvicorn worker processes; each one loads its own models and pools
+    API_WORKERS: int = 1
+    # Max graph runs in flight per worker, across all requests
+    API_MAX_CONCURRENT_RUNS: int = 16
+    # /ask/batch: max questions per request, and default concurrency
+    API_BATCH_MAX_QUESTIONS: int = 100
+    API_BATCH_CONCURRENCY: int = 8
+    # On SIGTERM, seconds in-flight requests get to finish
+    API_SHUTDOWN_TIMEOUT_SECONDS: int = 30
+
+    # 19. REQUEST COALESCING (see src/utils/single_flight.py)
+    # Concurrent identical graph runs, LLM calls and searches share one
+    # in-flight execution
+    SINGLE_FLIGHT_ENABLED: bool = True
+
     GOOGLE_API_KEY: str | None = None
 
     @property
@@ -0,0 +1,291 @@
+'''
+
+In-process request coalescing ("single-flight").
+
+When a policy announcement goes out, many sessions ask the same question
+within seconds. Without coalescing, each of them starts its own graph run,
+its own Gemini calls and its own Qdrant searches, even though the caches
+only help once the first run has finished.
+
+A flight lets the first caller of a key (the leader) run the work, while
+the callers arriving before it completes (the followers) wait for it and
+receive the same result, or the same exception. Nothing is kept once the
+work completes: this is not a cache, only de-duplication of in-flight work.
+
+Three flavours are provided:
+    SingleFlight        blocking calls, shared across threads.
+    AsyncSingleFlight   coroutines, shared within one event loop.
+    StreamFlight        async iterators: every subscriber receives all the
+                        items of one shared iteration, from the start.
+
+'''
+
+import asyncio
+import logging
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar
+)
+
+from src.utils.settings import settings
+from src.utils.metrics import COALESCED_CALLS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+# Markers of the items a StreamFlight hands to its subscribers
+_ITEM: str = "item"
+_END: str = "end"
+_ERROR: str = "error"
+
+
+class _Call(Generic[V]):
+    """The outcome of one in-flight blocking call."""
+
+    def __init__(self) -> None:
+        self.done: threading.Event = threading.Event()
+        self.result: Optional[V] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[V]):
+    """
+    Coalesces concurrent blocking calls with the same key.
+
+    Attributes:
+        name (str): Label of the flight in the metrics.
+        enabled (bool): When False, every call runs on its own.
+    """
+
+    def __init__(self, name: str, enabled: Optional[bool] = None) -> None:
+        self.name: str = name
+        self.enabled: bool = settings.SINGLE_FLIGHT_ENABLED \
+            if enabled is None else enabled
+        self._lock: threading.Lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[V]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], V]) -> V:
+        """
+        Runs `fn`, or waits for the identical call already in flight.
+
+        Args:
+            key (Hashable): Identifies the call.
+            fn (Callable[[], V]): The work, run by the leader only.
+
+        Returns:
+            V: The result of the shared call. Followers receive the same
+                object: treat it as read-only.
+
+        Raises:
+            Exception: Whatever the shared call raised.
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call: Optional[_Call[V]] = self._calls.get(key)
+            leader: bool = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED_CALLS.labels(self.name).inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight(Generic[V]):
+    """
+    Coalesces concurrent coroutine calls with the same key.
+
+    The work runs in its own task: a caller that is cancelled (e.g. its
+    client disconnected) stops waiting, but the others still get the
+    result. Must be used from a single event loop.
+
+    Attributes:
+        name (str): Label of the flight in the metrics.
+        enabled (bool): When False, every call runs on its own.
+    """
+
+    def __init__(self, name: str, enabled: Optional[bool] = None) -> None:
+        self.name: str = name
+        self.enabled: bool = settings.SINGLE_FLIGHT_ENABLED \
+            if enabled is None else enabled
+        self._tasks: Dict[Hashable, "asyncio.Future[V]"] = {}
+
+    def _forget(self, key: Hashable, task: "asyncio.Future[V]") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Marks the exception as retrieved when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def do(
+            self,
+            key: Hashable,
+            fn: Callable[[], Awaitable[V]]) -> V:
+        """
+        Awaits `fn()`, or the identical call already in flight.
+
+        Args:
+            key (Hashable): Identifies the call.
+            fn (Callable[[], Awaitable[V]]): The work, started by the leader
+                only.
+
+        Returns:
+            V: The result of the shared call (read-only, see
+                `SingleFlight.do`).
+
+        Raises:
+            Exception: Whatever the shared call raised.
+        """
+        if not self.enabled:
+            return await fn()
+
+        task: Optional["asyncio.Future[V]"] = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED_CALLS.labels(self.name).inc()
+        return await asyncio.shield(task)
+
+
+class _Broadcast:
+    """One shared iteration: the items so far and the live subscribers."""
+
+    def __init__(self) -> None:
+        self.items: List[Tuple[str, Any]] = []
+        self.subscribers: Set["asyncio.Queue[Tuple[str, Any]]"] = set()
+        self.task: Optional["asyncio.Future[None]"] = None
+
+    def publish(self, kind: str, value: Any = None) -> None:
+        self.items.append((kind, value))
+        for queue in self.subscribers:
+            queue.put_nowait((kind, value))
+
+
+class StreamFlight(Generic[V]):
+    """
+    Coalesces concurrent async iterations with the same key.
+
+    The first subscriber starts the iteration in a task; later subscribers
+    first receive the items already produced, then the live ones. The
+    iteration is cancelled once every subscriber has gone. Must be used
+    from a single event loop.
+
+    Attributes:
+        name (str): Label of the flight in the metrics.
+        enabled (bool): When False, every subscriber iterates on its own.
+    """
+
+    def __init__(self, name: str, enabled: Optional[bool] = None) -> None:
+        self.name: str = name
+        self.enabled: bool = settings.SINGLE_FLIGHT_ENABLED \
+            if enabled is None else enabled
+        self._runs: Dict[Hashable, _Broadcast] = {}
+
+    async def _produce(
+            self,
+            key: Hashable,
+            broadcast: _Broadcast,
+            factory: Callable[[], AsyncIterator[V]]) -> None:
+        try:
+            async for item in factory():
+                broadcast.publish(_ITEM, item)
+            broadcast.publish(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            broadcast.publish(_ERROR, e)
+        finally:
+            if self._runs.get(key) is broadcast:
+                del self._runs[key]
+
+    async def subscribe(
+            self,
+            key: Hashable,
+            factory: Callable[[], AsyncIterator[V]]) -> AsyncIterator[V]:
+        """
+        Iterates over `factory()`, shared with identical subscriptions.
+
+        Args:
+            key (Hashable): Identifies the iteration.
+            factory (Callable[[], AsyncIterator[V]]): Starts the iteration,
+                called by the first subscriber only.
+
+        Yields:
+            V: Every item of the shared iteration, from the first one.
+
+        Raises:
+            Exception: Whatever the shared iteration raised.
+        """
+        if not self.enabled:
+            async for item in factory():
+                yield item
+            return
+
+        broadcast: Optional[_Broadcast] = self._runs.get(key)
+        if broadcast is None:
+            broadcast = self._runs[key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(
+                self._produce(key, broadcast, factory))
+        else:
+            COALESCED_CALLS.labels(self.name).inc()
+
+        # Replay and registration happen without yielding to the loop, so
+        # no item can be missed or received twice
+        queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+        for entry in broadcast.items:
+            queue.put_nowait(entry)
+        broadcast.subscribers.add(queue)
+
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == _END:
+                    return
+                if kind == _ERROR:
+                    raise value
+                yield value
+        finally:
+            broadcast.subscribers.discard(queue)
+            if not broadcast.subscribers and not broadcast.task.done():
+                logger.info(
+                    f"No subscriber left on '{self.name}', cancelling.")
+                # Later subscribers must start afresh, not join it
+                if self._runs.get(key) is broadcast:
+                    del self._runs[key]
+                broadcast.task.cancel()
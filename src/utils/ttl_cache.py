@@ -0,0 +1,132 @@
+'''
+
+Thread-safe in-process LRU cache with a time-to-live.
+
+Used for the hot, cheap-to-key lookups of the retrieval path (query
+embeddings, search results). Every cache counts its hits and misses and
+exports them to Prometheus under its name.
+
+'''
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from src.utils.metrics import CACHE_REQUESTS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    LRU cache whose entries also expire after `ttl_seconds`.
+
+    Attributes:
+        name (str): Label of the cache in the metrics.
+        max_entries (int): Size limit; the least recently used entry is
+            evicted beyond it.
+        ttl_seconds (float): Entries older than this are never returned.
+        enabled (bool): When False, lookups always miss and nothing is stored.
+        hits (int): Number of cache hits.
+        misses (int): Number of cache misses.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            max_entries: int,
+            ttl_seconds: float,
+            enabled: bool = True) -> None:
+
+        self.name: str = name
+        self.max_entries: int = max_entries
+        self.ttl_seconds: float = ttl_seconds
+        self.enabled: bool = enabled
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._lock: threading.Lock = threading.Lock()
+        # key -> (inserted_at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = \
+            OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Returns the cached value, or None on a miss (or expired entry).
+
+        Args:
+            key (Hashable): The lookup key.
+
+        Returns:
+            Optional[V]: The value, None if absent.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry: Optional[Tuple[float, V]] = self._entries.get(key)
+            if entry is not None and \
+                    time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.labels(self.name, "miss").inc()
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels(self.name, "hit").inc()
+        return entry[1]
+
+    def put(self, key: Hashable, value: V) -> None:
+        """
+        Stores a value, evicting the least recently used entries if full.
+
+        Args:
+            key (Hashable): The lookup key.
+            value (V): The value to cache.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache."""
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the cache size and hit counters."""
+        with self._lock:
+            size: int = len(self._entries)
+        return {
+            "name": self.name,
+            "entries": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
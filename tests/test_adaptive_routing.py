@@ -0,0 +1,90 @@
+"""
+Adaptive retrieval routing: the cut and the confidence follow the
+similarity of the chunks to the query, not their RRF rank scores.
+"""
+
+from typing import Any, Dict, List
+
+import pytest
+
+from src.core.state import AgentState, Chunk
+from src.utils.settings import settings
+from src.agents.nodes import _retrieval_update
+from src.agents.context import adaptive_cut, retrieval_confidence
+from src.core.graph import decide_after_retrieve
+
+
+def _chunks(similarities: List[float]) -> List[Chunk]:
+    """Hybrid hits ranked as Qdrant RRF ranks them: the top one always
+    scores at least 0.5, whatever its similarity."""
+    return [
+        {
+            "id": str(i),
+            "text": f"chunk {i}",
+            "source": "policy.pdf",
+            "page": i,
+            "score": 1 / (i + 2),
+            "similarity": similarity,
+        }
+        for i, similarity in enumerate(similarities)
+    ]
+
+
+def _state() -> AgentState:
+    return {
+        "question": "Can I expense a gym membership?",
+        "generation": "",
+        "documents": [],
+        "retry_count": 0,
+        "grade": "",
+    }
+
+
+@pytest.fixture(autouse=True)
+def adaptive_mode(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "RETRIEVAL_ADAPTIVE", True)
+    monkeypatch.setattr(settings, "RERANKER_ENABLED", False)
+    monkeypatch.setattr(settings, "RETRIEVAL_MODE", "single")
+
+
+def _route(similarities: List[float]) -> str:
+    state: AgentState = _state()
+    update: Dict[str, Any] = _retrieval_update(state, _chunks(similarities))
+    return decide_after_retrieve({**state, **update})
+
+
+def test_weak_query_goes_to_rewrite() -> None:
+    # Top RRF score 0.5, but nothing is actually similar to the query
+    assert _route([0.74, 0.73, 0.72, 0.70]) == "rewrite_query"
+
+
+def test_weak_query_generates_once_retries_are_exhausted() -> None:
+    state: AgentState = {**_state(), "retry_count": 3}
+    update: Dict[str, Any] = _retrieval_update(
+        state, _chunks([0.74, 0.73]))
+    assert decide_after_retrieve({**state, **update}) == "generate"
+
+
+def test_strong_query_skips_the_grader() -> None:
+    assert _route([0.91, 0.89, 0.78]) == "generate"
+
+
+def test_borderline_query_is_graded() -> None:
+    assert _route([0.84, 0.83, 0.77]) == "grade_documents"
+
+
+def test_confidence_ignores_rrf_scores() -> None:
+    chunks: List[Chunk] = _chunks([0.7])
+    assert chunks[0]["score"] == 0.5
+    assert retrieval_confidence(chunks) == "low"
+
+
+def test_cut_at_the_similarity_elbow() -> None:
+    kept: List[Chunk] = adaptive_cut(
+        _chunks([0.90, 0.89, 0.88, 0.83, 0.82]))
+    assert [c["id"] for c in kept] == ["0", "1", "2"]
+
+
+def test_cut_keeps_min_chunks_below_the_floor() -> None:
+    kept: List[Chunk] = adaptive_cut(_chunks([0.70, 0.69]), min_chunks=1)
+    assert [c["id"] for c in kept] == ["0"]
@@ -0,0 +1,123 @@
+"""
+Semantic answer cache: similarity hits, TTL/LRU eviction, invalidation by
+the collection version stamp, and concurrent use from several threads.
+"""
+
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+
+from src.core import answer_cache as answer_cache_module
+from src.core.answer_cache import SemanticAnswerCache
+from src.utils.settings import settings
+from src.utils.collection_version import bump_collection_version
+
+# Hand-made question embeddings: the two remote work questions are close,
+# the expense one is not
+VECTORS: Dict[str, List[float]] = {
+    "remote work policy": [1.0, 0.0, 0.0],
+    "what's the remote work policy?": [0.98, 0.2, 0.0],
+    "expense limits": [0.0, 1.0, 0.0],
+    "parental leave": [0.0, 0.0, 1.0],
+}
+
+
+def _embed(self: SemanticAnswerCache, question: str) -> np.ndarray:
+    vector: np.ndarray = np.array(VECTORS[question], dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def version_path(
+        monkeypatch: pytest.MonkeyPatch,
+        tmp_path: Path) -> str:
+    path: str = str(tmp_path / "collection_version")
+    monkeypatch.setattr(settings, "COLLECTION_VERSION_PATH", path)
+    return path
+
+
+@pytest.fixture
+def cache(
+        monkeypatch: pytest.MonkeyPatch,
+        version_path: str) -> SemanticAnswerCache:
+    monkeypatch.setattr(SemanticAnswerCache, "_embed", _embed)
+    return SemanticAnswerCache(
+        threshold=0.95, max_entries=2, ttl_seconds=60, enabled=True)
+
+
+def test_near_identical_question_hits(cache: SemanticAnswerCache) -> None:
+    cache.store("remote work policy", "Two days a week.", [])
+
+    hit: Optional[Dict[str, Any]] = \
+        cache.lookup("what's the remote work policy?")
+
+    assert hit is not None
+    assert hit["generation"] == "Two days a week."
+    assert hit["question"] == "what's the remote work policy?"
+    assert cache.lookup("expense limits") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(
+        cache: SemanticAnswerCache) -> None:
+    cache.store("remote work policy", "remote", [])
+    cache.store("expense limits", "expenses", [])
+    # Refreshes 'remote work policy': 'expense limits' is now the oldest
+    assert cache.lookup("remote work policy") is not None
+
+    cache.store("parental leave", "leave", [])
+
+    assert cache.lookup("expense limits") is None
+    assert cache.lookup("remote work policy") is not None
+    assert cache.lookup("parental leave") is not None
+
+
+def test_expired_entries_are_not_returned(
+        monkeypatch: pytest.MonkeyPatch,
+        cache: SemanticAnswerCache) -> None:
+    now: float = time.monotonic()
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", lambda: now)
+    cache.store("remote work policy", "remote", [])
+
+    monkeypatch.setattr(
+        answer_cache_module.time, "monotonic",
+        lambda: now + cache.ttl_seconds + 1)
+
+    assert cache.lookup("remote work policy") is None
+
+
+def test_ingestion_invalidates_the_cache(
+        cache: SemanticAnswerCache,
+        version_path: str) -> None:
+    cache.store("remote work policy", "remote", [])
+
+    bump_collection_version(version_path)
+
+    assert cache.lookup("remote work policy") is None
+
+
+def test_concurrent_stores_and_lookups(
+        monkeypatch: pytest.MonkeyPatch,
+        version_path: str) -> None:
+    monkeypatch.setattr(SemanticAnswerCache, "_embed", _embed)
+    cache: SemanticAnswerCache = SemanticAnswerCache(
+        threshold=0.95, max_entries=3, ttl_seconds=60, enabled=True)
+    questions: List[str] = list(VECTORS)
+
+    def worker(i: int) -> None:
+        question: str = questions[i % len(questions)]
+        cache.store(question, f"answer to {question}", [])
+        hit: Optional[Dict[str, Any]] = cache.lookup(question)
+        # Another thread may have evicted it, never mixed it up
+        if hit is not None:
+            assert hit["generation"].startswith("answer to ")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(worker, range(400)))
+
+    assert len(cache._entries) <= cache.max_entries
+    assert cache.hits + cache.misses == 400
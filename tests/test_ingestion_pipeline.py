@@ -0,0 +1,151 @@
+"""
+Failure handling of the ingestion pipeline: a failing stage must end the
+run with an error, never leave the other stages blocked on their queues.
+"""
+
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterator, List
+
+import numpy as np
+import pytest
+
+from src.ingestion import pipeline
+from src.ingestion.pipeline import IngestionPipeline
+
+# Generous: a healthy run takes well under a second
+RUN_TIMEOUT_SECONDS: float = 60.0
+
+
+class _FakeDenseModel:
+    """Reads the whole text stream (sentinel included) before embedding,
+    like FastEmbed filling its last batch, then optionally fails."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.fail: bool = fail
+
+    def embed(self, texts: Iterator[str], **kwargs: Any) -> Iterator[Any]:
+        batch: List[str] = list(texts)
+        if self.fail:
+            raise RuntimeError("embedding failed")
+        for _ in batch:
+            yield np.ones(4, dtype=np.float32)
+
+
+class _FakeSparseModel:
+    def embed(self, texts: Iterator[str], **kwargs: Any) -> Iterator[Any]:
+        for _ in texts:
+            yield SimpleNamespace(
+                indices=np.array([0]), values=np.array([1.0]))
+
+
+class _FailingClient:
+    """Qdrant client whose upserts always fail."""
+
+    def upsert(self, **kwargs: Any) -> None:
+        raise ConnectionError("qdrant is down")
+
+
+class _RecordingClient:
+    def __init__(self) -> None:
+        self.points: int = 0
+
+    def upsert(self, points: List[Any], **kwargs: Any) -> None:
+        self.points += len(points)
+
+
+@pytest.fixture
+def documents(tmp_path: Path) -> List[str]:
+    paths: List[str] = []
+    for i in range(3):
+        path: Path = tmp_path / f"policy_{i}.txt"
+        path.write_text(
+            "\n\n".join(f"Clause {i}.{j}: rule number {j} of document {i}."
+                        for j in range(20)),
+            encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def _pipeline(
+        monkeypatch: pytest.MonkeyPatch,
+        client: Any,
+        source_dir: str,
+        dense: _FakeDenseModel) -> IngestionPipeline:
+    monkeypatch.setattr(pipeline, "ensure_collection", lambda *a: False)
+    monkeypatch.setattr(pipeline, "get_dense_model", lambda *a, **k: dense)
+    monkeypatch.setattr(
+        pipeline, "get_sparse_model", lambda *a, **k: _FakeSparseModel())
+    return IngestionPipeline(
+        client,
+        collection_name="test",
+        chunk_size=60,
+        chunk_overlap=0,
+        chunk_unit="characters",
+        strip_headers_footers=False,
+        deduplicate=False,
+        parse_workers=1,
+        upsert_batch_size=1,
+        upsert_workers=2,
+        queue_size=1,
+        source_dir=source_dir,
+    )
+
+
+def _run(ingestion: IngestionPipeline, files: List[str]) -> List[Any]:
+    """Runs the pipeline in a thread; returns what it raised, if any."""
+    outcome: List[Any] = []
+
+    def target() -> None:
+        try:
+            outcome.append(ingestion.run(files))
+        except Exception as e:
+            outcome.append(e)
+
+    thread: threading.Thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(RUN_TIMEOUT_SECONDS)
+    assert not thread.is_alive(), "the pipeline hung"
+    return outcome
+
+
+def test_upsert_failure_ends_with_an_error(
+        monkeypatch: pytest.MonkeyPatch,
+        documents: List[str],
+        tmp_path: Path) -> None:
+    ingestion: IngestionPipeline = _pipeline(
+        monkeypatch, _FailingClient(), str(tmp_path), _FakeDenseModel())
+
+    outcome: List[Any] = _run(ingestion, documents)
+
+    assert isinstance(outcome[0], RuntimeError)
+    assert isinstance(outcome[0].__cause__, ConnectionError)
+
+
+def test_embed_failure_after_the_last_chunk_ends_with_an_error(
+        monkeypatch: pytest.MonkeyPatch,
+        documents: List[str],
+        tmp_path: Path) -> None:
+    ingestion: IngestionPipeline = _pipeline(
+        monkeypatch, _RecordingClient(), str(tmp_path),
+        _FakeDenseModel(fail=True))
+
+    outcome: List[Any] = _run(ingestion, documents)
+
+    assert isinstance(outcome[0], RuntimeError)
+    assert "embedding failed" in str(outcome[0])
+
+
+def test_successful_run_upserts_every_chunk(
+        monkeypatch: pytest.MonkeyPatch,
+        documents: List[str],
+        tmp_path: Path) -> None:
+    client: _RecordingClient = _RecordingClient()
+    ingestion: IngestionPipeline = _pipeline(
+        monkeypatch, client, str(tmp_path), _FakeDenseModel())
+
+    outcome: List[Any] = _run(ingestion, documents)
+
+    assert outcome[0].files == 3
+    assert client.points == outcome[0].chunks > 0
@@ -0,0 +1,111 @@
+"""
+Token reservations of the adaptive rate limiter are settled by the run
+that took them: cache hits, which end a run without calling the provider,
+must not touch another call's reservation nor the 429 backoff.
+"""
+
+from typing import Optional
+from uuid import UUID, uuid4
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from src.utils.rate_limiter import (
+    AdaptiveRateLimiter,
+    RateLimitCallbackHandler
+)
+
+ESTIMATE: int = 1000
+
+
+@pytest.fixture
+def limiter() -> AdaptiveRateLimiter:
+    # Slow refill: the bucket levels barely move during a test
+    return AdaptiveRateLimiter(
+        requests_per_minute=60,
+        tokens_per_minute=6000,
+        estimated_tokens_per_request=ESTIMATE,
+        max_backoff_seconds=60.0)
+
+
+@pytest.fixture
+def handler(limiter: AdaptiveRateLimiter) -> RateLimitCallbackHandler:
+    return RateLimitCallbackHandler(limiter)
+
+
+def _result(total_tokens: Optional[int]) -> LLMResult:
+    message: AIMessage = AIMessage(content="ok")
+    if total_tokens is not None:
+        message = AIMessage(content="ok", usage_metadata={
+            "input_tokens": total_tokens - 1,
+            "output_tokens": 1,
+            "total_tokens": total_tokens,
+        })
+    return LLMResult(generations=[[ChatGeneration(message=message)]])
+
+
+def _start(handler: RateLimitCallbackHandler) -> UUID:
+    run_id: UUID = uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run_id)
+    return run_id
+
+
+def _provider_call(
+        handler: RateLimitCallbackHandler,
+        limiter: AdaptiveRateLimiter) -> UUID:
+    """A cache miss: the run starts, then acquires quota."""
+    run_id: UUID = _start(handler)
+    assert limiter.acquire(blocking=False)
+    return run_id
+
+
+def test_cache_hit_after_429_keeps_the_backoff(
+        limiter: AdaptiveRateLimiter,
+        handler: RateLimitCallbackHandler) -> None:
+    failed: UUID = _provider_call(handler, limiter)
+    handler.on_llm_error(
+        Exception("429 RESOURCE_EXHAUSTED"), run_id=failed)
+    assert limiter.rate_factor == 0.5
+
+    # A cache hit: the run ends without ever acquiring quota
+    cached: UUID = _start(handler)
+    handler.on_llm_end(_result(50), run_id=cached)
+
+    assert limiter.rate_factor == 0.5
+    assert limiter.stats()["total_rate_limited"] == 1
+    assert not limiter.acquire(blocking=False), "backoff was lifted"
+
+
+def test_cache_hit_does_not_settle_an_inflight_call(
+        limiter: AdaptiveRateLimiter,
+        handler: RateLimitCallbackHandler) -> None:
+    inflight: UUID = _provider_call(handler, limiter)
+    after_acquire: float = limiter.stats()["available_tokens"]
+
+    cached: UUID = _start(handler)
+    handler.on_llm_end(_result(5000), run_id=cached)
+
+    assert limiter.stats()["open_reservations"] == 1
+    assert limiter.stats()["available_tokens"] == pytest.approx(
+        after_acquire, abs=5)
+
+    handler.on_llm_end(_result(300), run_id=inflight)
+
+    assert limiter.stats()["open_reservations"] == 0
+    # The estimate is refunded down to the real usage of that call
+    assert limiter.stats()["available_tokens"] == pytest.approx(
+        after_acquire + ESTIMATE - 300, abs=5)
+
+
+def test_error_releases_only_its_own_reservation(
+        limiter: AdaptiveRateLimiter,
+        handler: RateLimitCallbackHandler) -> None:
+    first: UUID = _provider_call(handler, limiter)
+    _provider_call(handler, limiter)
+
+    handler.on_llm_error(ValueError("bad request"), run_id=first)
+    handler.on_llm_error(ValueError("bad request"), run_id=first)
+
+    assert limiter.stats()["open_reservations"] == 1
+    assert limiter.rate_factor == 1.0
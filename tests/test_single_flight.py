@@ -0,0 +1,231 @@
+"""
+Request coalescing: concurrent identical calls run the work once and all
+receive its result, or its exception; a shared stream outlives the
+subscribers that disconnect, as long as one is still listening.
+"""
+
+import time
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, List, Tuple
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.utils.single_flight import (
+    AsyncSingleFlight,
+    SingleFlight,
+    StreamFlight
+)
+
+# Generous: the shared call is released as soon as every caller joined it
+WAIT_SECONDS: float = 10.0
+
+
+def _coalesced(name: str) -> float:
+    return REGISTRY.get_sample_value(
+        "agent_coalesced_calls_total", {"flight": name}) or 0.0
+
+
+def _wait_for_followers(name: str, before: float, followers: int) -> None:
+    """Blocks until `followers` callers joined the flight `name`."""
+    deadline: float = time.monotonic() + WAIT_SECONDS
+    while _coalesced(name) - before < followers:
+        assert time.monotonic() < deadline, "the callers never joined"
+        time.sleep(0.01)
+
+
+def _run_in_threads(
+        fn: Callable[[], Any],
+        count: int) -> Tuple[List[threading.Thread], List[Any]]:
+    """Starts `count` threads running `fn`; each one stores what it
+    returned or raised in the outcomes list."""
+    outcomes: List[Any] = [None] * count
+
+    def target(i: int) -> None:
+        try:
+            outcomes[i] = fn()
+        except Exception as e:
+            outcomes[i] = e
+
+    threads: List[threading.Thread] = [
+        threading.Thread(target=target, args=(i,), daemon=True)
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_identical_calls_run_once() -> None:
+    flight: SingleFlight[List[str]] = SingleFlight(
+        "test_once", enabled=True)
+    before: float = _coalesced("test_once")
+    release: threading.Event = threading.Event()
+    calls: List[int] = []
+
+    def search() -> List[str]:
+        calls.append(1)
+        assert release.wait(WAIT_SECONDS)
+        return ["chunk"]
+
+    threads, outcomes = _run_in_threads(
+        lambda: flight.do("remote work", search), 2)
+    _wait_for_followers("test_once", before, 1)
+    release.set()
+    for thread in threads:
+        thread.join(WAIT_SECONDS)
+
+    assert len(calls) == 1
+    assert outcomes == [["chunk"], ["chunk"]]
+    # Nothing is kept once the call completed
+    assert flight.do("remote work", lambda: ["fresh"]) == ["fresh"]
+
+
+def test_followers_receive_the_leaders_exception() -> None:
+    flight: SingleFlight[str] = SingleFlight("test_error", enabled=True)
+    before: float = _coalesced("test_error")
+    release: threading.Event = threading.Event()
+    calls: List[int] = []
+
+    def failing() -> str:
+        calls.append(1)
+        assert release.wait(WAIT_SECONDS)
+        raise ConnectionError("qdrant is down")
+
+    threads, outcomes = _run_in_threads(
+        lambda: flight.do("remote work", failing), 3)
+    _wait_for_followers("test_error", before, 2)
+    release.set()
+    for thread in threads:
+        thread.join(WAIT_SECONDS)
+
+    assert len(calls) == 1
+    assert all(isinstance(o, ConnectionError) for o in outcomes)
+
+
+def test_disabled_flight_runs_every_call() -> None:
+    flight: SingleFlight[int] = SingleFlight("test_disabled", enabled=False)
+    calls: List[int] = []
+
+    def work() -> int:
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("key", work) == 1
+    assert flight.do("key", work) == 2
+
+
+def test_concurrent_identical_coroutines_run_once() -> None:
+    flight: AsyncSingleFlight[str] = AsyncSingleFlight(
+        "test_async_once", enabled=True)
+    calls: List[int] = []
+
+    async def generate() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "Two days a week."
+
+    async def scenario() -> List[str]:
+        return await asyncio.gather(
+            flight.do("remote work", generate),
+            flight.do("remote work", generate))
+
+    assert asyncio.run(scenario()) == ["Two days a week."] * 2
+    assert len(calls) == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_others() -> None:
+    flight: AsyncSingleFlight[str] = AsyncSingleFlight(
+        "test_async_cancel", enabled=True)
+    calls: List[int] = []
+
+    async def generate() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "Two days a week."
+
+    async def scenario() -> str:
+        leader: asyncio.Task = asyncio.ensure_future(
+            flight.do("remote work", generate))
+        follower: asyncio.Task = asyncio.ensure_future(
+            flight.do("remote work", generate))
+        await asyncio.sleep(0.01)
+        # The leader's client disconnects
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "Two days a week."
+    assert len(calls) == 1
+
+
+class _Tokens:
+    """A token stream that pauses after its first token until released,
+    and records how often it started and whether it was cancelled."""
+
+    def __init__(self) -> None:
+        self.release: asyncio.Event = asyncio.Event()
+        self.started: int = 0
+        self.cancelled: bool = False
+
+    async def __call__(self) -> AsyncIterator[str]:
+        self.started += 1
+        try:
+            yield "Two"
+            await self.release.wait()
+            yield " days"
+            yield " a week."
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def test_disconnected_subscriber_does_not_cancel_the_stream() -> None:
+    flight: StreamFlight[str] = StreamFlight("test_stream", enabled=True)
+
+    async def scenario() -> List[str]:
+        tokens: _Tokens = _Tokens()
+        leaving: AsyncIterator[str] = flight.subscribe("remote work", tokens)
+        staying: AsyncIterator[str] = flight.subscribe("remote work", tokens)
+        assert await leaving.__anext__() == "Two"
+        assert await staying.__anext__() == "Two"
+
+        # The first session closes its tab mid-answer
+        await leaving.aclose()
+        tokens.release.set()
+        rest: List[str] = [token async for token in staying]
+
+        assert tokens.started == 1
+        assert not tokens.cancelled
+        return ["Two"] + rest
+
+    assert asyncio.run(scenario()) == ["Two", " days", " a week."]
+
+
+def test_stream_is_cancelled_once_every_subscriber_left() -> None:
+    flight: StreamFlight[str] = StreamFlight("test_stream", enabled=True)
+
+    async def scenario() -> _Tokens:
+        tokens: _Tokens = _Tokens()
+        subscribers: List[AsyncIterator[str]] = [
+            flight.subscribe("remote work", tokens) for _ in range(2)]
+        for subscriber in subscribers:
+            assert await subscriber.__anext__() == "Two"
+
+        for subscriber in subscribers:
+            await subscriber.aclose()
+        # Lets the cancellation reach the producer task
+        await asyncio.sleep(0.01)
+        assert tokens.cancelled
+
+        # A later subscriber starts a new run instead of joining the
+        # cancelled one
+        tokens.release.set()
+        again: List[str] = [
+            token async for token in flight.subscribe("remote work", tokens)]
+        assert again == ["Two", " days", " a week."]
+        return tokens
+
+    assert asyncio.run(scenario()).started == 2